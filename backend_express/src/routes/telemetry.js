@@ -22,6 +22,42 @@ router.post('/', async (req, res) => {
   }
 });
 
+// POST /api/telemetry/batch - Receive a batch of telemetry samples (oldest first)
+// Each sample is processed on its own; the response lists which were stored
+// so the sender re-sends only the rejected ones (retryable = worth re-sending)
+router.post('/batch', async (req, res) => {
+  const samples = Array.isArray(req.body) ? req.body : req.body?.samples;
+
+  if (!Array.isArray(samples) || samples.length === 0) {
+    return res.status(400).json({ error: 'samples array is required' });
+  }
+
+  const accepted = [];
+  const rejected = [];
+
+  // Process in order so replayed samples keep their sequence
+  for (const [index, telemetry] of samples.entries()) {
+    if (!telemetry || !telemetry.dc_id) {
+      rejected.push({ index, error: 'dc_id is required', retryable: false });
+      continue;
+    }
+    try {
+      await handleTelemetryData(telemetry, req.nodeAuth);
+      accepted.push(index);
+    } catch (error) {
+      logger.error(`Error processing telemetry batch sample ${index}:`, error);
+      rejected.push({ index, error: 'Failed to process telemetry', retryable: true });
+    }
+  }
+
+  res.status(accepted.length ? 201 : 422).json({
+    success: rejected.length === 0,
+    count: accepted.length,
+    accepted,
+    rejected
+  });
+});
+
 // GET /api/telemetry - Get latest telemetry
 router.get('/', async (req, res) => {
   try {
@@ -0,0 +1,131 @@
+"""
+Campus Telemetry Stream
+Pushes telemetry to the campus controller over a persistent WebSocket
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Any
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger(__name__)
+
+
+class CampusStream:
+    """
+    Streams the latest telemetry sample to the campus controller
+
+    The connection opens with a hello frame that registers the node, so
+    the campus learns about it immediately instead of on its next
+    discovery pass. Only the newest sample is kept: if the link is slower
+    than collection, intermediate samples are skipped rather than queued
+    (the aggregator uplink keeps the full history). The connection is
+    re-established with exponential backoff.
+    """
+
+    def __init__(self,
+                 url: str,
+                 hello: Dict[str, Any],
+                 token: str = "",
+                 max_backoff_s: float = 30.0):
+        """
+        Initialize stream
+
+        Args:
+            url: Campus WebSocket URL (e.g. ws://campus:8100/ws/telemetry)
+            hello: Node description sent on connect (node_id, capacity, endpoint)
+            token: Campus stream token, sent as a bearer Authorization header
+            max_backoff_s: Longest wait between reconnect attempts
+        """
+        self.url = url
+        self.hello = hello
+        self.token = token
+        self.max_backoff_s = max_backoff_s
+
+        self._latest: Optional[Dict[str, Any]] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.connected = False
+        self.sent_samples = 0
+        self.skipped_samples = 0
+        self.reconnects = 0
+
+    def offer(self, telemetry: Dict[str, Any]):
+        """Make a sample the next one to send, replacing any unsent sample"""
+        if self._latest is not None:
+            self.skipped_samples += 1
+        self._latest = telemetry
+        self._ready.set()
+
+    async def _next_sample(self) -> Dict[str, Any]:
+        await self._ready.wait()
+        self._ready.clear()
+        sample, self._latest = self._latest, None
+        return sample
+
+    async def _session(self):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else None
+        async with websockets.connect(self.url, open_timeout=10, extra_headers=headers) as ws:
+            await ws.send(json.dumps({"type": "hello", "node": self.hello}))
+            self.connected = True
+            logger.info(f"Streaming telemetry to campus at {self.url}")
+
+            while True:
+                sample = await self._next_sample()
+                if sample is None:
+                    continue
+                try:
+                    await ws.send(json.dumps({"type": "telemetry", "data": sample}))
+                except ConnectionClosed:
+                    # Resend this sample on the next connection unless a newer one arrives
+                    if self._latest is None:
+                        self._latest = sample
+                        self._ready.set()
+                    raise
+                self.sent_samples += 1
+
+    async def run(self):
+        """Connect and stream until cancelled"""
+        backoff = 1.0
+        while True:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Campus stream disconnected: {e!r}")
+            finally:
+                if self.connected:
+                    # Session was established: start backoff over
+                    backoff = 1.0
+                self.connected = False
+
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(self.max_backoff_s, backoff * 2)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "sent_samples": self.sent_samples,
+            "skipped_samples": self.skipped_samples,
+            "reconnects": self.reconnects
+        }
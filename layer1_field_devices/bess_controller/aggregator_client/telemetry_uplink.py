@@ -0,0 +1,232 @@
+"""
+Aggregator Telemetry Uplink
+Persistent pooled HTTP client with batched, gzip-compressed uploads and a local disk spool
+"""
+
+import gzip
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetrySpool:
+    """
+    Append-only disk spool for batches the aggregator did not accept
+
+    Each line is one JSON batch. Batches are replayed oldest first and the
+    file is rewritten (atomically) with whatever is still unsent.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def has_pending(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def append(self, batch: List[Dict[str, Any]]) -> bool:
+        """Spool a batch; returns False if the spool is full"""
+        line = json.dumps(batch) + '\n'
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size + len(line) > self.max_bytes:
+            logger.error(f"Telemetry spool full ({size} bytes), dropping {len(batch)} samples")
+            return False
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        return True
+
+    def read(self) -> List[List[Dict[str, Any]]]:
+        """Load all spooled batches, oldest first"""
+        if not self.has_pending():
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def replace(self, batches: List[List[Dict[str, Any]]]):
+        """Atomically replace the spool contents"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for batch in batches:
+                f.write(json.dumps(batch) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+class TelemetryUplink:
+    """
+    Publishes BESS telemetry to the aggregator
+
+    A single long-lived httpx.AsyncClient is reused for all requests so
+    connections stay alive. Samples are uploaded in batches to
+    /api/telemetry/batch, optionally gzip-compressed. Batches that fail are
+    spooled to disk and replayed in order before any newer data is sent.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 node_id: str,
+                 batch_size: int = 20,
+                 compress: bool = True,
+                 http2: bool = False,
+                 spool_path: Optional[str] = None,
+                 timeout: float = 5.0):
+        """
+        Initialize uplink
+
+        Args:
+            base_url: Aggregator base URL
+            node_id: Node ID stamped on samples as dc_id
+            batch_size: Max samples per upload request
+            compress: gzip request bodies
+            http2: Use HTTP/2 (requires the h2 package)
+            spool_path: Disk spool file for unsent batches (None disables spooling)
+            timeout: Request timeout in seconds
+        """
+        self.base_url = base_url
+        self.node_id = node_id
+        self.batch_size = batch_size
+        self.compress = compress
+        self.spool = TelemetrySpool(spool_path) if spool_path else None
+
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2)
+        )
+
+        # Statistics
+        self.samples_sent = 0
+        self.requests_sent = 0
+        self.failed_requests = 0
+
+    async def close(self):
+        """Close pooled connections"""
+        await self.client.aclose()
+
+    async def _post_batch(self, batch: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Upload one batch
+
+        Returns:
+            The samples worth re-sending (empty if all were stored), or None
+            if the request failed as a whole. Samples the aggregator rejects
+            as invalid are dropped, so one bad sample can't block the spool.
+        """
+        body = json.dumps({"samples": batch}).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+        try:
+            response = await self.client.post("/api/telemetry/batch", content=body, headers=headers)
+            self.requests_sent += 1
+        except httpx.HTTPError as e:
+            self.failed_requests += 1
+            logger.warning(f"Telemetry upload failed: {e}")
+            return None
+
+        if response.status_code not in (201, 422):
+            self.failed_requests += 1
+            logger.warning(f"Failed to publish telemetry: {response.status_code}")
+            return None
+
+        try:
+            result = response.json()
+            rejected = result.get("rejected", [])
+        except ValueError:
+            logger.warning("Unreadable telemetry batch response")
+            self.failed_requests += 1
+            return None
+
+        retry = [batch[r["index"]] for r in rejected if r.get("retryable", True) and 0 <= r["index"] < len(batch)]
+        dropped = len(rejected) - len(retry)
+        if dropped:
+            logger.error(f"Aggregator rejected {dropped} invalid telemetry samples: {rejected[0].get('error')}")
+        if retry:
+            logger.warning(f"Aggregator could not store {len(retry)}/{len(batch)} samples, re-sending later")
+
+        self.samples_sent += len(batch) - len(rejected)
+        return retry
+
+    async def _replay_spool(self) -> bool:
+        """
+        Replay spooled batches in order
+
+        Returns:
+            True if every batch reached the aggregator (samples it could
+            not store are spooled again, behind nothing older)
+        """
+        if self.spool is None or not self.spool.has_pending():
+            return True
+
+        pending = self.spool.read()
+        sent = 0
+        unsent: List[List[Dict[str, Any]]] = []
+        for batch in pending:
+            retry = await self._post_batch(batch)
+            if retry is None:
+                break
+            sent += 1
+            if retry:
+                unsent.append(retry)
+
+        if sent:
+            logger.info(f"Replayed {sent}/{len(pending)} spooled telemetry batches")
+            self.spool.replace(unsent + pending[sent:])
+
+        return sent == len(pending)
+
+    async def publish(self, samples: List[Dict[str, Any]]) -> bool:
+        """
+        Publish samples (oldest first)
+
+        Spooled data is replayed first; if the aggregator is still
+        unreachable the new samples are spooled behind it. Only samples
+        the aggregator did not store are spooled, so nothing is sent twice.
+
+        Returns:
+            True if all samples were delivered now
+        """
+        for sample in samples:
+            sample.setdefault("dc_id", self.node_id)
+
+        batches = [samples[i:i + self.batch_size] for i in range(0, len(samples), self.batch_size)]
+
+        reachable = await self._replay_spool()
+        delivered = reachable and not (self.spool is not None and self.spool.has_pending())
+        unsent: List[List[Dict[str, Any]]] = []
+        for index, batch in enumerate(batches):
+            retry = await self._post_batch(batch) if reachable else None
+            if retry is None:
+                reachable = delivered = False
+                unsent.extend(batches[index:])
+                break
+            if retry:
+                delivered = False
+                unsent.append(retry)
+
+        if unsent:
+            if self.spool is not None:
+                for batch in unsent:
+                    self.spool.append(batch)
+            else:
+                logger.error(f"Dropping {sum(len(b) for b in unsent)} telemetry samples")
+
+        return delivered
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Uplink statistics"""
+        return {
+            "samples_sent": self.samples_sent,
+            "requests_sent": self.requests_sent,
+            "failed_requests": self.failed_requests,
+            "spool_pending": self.spool is not None and self.spool.has_pending()
+        }
@@ -4,7 +4,9 @@ Parses CAN bus messages from BMS for cell-level monitoring
 """
 
 import logging
-from typing import Dict, List, Optional, Any
+from array import array
+from math import isnan, nan
+from typing import List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
@@ -30,7 +32,7 @@ class BMSMessageID(Enum):
     WARNINGS = 0x132            # Warning status
 
 
-@dataclass
+@dataclass(slots=True)
 class CellData:
     """Individual cell data"""
     cell_id: int
@@ -39,6 +41,147 @@ class CellData:
     balancing: bool = False     # Cell balancing active
 
 
+class CellArray:
+    """
+    Array-backed cell voltages and temperatures
+
+    Voltages and temperatures live in contiguous float arrays indexed by
+    cell slot (cell_id - 1). Min/max/mean are maintained incrementally on
+    every write, so pack statistics are O(1) reads. A full rescan is only
+    needed when the current extreme cell moves back towards the middle.
+    Missing temperature readings are stored as NaN.
+
+    Voltage statistics are None until every cell has reported at least
+    once, so placeholder slots never look like a dead cell.
+    """
+
+    __slots__ = (
+        "voltages", "temperatures", "balancing", "_reported", "_reported_count",
+        "_v_sum", "_v_min", "_v_max", "_v_min_idx", "_v_max_idx",
+        "_t_sum", "_t_count", "_t_max", "_t_max_idx",
+    )
+
+    def __init__(self, num_cells: int, initial_voltage: float = 0.0):
+        self.voltages = array('d', [initial_voltage] * num_cells)
+        self.temperatures = array('d', [nan] * num_cells)
+        self.balancing = False
+        self._reported = bytearray(num_cells)
+        self._reported_count = 0
+
+        self._v_sum = initial_voltage * num_cells
+        self._v_min = initial_voltage if num_cells else nan
+        self._v_max = initial_voltage if num_cells else nan
+        self._v_min_idx = 0
+        self._v_max_idx = 0
+
+        self._t_sum = 0.0
+        self._t_count = 0
+        self._t_max = nan
+        self._t_max_idx = -1
+
+    def __len__(self) -> int:
+        return len(self.voltages)
+
+    @property
+    def complete(self) -> bool:
+        """Every cell has reported a voltage"""
+        return self._reported_count == len(self.voltages)
+
+    def set_voltage(self, index: int, voltage: float):
+        """Update one cell voltage and its aggregates"""
+        old = self.voltages[index]
+        self.voltages[index] = voltage
+        self._v_sum += voltage - old
+
+        if not self._reported[index]:
+            self._reported[index] = 1
+            self._reported_count += 1
+            if self.complete:
+                # Placeholders are gone; baseline the extremes on real readings
+                self._rescan_voltage_min()
+                self._rescan_voltage_max()
+                return
+
+        if voltage <= self._v_min:
+            self._v_min = voltage
+            self._v_min_idx = index
+        elif index == self._v_min_idx:
+            self._rescan_voltage_min()
+
+        if voltage >= self._v_max:
+            self._v_max = voltage
+            self._v_max_idx = index
+        elif index == self._v_max_idx:
+            self._rescan_voltage_max()
+
+    def set_temperature(self, index: int, temperature: Optional[float]):
+        """Update one cell temperature (None clears the reading)"""
+        new = nan if temperature is None else temperature
+        old = self.temperatures[index]
+        self.temperatures[index] = new
+
+        if not isnan(old):
+            self._t_sum -= old
+            self._t_count -= 1
+        if not isnan(new):
+            self._t_sum += new
+            self._t_count += 1
+
+        if not isnan(new) and (self._t_max_idx < 0 or new >= self._t_max):
+            self._t_max = new
+            self._t_max_idx = index
+        elif index == self._t_max_idx:
+            self._rescan_temperature_max()
+
+    def _rescan_voltage_min(self):
+        self._v_min = min(self.voltages)
+        self._v_min_idx = self.voltages.index(self._v_min)
+
+    def _rescan_voltage_max(self):
+        self._v_max = max(self.voltages)
+        self._v_max_idx = self.voltages.index(self._v_max)
+
+    def _rescan_temperature_max(self):
+        self._t_max = nan
+        self._t_max_idx = -1
+        for i, temp in enumerate(self.temperatures):
+            if not isnan(temp) and (self._t_max_idx < 0 or temp > self._t_max):
+                self._t_max = temp
+                self._t_max_idx = i
+
+    @property
+    def min_voltage(self) -> Optional[float]:
+        return self._v_min if self.complete and self.voltages else None
+
+    @property
+    def max_voltage(self) -> Optional[float]:
+        return self._v_max if self.complete and self.voltages else None
+
+    @property
+    def mean_voltage(self) -> Optional[float]:
+        return self._v_sum / len(self.voltages) if self.complete and self.voltages else None
+
+    @property
+    def max_temperature(self) -> Optional[float]:
+        return self._t_max if self._t_max_idx >= 0 else None
+
+    @property
+    def mean_temperature(self) -> Optional[float]:
+        return self._t_sum / self._t_count if self._t_count else None
+
+    def to_cells(self) -> List[CellData]:
+        """Materialize per-cell objects (API/debug use, not the hot path)"""
+        return [
+            CellData(
+                cell_id=i + 1,
+                voltage=voltage,
+                temperature=None if isnan(temp) else temp,
+                balancing=self.balancing
+            )
+            for i, (voltage, temp) in enumerate(zip(self.voltages, self.temperatures))
+        ]
+
+
 @dataclass
 class PackData:
     """Battery pack aggregate data"""
@@ -49,31 +192,45 @@ class PackData:
     max_charge_current: float   # Max allowed charge current (A)
     max_discharge_current: float # Max allowed discharge current (A)
     cycle_count: int            # Total charge cycles
-    cells: List[CellData]       # Individual cell data
+    cell_array: CellArray       # Array-backed cell data
+
+    # Derived metrics (precomputed by CellArray)
+    @property
+    def num_cells(self) -> int:
+        return len(self.cell_array)
+
+    @property
+    def cells(self) -> List[CellData]:
+        return self.cell_array.to_cells()
 
-    # Derived metrics
     @property
-    def min_cell_voltage(self) -> float:
-        return min(cell.voltage for cell in self.cells)
+    def min_cell_voltage(self) -> Optional[float]:
+        return self.cell_array.min_voltage
 
     @property
-    def max_cell_voltage(self) -> float:
-        return max(cell.voltage for cell in self.cells)
+    def max_cell_voltage(self) -> Optional[float]:
+        return self.cell_array.max_voltage
 
     @property
-    def voltage_delta(self) -> float:
-        """Cell voltage imbalance"""
+    def mean_cell_voltage(self) -> Optional[float]:
+        return self.cell_array.mean_voltage
+
+    @property
+    def voltage_delta(self) -> Optional[float]:
+        """Cell voltage imbalance (None until every cell has reported)"""
+        if not self.cell_array.complete:
+            return None
         return self.max_cell_voltage - self.min_cell_voltage
 
     @property
     def max_cell_temperature(self) -> Optional[float]:
-        temps = [cell.temperature for cell in self.cells if cell.temperature is not None]
-        return max(temps) if temps else None
+        return self.cell_array.max_temperature
 
     @property
     def is_balanced(self) -> bool:
         """Check if cells are balanced (< 50mV difference)"""
-        return self.voltage_delta < 0.05
+        delta = self.voltage_delta
+        return delta is not None and delta < 0.05
 
 
 @dataclass
@@ -124,9 +281,9 @@ class BMSParser:
         self.num_cells = num_cells
         self.num_temp_sensors = num_temp_sensors
 
-        # Buffers for multi-message data
-        self.cell_voltages: Dict[int, float] = {}
-        self.cell_temperatures: Dict[int, float] = {}
+        # Cell data is written straight into the array-backed store so
+        # pack statistics stay current without rebuilding per message
+        self.cell_array = CellArray(num_cells)
 
         self.pack_data: Optional[PackData] = None
         self.alarms: BMSAlarms = BMSAlarms()
@@ -174,7 +331,7 @@ class BMSParser:
 
             cell_id = start_cell + i
             if cell_id <= self.num_cells:
-                self.cell_voltages[cell_id] = voltage_v
+                self.cell_array.set_voltage(cell_id - 1, voltage_v)
 
         return "cell_voltages"
 
@@ -188,10 +345,16 @@ class BMSParser:
 
             sensor_id = start_sensor + i
             if sensor_id <= self.num_temp_sensors:
-                self.cell_temperatures[sensor_id] = temp_c
+                self._set_sensor_temperature(sensor_id, temp_c)
 
         return "cell_temperatures"
 
+    def _set_sensor_temperature(self, sensor_id: int, temp_c: float):
+        """Apply a sensor reading to the cells it covers (2 cells per sensor)"""
+        first_cell = (sensor_id - 1) * 2
+        for index in range(first_cell, min(first_cell + 2, self.num_cells)):
+            self.cell_array.set_temperature(index, temp_c)
+
     def _parse_pack_status(self, data: bytes) -> str:
         """Parse pack voltage, current, SOC"""
         # Pack voltage (2 bytes, uint16, in 0.1V)
@@ -257,6 +420,7 @@ class BMSParser:
         # Info bits (byte 2)
         info_byte = data[2]
         self.alarms.balancing_active = bool(info_byte & 0x01)
+        self.cell_array.balancing = self.alarms.balancing_active
 
         if self.alarms.has_critical_fault():
             logger.error(f"BMS CRITICAL FAULT: {self.alarms}")
@@ -270,35 +434,29 @@ class BMSParser:
         if not hasattr(self, '_pack_voltage'):
             return  # Not enough data yet
 
-        # Build cell data list
-        cells = []
-        for cell_id in range(1, self.num_cells + 1):
-            voltage = self.cell_voltages.get(cell_id, 0.0)
-
-            # Map cell to temperature sensor (e.g., 2 cells per sensor)
-            temp_sensor_id = (cell_id - 1) // 2 + 1
-            temperature = self.cell_temperatures.get(temp_sensor_id)
-
-            # Check if balancing (example: based on voltage delta)
-            balancing = self.alarms.balancing_active
-
-            cells.append(CellData(
-                cell_id=cell_id,
-                voltage=voltage,
-                temperature=temperature,
-                balancing=balancing
-            ))
-
-        self.pack_data = PackData(
-            pack_voltage=self._pack_voltage,
-            pack_current=self._pack_current,
-            soc=self._soc,
-            soh=self._soh,
-            max_charge_current=self._max_charge_current,
-            max_discharge_current=self._max_discharge_current,
-            cycle_count=self._cycle_count,
-            cells=cells
-        )
+        # Cell statistics are maintained by the shared CellArray; only the
+        # pack-level scalars need refreshing here
+        if self.pack_data is None:
+            self.pack_data = PackData(
+                pack_voltage=self._pack_voltage,
+                pack_current=self._pack_current,
+                soc=self._soc,
+                soh=self._soh,
+                max_charge_current=self._max_charge_current,
+                max_discharge_current=self._max_discharge_current,
+                cycle_count=self._cycle_count,
+                cell_array=self.cell_array
+            )
+            return
+
+        pack = self.pack_data
+        pack.pack_voltage = self._pack_voltage
+        pack.pack_current = self._pack_current
+        pack.soc = self._soc
+        pack.soh = self._soh
+        pack.max_charge_current = self._max_charge_current
+        pack.max_discharge_current = self._max_discharge_current
+        pack.cycle_count = self._cycle_count
 
     def get_pack_data(self) -> Optional[PackData]:
         """Get complete pack data"""
@@ -323,15 +481,15 @@ class SimulatedBMS(BMSParser):
         """Generate simulated BMS data"""
         # Simulate cell voltages (3.6V - 3.7V per cell)
         import random
-        for cell_id in range(1, self.num_cells + 1):
-            self.cell_voltages[cell_id] = 3.65 + random.uniform(-0.05, 0.05)
+        for index in range(self.num_cells):
+            self.cell_array.set_voltage(index, 3.65 + random.uniform(-0.05, 0.05))
 
         # Simulate cell temperatures (20-30°C)
         for sensor_id in range(1, self.num_temp_sensors + 1):
-            self.cell_temperatures[sensor_id] = 25.0 + random.uniform(-5, 5)
+            self._set_sensor_temperature(sensor_id, 25.0 + random.uniform(-5, 5))
 
         # Simulate pack data
-        self._pack_voltage = sum(self.cell_voltages.values())
+        self._pack_voltage = self.cell_array.mean_voltage * self.num_cells
         self._pack_current = 0.0
         self._soc = 80.0
         self._soh = 95.0
@@ -7,17 +7,19 @@ Provides unified interface for BESS hardware control
 import asyncio
 import logging
 import os
-from typing import Dict, Any, Optional
-from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from dataclasses import asdict
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
-import httpx
 
 # Import BESS subsystems
 from modbus_interface.modbus_client import ModbusBESSClient, SimulatedModbusClient, BESSStatus
 from bms_integration.bms_parser import BMSParser, SimulatedBMS, PackData
 from inverter_control.sunspec_inverter import SunSpecInverter, SimulatedInverter
 from safety_manager.safety_interlocks import SafetyManager, SafetyLimits, SafetyViolation
+from aggregator_client.telemetry_uplink import TelemetryUplink
+from aggregator_client.campus_stream import CampusStream
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,13 +30,28 @@ CAMPUS_ID = os.getenv("CAMPUS_ID", "CAMPUS_MUMBAI_ANDHERI")
 MODE = os.getenv("MODE", "simulation")  # 'hardware' or 'simulation'
 MQTT_BROKER = os.getenv("MQTT_BROKER_URL", "mqtt://localhost:1883")
 AGGREGATOR_URL = os.getenv("AGGREGATOR_URL", "http://localhost:3000")
-TELEMETRY_INTERVAL = int(os.getenv("TELEMETRY_INTERVAL", "5"))
+TELEMETRY_INTERVAL = float(os.getenv("TELEMETRY_INTERVAL", "5"))
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "100"))  # Samples buffered for publishing
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "10"))  # Max samples drained per publish
+TELEMETRY_GZIP = os.getenv("TELEMETRY_GZIP", "true").lower() == "true"
+AGGREGATOR_HTTP2 = os.getenv("AGGREGATOR_HTTP2", "false").lower() == "true"
+TELEMETRY_SPOOL_PATH = os.getenv("TELEMETRY_SPOOL_PATH", "spool/telemetry.jsonl")  # Empty disables spooling
+
+# Push telemetry to the campus controller (e.g. ws://campus_mumbai:8100/ws/telemetry); empty keeps pull mode
+CAMPUS_STREAM_URL = os.getenv("CAMPUS_STREAM_URL", "")
+CAMPUS_STREAM_TOKEN = os.getenv("CAMPUS_STREAM_TOKEN", "")  # Must match the campus STREAM_TOKEN
+BESS_ENDPOINT_URL = os.getenv("BESS_ENDPOINT_URL")  # URL the campus uses for setpoints
+BUILDING_ID = os.getenv("BUILDING_ID")
 
 # Modbus configuration (for hardware mode)
 MODBUS_HOST = os.getenv("MODBUS_HOST", "192.168.1.100")
 MODBUS_PORT = int(os.getenv("MODBUS_PORT", "502"))
 MODBUS_UNIT_ID = int(os.getenv("MODBUS_UNIT_ID", "1"))
 
+# Safety violation history
+SAFETY_HISTORY_SIZE = int(os.getenv("SAFETY_HISTORY_SIZE", "1000"))
+SAFETY_HISTORY_PATH = os.getenv("SAFETY_HISTORY_PATH")  # Optional append-only JSONL log
+
 
 # FastAPI app
 app = FastAPI(title="BESS Controller", version="1.0.0")
@@ -73,13 +90,32 @@ class BESSController:
             self.inverter = SunSpecInverter(self.modbus)
 
         # Safety manager
-        self.safety = SafetyManager(limits=SafetyLimits())
+        self.safety = SafetyManager(
+            limits=SafetyLimits(),
+            history_size=SAFETY_HISTORY_SIZE,
+            history_path=SAFETY_HISTORY_PATH
+        )
 
         # State
         self.last_telemetry: Optional[Dict] = None
+        self.publish_queue: asyncio.Queue = asyncio.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self.dropped_samples = 0
         self.is_running = False
         self.enabled = False
 
+        # Aggregator uplink (pooled client, batched uploads, disk spool)
+        self.uplink = TelemetryUplink(
+            base_url=AGGREGATOR_URL,
+            node_id=self.bess_id,
+            batch_size=PUBLISH_BATCH_SIZE,
+            compress=TELEMETRY_GZIP,
+            http2=AGGREGATOR_HTTP2,
+            spool_path=TELEMETRY_SPOOL_PATH or None
+        )
+
+        # Campus push stream (optional)
+        self.campus_stream: Optional[CampusStream] = None
+
         # MQTT client (if available)
         self.mqtt_client = None
 
@@ -99,6 +135,9 @@ class BESSController:
         # Register with aggregator
         await self.register_with_aggregator()
 
+        if CAMPUS_STREAM_URL:
+            await self.start_campus_stream()
+
         self.is_running = True
         logger.info("BESS Controller started successfully")
 
@@ -112,6 +151,11 @@ class BESSController:
         # Disconnect from hardware
         await self.modbus.disconnect()
 
+        self.safety.history.close()
+        await self.uplink.close()
+        if self.campus_stream is not None:
+            await self.campus_stream.close()
+
         self.is_running = False
         logger.info("BESS Controller stopped")
 
@@ -133,26 +177,46 @@ class BESSController:
                 "status": "online"
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{AGGREGATOR_URL}/api/nodes/register",
-                    json=payload,
-                    timeout=10.0
-                )
+            response = await self.uplink.client.post(
+                "/api/nodes/register",
+                json=payload,
+                timeout=10.0
+            )
 
-                if response.status_code == 200:
-                    logger.info(f"Registered with aggregator: {self.bess_id}")
-                else:
-                    logger.warning(f"Failed to register with aggregator: {response.status_code}")
+            if response.status_code == 200:
+                logger.info(f"Registered with aggregator: {self.bess_id}")
+            else:
+                logger.warning(f"Failed to register with aggregator: {response.status_code}")
 
         except Exception as e:
             logger.error(f"Error registering with aggregator: {e}")
 
+    async def start_campus_stream(self):
+        """Open the push stream to the campus controller"""
+        status = await self.modbus.read_bess_status()
+        self.campus_stream = CampusStream(
+            CAMPUS_STREAM_URL,
+            hello={
+                "node_id": self.bess_id,
+                "campus_id": self.campus_id,
+                "building_id": BUILDING_ID,
+                "type": "bess",
+                "capacity_kwh": status.capacity_kwh if status else 200.0,
+                "max_power_kw": status.max_power_kw if status else 100.0,
+                "endpoint_url": BESS_ENDPOINT_URL
+            },
+            token=CAMPUS_STREAM_TOKEN
+        )
+        self.campus_stream.start()
+
     async def collect_telemetry(self) -> Dict[str, Any]:
         """Collect complete BESS telemetry"""
 
-        # Read Modbus telemetry
-        modbus_status = await self.modbus.read_bess_status()
+        # Read Modbus and inverter telemetry concurrently
+        modbus_status, inverter_data = await asyncio.gather(
+            self.modbus.read_bess_status(),
+            self.inverter.read_telemetry()
+        )
         if not modbus_status:
             logger.error("Failed to read Modbus telemetry")
             return None
@@ -161,9 +225,6 @@ class BESSController:
         pack_data = self.bms.get_pack_data()
         bms_alarms = self.bms.get_alarms()
 
-        # Read inverter telemetry
-        inverter_data = await self.inverter.read_telemetry()
-
         # Build telemetry payload
         telemetry = {
             "bess_id": self.bess_id,
@@ -194,6 +255,9 @@ class BESSController:
                 "faults": modbus_status.faults
             },
 
+            # BMS alarm/fault flags (checked by SafetyManager here and by the campus before dispatch)
+            "alarms": asdict(bms_alarms),
+
             # BMS details (if available)
             "bms": None,
 
@@ -214,10 +278,11 @@ class BESSController:
                 "pack_current": pack_data.pack_current,
                 "min_cell_voltage": pack_data.min_cell_voltage,
                 "max_cell_voltage": pack_data.max_cell_voltage,
+                "mean_cell_voltage": pack_data.mean_cell_voltage,
                 "voltage_delta": pack_data.voltage_delta,
                 "max_cell_temperature": pack_data.max_cell_temperature,
                 "is_balanced": pack_data.is_balanced,
-                "num_cells": len(pack_data.cells),
+                "num_cells": pack_data.num_cells,
                 "alarms": {
                     "critical_fault": bms_alarms.has_critical_fault(),
                     "warnings": bms_alarms.has_warnings()
@@ -327,39 +392,77 @@ class BESSController:
         await self.set_power(0.0)
         logger.critical("EMERGENCY STOP ACTIVATED")
 
-    async def publish_telemetry(self, telemetry: Dict[str, Any]):
-        """Publish telemetry to aggregator"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{AGGREGATOR_URL}/api/telemetry",
-                    json=telemetry,
-                    timeout=5.0
-                )
-
-                if response.status_code != 200:
-                    logger.warning(f"Failed to publish telemetry: {response.status_code}")
+    def enqueue_telemetry(self, telemetry: Dict[str, Any]):
+        """Queue a sample for publishing, dropping the oldest if the queue is full"""
+        if self.publish_queue.full():
+            self.publish_queue.get_nowait()
+            self.dropped_samples += 1
+        self.publish_queue.put_nowait(telemetry)
 
+    async def publish_telemetry_batch(self, samples: List[Dict[str, Any]]):
+        """Publish a batch of queued samples to the aggregator in order"""
+        try:
+            await self.uplink.publish(samples)
         except Exception as e:
             logger.error(f"Error publishing telemetry: {e}")
 
+    async def publish_telemetry(self, telemetry: Dict[str, Any]):
+        """Publish telemetry to aggregator"""
+        await self.publish_telemetry_batch([telemetry])
+
 
 # Global controller instance
 controller = BESSController()
 
 
-# Background telemetry task
+# Background telemetry tasks
 async def telemetry_loop():
-    """Background task to collect and publish telemetry"""
+    """
+    Collect telemetry on a fixed-rate clock
+
+    Deadlines advance by TELEMETRY_INTERVAL from the previous deadline, not
+    from when collection finished, so the sample period does not drift.
+    Publishing runs in a separate task and never delays the next sample.
+    """
+    loop = asyncio.get_running_loop()
+    next_deadline = loop.time()
+
     while controller.is_running:
         try:
             telemetry = await controller.collect_telemetry()
             if telemetry:
-                await controller.publish_telemetry(telemetry)
+                controller.enqueue_telemetry(telemetry)
+                if controller.campus_stream is not None:
+                    controller.campus_stream.offer(telemetry)
         except Exception as e:
             logger.error(f"Error in telemetry loop: {e}")
 
-        await asyncio.sleep(TELEMETRY_INTERVAL)
+        next_deadline += TELEMETRY_INTERVAL
+        delay = next_deadline - loop.time()
+        if delay < 0:
+            # Overran one or more periods: skip the missed ticks rather than bursting
+            missed = int(-delay // TELEMETRY_INTERVAL) + 1
+            logger.warning(f"Telemetry collection overran by {-delay:.3f}s, skipping {missed} tick(s)")
+            next_deadline += missed * TELEMETRY_INTERVAL
+            delay = next_deadline - loop.time()
+
+        await asyncio.sleep(delay)
+
+
+async def publish_loop():
+    """Drain the publish queue in batches of up to PUBLISH_BATCH_SIZE samples"""
+    while controller.is_running:
+        batch = [await controller.publish_queue.get()]
+        while len(batch) < PUBLISH_BATCH_SIZE and not controller.publish_queue.empty():
+            batch.append(controller.publish_queue.get_nowait())
+
+        try:
+            await controller.publish_telemetry_batch(batch)
+        except Exception as e:
+            logger.error(f"Error in publish loop: {e}")
+
+
+background_tasks: List[asyncio.Task] = []
 
 
 # FastAPI routes
@@ -367,12 +470,23 @@ async def telemetry_loop():
 async def startup():
     """Start controller and background tasks"""
     await controller.start()
-    asyncio.create_task(telemetry_loop())
+    background_tasks.append(asyncio.create_task(telemetry_loop()))
+    background_tasks.append(asyncio.create_task(publish_loop()))
 
 
 @app.on_event("shutdown")
 async def shutdown():
     """Stop controller"""
+    for task in background_tasks:
+        task.cancel()
+
+    # Flush queued samples (spooled if the aggregator is unreachable)
+    pending = []
+    while not controller.publish_queue.empty():
+        pending.append(controller.publish_queue.get_nowait())
+    if pending:
+        await controller.publish_telemetry_batch(pending)
+
     await controller.stop()
 
 
@@ -384,7 +498,11 @@ async def health_check():
         "bess_id": controller.bess_id,
         "mode": controller.mode,
         "enabled": controller.enabled,
-        "emergency_stopped": controller.safety.is_emergency_stopped
+        "emergency_stopped": controller.safety.is_emergency_stopped,
+        "publish_queue_depth": controller.publish_queue.qsize(),
+        "dropped_samples": controller.dropped_samples,
+        "uplink": controller.uplink.get_stats(),
+        "campus_stream": controller.campus_stream.get_stats() if controller.campus_stream else None
     }
 
 
@@ -427,24 +545,23 @@ async def control_endpoint(command: ControlCommand):
 
 
 @app.get("/safety/violations")
-async def get_safety_violations():
-    """Get recent safety violations"""
-    violations = controller.safety.get_violation_history(limit=50)
+async def get_safety_violations(limit: int = Query(50, ge=1),
+                                window_seconds: Optional[float] = Query(None, ge=0)):
+    """Get recent safety violations (optionally only those within the last window_seconds)"""
+    history = controller.safety.history
+
+    if window_seconds is not None:
+        start = datetime.utcnow() - timedelta(seconds=window_seconds)
+        violations = history.window(start)
+        violations = violations[max(len(violations) - limit, 0):]
+    else:
+        violations = history.recent_dicts(limit)
 
     return {
         "count": len(violations),
-        "violations": [
-            {
-                "timestamp": v.timestamp.isoformat(),
-                "level": v.level.name,
-                "category": v.category,
-                "message": v.message,
-                "value": v.value,
-                "limit": v.limit,
-                "action": v.action.value
-            }
-            for v in violations
-        ]
+        "total_count": history.total_count,
+        "category_counts": history.category_counts,
+        "violations": violations
     }
 
 
@@ -4,75 +4,20 @@ Implements safety interlocks and emergency shutdown procedures
 """
 
 import logging
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
-from enum import Enum
+import os
+import sys
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-logger = logging.getLogger(__name__)
-
-
-class SafetyLevel(Enum):
-    """Safety alarm severity levels"""
-    NORMAL = 0
-    INFO = 1
-    WARNING = 2
-    CRITICAL = 3
-    EMERGENCY = 4
-
-
-class SafetyAction(Enum):
-    """Actions to take on safety violations"""
-    NONE = "none"
-    LOG = "log"
-    REDUCE_POWER = "reduce_power"
-    STOP = "stop"
-    EMERGENCY_SHUTDOWN = "emergency_shutdown"
-
-
-@dataclass
-class SafetyLimits:
-    """BESS safety operating limits"""
-    # Voltage limits (V)
-    min_cell_voltage: float = 2.8
-    max_cell_voltage: float = 4.2
-    min_pack_voltage: float = 44.8
-    max_pack_voltage: float = 67.2
-
-    # Current limits (A)
-    max_charge_current: float = 100.0
-    max_discharge_current: float = 100.0
+from .violation_history import ViolationHistory
 
-    # Temperature limits (°C)
-    min_temperature: float = -10.0
-    max_temperature: float = 55.0
-    critical_temperature: float = 60.0
+# Limits and violation types are shared with the campus controller
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'shared'))
+from bess_safety import (
+    SafetyLevel, SafetyAction, SafetyLimits, SafetyViolation, bms_alarm_violations
+)
 
-    # SOC limits (%)
-    min_soc: float = 10.0
-    max_soc: float = 95.0
-
-    # Rate limits
-    max_soc_change_rate: float = 1.0  # % per minute
-    max_power_ramp_rate: float = 10.0  # kW per second
-
-    # Cell balancing
-    max_cell_voltage_delta: float = 0.1  # V
-
-    # Degradation
-    min_soh: float = 70.0
-
-
-@dataclass
-class SafetyViolation:
-    """Record of a safety violation"""
-    timestamp: datetime
-    level: SafetyLevel
-    category: str
-    message: str
-    value: Optional[float] = None
-    limit: Optional[float] = None
-    action: SafetyAction = SafetyAction.NONE
+logger = logging.getLogger(__name__)
 
 
 class SafetyManager:
@@ -81,9 +26,12 @@ class SafetyManager:
     Monitors telemetry and enforces safety limits
     """
 
-    def __init__(self, limits: Optional[SafetyLimits] = None):
+    def __init__(self,
+                 limits: Optional[SafetyLimits] = None,
+                 history_size: int = 1000,
+                 history_path: Optional[str] = None):
         self.limits = limits or SafetyLimits()
-        self.violations: List[SafetyViolation] = []
+        self.history = ViolationHistory(capacity=history_size, persist_path=history_path)
         self.is_emergency_stopped = False
         self.power_reduction_factor = 1.0
 
@@ -113,13 +61,17 @@ class SafetyManager:
         temperature = telemetry.get('temperature', 25.0)
         power_kw = telemetry.get('power_kw', 0.0)
 
-        # Cell-level data (if available)
+        # Cell-level data (if available). Prefer the precomputed BMS pack
+        # aggregates; fall back to scanning a raw cell list.
         cells = telemetry.get('cells', [])
+        bms = telemetry.get('bms') or {}
         alarms = telemetry.get('alarms', {})
 
+        cell_stats = self._cell_stats(bms, cells)
+
         # 1. Check cell voltages
-        if cells:
-            violations.extend(self._check_cell_voltages(cells))
+        if cell_stats and None not in cell_stats[:2]:
+            violations.extend(self._check_cell_voltages(*cell_stats[:2]))
 
         # 2. Check pack voltage
         violations.extend(self._check_pack_voltage(pack_voltage))
@@ -128,7 +80,8 @@ class SafetyManager:
         violations.extend(self._check_current(pack_current))
 
         # 4. Check temperature
-        violations.extend(self._check_temperature(temperature, cells))
+        max_cell_temp = cell_stats[2] if cell_stats else None
+        violations.extend(self._check_temperature(temperature, max_cell_temp))
 
         # 5. Check SOC
         violations.extend(self._check_soc(soc))
@@ -144,23 +97,37 @@ class SafetyManager:
             violations.extend(self._check_bms_alarms(alarms))
 
         # Store violations
-        self.violations.extend(violations)
+        self.history.extend(violations)
 
         # Take actions
         self._handle_violations(violations)
 
         return violations
 
-    def _check_cell_voltages(self, cells: List[Dict]) -> List[SafetyViolation]:
-        """Check individual cell voltages"""
-        violations = []
+    @staticmethod
+    def _cell_stats(bms: Dict, cells: List[Dict]) -> Optional[Tuple[Optional[float], Optional[float], Optional[float]]]:
+        """
+        Resolve (min voltage, max voltage, max temperature) for the pack
+
+        Uses the aggregates published by the BMS (maintained incrementally
+        by PackData) when present, otherwise scans the raw cell list.
+        The voltages are None while the BMS has not yet heard from every
+        cell, so the cell voltage checks are skipped rather than tripped
+        by placeholder slots.
+        """
+        if 'min_cell_voltage' in bms or 'max_cell_voltage' in bms:
+            return bms.get('min_cell_voltage'), bms.get('max_cell_voltage'), bms.get('max_cell_temperature')
 
         voltages = [cell.get('voltage', 0.0) for cell in cells]
         if not voltages:
-            return violations
+            return None
+
+        cell_temps = [cell.get('temperature') for cell in cells if cell.get('temperature') is not None]
+        return min(voltages), max(voltages), max(cell_temps) if cell_temps else None
 
-        min_voltage = min(voltages)
-        max_voltage = max(voltages)
+    def _check_cell_voltages(self, min_voltage: float, max_voltage: float) -> List[SafetyViolation]:
+        """Check individual cell voltages"""
+        violations = []
         voltage_delta = max_voltage - min_voltage
 
         # Check min voltage
@@ -259,7 +226,7 @@ class SafetyManager:
 
         return violations
 
-    def _check_temperature(self, pack_temperature: float, cells: List[Dict]) -> List[SafetyViolation]:
+    def _check_temperature(self, pack_temperature: float, max_cell_temp: Optional[float] = None) -> List[SafetyViolation]:
         """Check temperatures"""
         violations = []
 
@@ -296,20 +263,16 @@ class SafetyManager:
             ))
 
         # Check individual cell temperatures
-        if cells:
-            cell_temps = [cell.get('temperature') for cell in cells if cell.get('temperature') is not None]
-            if cell_temps:
-                max_temp = max(cell_temps)
-                if max_temp > self.limits.critical_temperature:
-                    violations.append(SafetyViolation(
-                        timestamp=datetime.utcnow(),
-                        level=SafetyLevel.EMERGENCY,
-                        category="cell_critical_temperature",
-                        message=f"CELL CRITICAL TEMPERATURE: {max_temp:.1f}°C",
-                        value=max_temp,
-                        limit=self.limits.critical_temperature,
-                        action=SafetyAction.EMERGENCY_SHUTDOWN
-                    ))
+        if max_cell_temp is not None and max_cell_temp > self.limits.critical_temperature:
+            violations.append(SafetyViolation(
+                timestamp=datetime.utcnow(),
+                level=SafetyLevel.EMERGENCY,
+                category="cell_critical_temperature",
+                message=f"CELL CRITICAL TEMPERATURE: {max_cell_temp:.1f}°C",
+                value=max_cell_temp,
+                limit=self.limits.critical_temperature,
+                action=SafetyAction.EMERGENCY_SHUTDOWN
+            ))
 
         return violations
 
@@ -407,46 +370,7 @@ class SafetyManager:
 
     def _check_bms_alarms(self, alarms: Dict) -> List[SafetyViolation]:
         """Check BMS alarm flags"""
-        violations = []
-
-        # Critical faults
-        if alarms.get('overvoltage_fault'):
-            violations.append(SafetyViolation(
-                timestamp=datetime.utcnow(),
-                level=SafetyLevel.EMERGENCY,
-                category="bms_overvoltage_fault",
-                message="BMS overvoltage fault",
-                action=SafetyAction.EMERGENCY_SHUTDOWN
-            ))
-
-        if alarms.get('overcurrent_fault'):
-            violations.append(SafetyViolation(
-                timestamp=datetime.utcnow(),
-                level=SafetyLevel.EMERGENCY,
-                category="bms_overcurrent_fault",
-                message="BMS overcurrent fault",
-                action=SafetyAction.EMERGENCY_SHUTDOWN
-            ))
-
-        if alarms.get('overtemperature_fault'):
-            violations.append(SafetyViolation(
-                timestamp=datetime.utcnow(),
-                level=SafetyLevel.EMERGENCY,
-                category="bms_overtemperature_fault",
-                message="BMS overtemperature fault",
-                action=SafetyAction.EMERGENCY_SHUTDOWN
-            ))
-
-        if alarms.get('short_circuit_fault'):
-            violations.append(SafetyViolation(
-                timestamp=datetime.utcnow(),
-                level=SafetyLevel.EMERGENCY,
-                category="bms_short_circuit_fault",
-                message="BMS short circuit fault",
-                action=SafetyAction.EMERGENCY_SHUTDOWN
-            ))
-
-        return violations
+        return bms_alarm_violations(alarms)
 
     def _handle_violations(self, violations: List[SafetyViolation]):
         """Take action on safety violations"""
@@ -530,8 +454,8 @@ class SafetyManager:
 
     def get_violation_history(self, limit: int = 100) -> List[SafetyViolation]:
         """Get recent safety violations"""
-        return self.violations[-limit:]
+        return self.history.recent(limit)
 
     def clear_violation_history(self):
         """Clear violation history"""
-        self.violations.clear()
+        self.history.clear()
@@ -0,0 +1,154 @@
+"""
+Safety Violation History
+Fixed-capacity ring buffer for safety violations with optional append-only persistence
+"""
+
+import json
+import logging
+from array import array
+from typing import Dict, List, Optional, Any, Iterable
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ViolationHistory:
+    """
+    Bounded history of safety violations
+
+    Slots are preallocated, so an alarm storm overwrites the oldest entries
+    instead of growing memory. Each entry's API dict is built once on insert
+    and served from cache. Lifetime per-category counters survive eviction.
+    Violations are assumed to arrive in time order, which lets time-window
+    queries binary-search the buffer.
+    """
+
+    def __init__(self, capacity: int = 1000, persist_path: Optional[str] = None):
+        """
+        Initialize violation history
+
+        Args:
+            capacity: Maximum number of violations kept in memory
+            persist_path: Optional JSON-lines file every violation is appended to
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self._entries: List[Any] = [None] * capacity
+        self._dicts: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._times = array('d', [0.0] * capacity)   # epoch seconds
+        self._head = 0      # next slot to write
+        self._size = 0
+
+        self.total_count = 0
+        self.category_counts: Dict[str, int] = {}
+
+        self.persist_path = persist_path
+        self._file = open(persist_path, 'a', encoding='utf-8') if persist_path else None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def to_dict(violation) -> Dict[str, Any]:
+        """Serialize a SafetyViolation for the API / persistence"""
+        return {
+            "timestamp": violation.timestamp.isoformat(),
+            "level": violation.level.name,
+            "category": violation.category,
+            "message": violation.message,
+            "value": violation.value,
+            "limit": violation.limit,
+            "action": violation.action.value
+        }
+
+    def extend(self, violations: Iterable):
+        """Append violations (oldest first)"""
+        lines = []
+        for violation in violations:
+            entry = self.to_dict(violation)
+
+            slot = self._head
+            self._entries[slot] = violation
+            self._dicts[slot] = entry
+            self._times[slot] = violation.timestamp.timestamp()
+            self._head = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+            self.total_count += 1
+            self.category_counts[violation.category] = self.category_counts.get(violation.category, 0) + 1
+
+            if self._file:
+                lines.append(json.dumps(entry))
+
+        if lines:
+            try:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+            except OSError as e:
+                logger.error(f"Failed to persist safety violations: {e}")
+
+    def append(self, violation):
+        """Append a single violation"""
+        self.extend((violation,))
+
+    def _slot(self, index: int) -> int:
+        """Physical slot of the index-th oldest entry"""
+        return (self._head - self._size + index) % self.capacity
+
+    def _first_index_at_or_after(self, ts: float) -> int:
+        """Binary search (logical index) for the first entry with time >= ts"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._times[self._slot(mid)] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _range(self, start: int, stop: int, source: List) -> List:
+        return [source[self._slot(i)] for i in range(start, stop)]
+
+    def recent(self, limit: int = 100) -> List:
+        """Most recent violations, oldest first"""
+        limit = max(0, min(limit, self._size))
+        return self._range(self._size - limit, self._size, self._entries)
+
+    def recent_dicts(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent violations as cached API dicts, oldest first"""
+        limit = max(0, min(limit, self._size))
+        return self._range(self._size - limit, self._size, self._dicts)
+
+    def window(self, start: datetime, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Violations with start <= timestamp < end, as cached API dicts
+
+        Args:
+            start: Window start (inclusive)
+            end: Window end (exclusive), defaults to now
+        """
+        first = self._first_index_at_or_after(start.timestamp())
+        last = self._first_index_at_or_after(end.timestamp()) if end else self._size
+        return self._range(first, last, self._dicts)
+
+    def window_counts(self, start: datetime, end: Optional[datetime] = None) -> Dict[str, int]:
+        """Per-category counts within a time window (in-memory entries only)"""
+        counts: Dict[str, int] = {}
+        for entry in self.window(start, end):
+            counts[entry["category"]] = counts.get(entry["category"], 0) + 1
+        return counts
+
+    def clear(self):
+        """Drop in-memory entries (counters and persisted file are kept)"""
+        self._entries = [None] * self.capacity
+        self._dicts = [None] * self.capacity
+        self._head = 0
+        self._size = 0
+
+    def close(self):
+        """Close the persistence file"""
+        if self._file:
+            self._file.close()
+            self._file = None
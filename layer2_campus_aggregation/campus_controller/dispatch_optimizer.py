@@ -0,0 +1,139 @@
+"""
+Optimal Campus Dispatch
+Constrained QP dispatch that balances SOC and limits degradation across nodes
+"""
+
+import logging
+from typing import Optional, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DispatchLimits:
+    """Campus-wide parameters for the optimal dispatch"""
+    horizon_h: float = 0.25             # Time the setpoint is expected to hold (h)
+    min_soc: float = 10.0               # %
+    max_soc: float = 95.0               # %
+    degradation_weight: float = 1.0     # Weight of throughput (degradation) cost vs SOC imbalance
+    ramp_window_s: float = 1.0          # Time allowed to reach the setpoint for ramp limits
+
+
+def node_power_bounds(soc: np.ndarray,
+                      energy_kwh: np.ndarray,
+                      rated_kw: np.ndarray,
+                      available_energy_kwh: Optional[np.ndarray] = None,
+                      current_kw: Optional[np.ndarray] = None,
+                      ramp_kw_per_s: Optional[np.ndarray] = None,
+                      limits: Optional[DispatchLimits] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-node feasible power range [lo, hi] (positive=charge)
+
+    Combines rated power, SOC headroom over the horizon, available energy
+    and (optionally) ramp limits from the current setpoint.
+    """
+    limits = limits or DispatchLimits()
+    h = limits.horizon_h
+
+    charge_room = np.maximum(0.0, limits.max_soc - soc) / 100.0 * energy_kwh / h
+    discharge_room = np.maximum(0.0, soc - limits.min_soc) / 100.0 * energy_kwh / h
+    if available_energy_kwh is not None:
+        discharge_room = np.minimum(discharge_room, np.maximum(0.0, available_energy_kwh) / h)
+
+    hi = np.minimum(rated_kw, charge_room)
+    lo = -np.minimum(rated_kw, discharge_room)
+
+    if current_kw is not None and ramp_kw_per_s is not None:
+        step = ramp_kw_per_s * limits.ramp_window_s
+        ramp_lo = current_kw - step
+        ramp_hi = current_kw + step
+
+        # A node too far outside its range to reach it within one ramp step
+        # is pinned to the ramp limit closest to the range
+        pinned = np.where(ramp_lo > hi, ramp_lo, ramp_hi)
+        stuck = (ramp_lo > hi) | (ramp_hi < lo)
+
+        hi = np.where(stuck, pinned, np.minimum(hi, ramp_hi))
+        lo = np.where(stuck, pinned, np.maximum(lo, ramp_lo))
+
+    return lo, hi
+
+
+def solve_optimal_dispatch(total_power_kw: float,
+                           soc: np.ndarray,
+                           soh: np.ndarray,
+                           energy_kwh: np.ndarray,
+                           rated_kw: np.ndarray,
+                           available_energy_kwh: Optional[np.ndarray] = None,
+                           current_kw: Optional[np.ndarray] = None,
+                           ramp_kw_per_s: Optional[np.ndarray] = None,
+                           limits: Optional[DispatchLimits] = None,
+                           tolerance_kw: float = 1e-3) -> Tuple[np.ndarray, float]:
+    """
+    Solve the campus dispatch QP
+
+        minimize   sum_i (soc_i' - soc_avg')^2 + w * (100 / soh_i) * (p_i / rated_i)^2
+        subject to sum_i p_i = P,  lo_i <= p_i <= hi_i
+
+    where soc_i' is node SOC after holding p_i for the horizon and soc_avg'
+    the campus energy-weighted SOC after dispatch (fixed for a given P).
+    The objective is separable, so the KKT conditions give
+    p_i(nu) = clip((a_i q_i - nu / 2) / (a_i + c_i), lo_i, hi_i), and the
+    multiplier nu is found by vectorized bisection on the monotone sum.
+
+    Args:
+        total_power_kw: Requested campus power (positive=charge)
+        soc, soh, energy_kwh, rated_kw: Per-node arrays
+        available_energy_kwh: Optional per-node dischargeable energy
+        current_kw: Optional current setpoints (for ramp limits)
+        ramp_kw_per_s: Optional per-node ramp limits
+        limits: Campus dispatch parameters
+        tolerance_kw: Bisection tolerance on total power
+
+    Returns:
+        (per-node setpoints, unserved power) where unserved is the part of
+        P outside the campus feasible range
+    """
+    limits = limits or DispatchLimits()
+    energy_kwh = np.maximum(energy_kwh, 1e-6)
+    rated_kw = np.maximum(rated_kw, 1e-6)
+
+    lo, hi = node_power_bounds(soc, energy_kwh, rated_kw, available_energy_kwh,
+                               current_kw, ramp_kw_per_s, limits)
+
+    # Clamp the request to what the campus can physically deliver
+    target_kw = float(np.clip(total_power_kw, lo.sum(), hi.sum()))
+    unserved_kw = total_power_kw - target_kw
+
+    # SOC change per kW over the horizon, and power that would bring each node to the average
+    k = 100.0 * limits.horizon_h / energy_kwh
+    soc_avg_after = (np.dot(soc, energy_kwh) + 100.0 * target_kw * limits.horizon_h) / energy_kwh.sum()
+    a = k * k
+    q = (soc_avg_after - soc) / k
+    c = limits.degradation_weight * (100.0 / np.maximum(soh, 1.0)) / (rated_kw * rated_kw)
+
+    denom = a + c
+    aq = a * q
+
+    def allocation(nu: float) -> np.ndarray:
+        return np.clip((aq - 0.5 * nu) / denom, lo, hi)
+
+    # Bracket nu: at nu_lo every node sits at hi, at nu_hi every node at lo
+    nu_lo = float(np.min(2.0 * (aq - hi * denom))) - 1.0
+    nu_hi = float(np.max(2.0 * (aq - lo * denom))) + 1.0
+
+    for _ in range(100):
+        nu = 0.5 * (nu_lo + nu_hi)
+        p = allocation(nu)
+        excess = p.sum() - target_kw
+        if abs(excess) <= tolerance_kw:
+            break
+        if excess > 0:
+            nu_lo = nu
+        else:
+            nu_hi = nu
+
+    return p, unserved_kw
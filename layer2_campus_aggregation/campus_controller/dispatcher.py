@@ -0,0 +1,250 @@
+"""
+Campus Setpoint Dispatcher
+Concurrent setpoint fan-out with acknowledgment tracking and shortfall redistribution
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NodeAck:
+    """Acknowledgment of one setpoint write"""
+    node_id: str
+    power_kw: float
+    acked: bool
+    latency_ms: float
+    error: Optional[str] = None
+    unknown: bool = False       # Request sent but no reply: the node may have applied it
+
+
+@dataclass
+class DispatchResult:
+    """Outcome of a campus dispatch"""
+    requested_kw: float
+    setpoints: Dict[str, float]             # node_id -> acknowledged setpoint
+    failed_nodes: List[str]                 # Nodes that never acknowledged
+    unserved_kw: float                      # Power that could not be placed
+    latency_ms: float                       # End-to-end dispatch latency
+    rounds: int                             # 1 + redistribution rounds used
+    acks: List[NodeAck] = field(default_factory=list)
+    unconfirmed: Dict[str, float] = field(default_factory=dict)   # node_id -> setpoint sent, reply lost
+    safety_limited: Dict[str, List[str]] = field(default_factory=dict)  # node_id -> violated safety rules
+
+    @property
+    def delivered_kw(self) -> float:
+        return sum(self.setpoints.values())
+
+
+def redistribute_shortfall(shortfall_kw: float,
+                           setpoints: Dict[str, float],
+                           power_bounds_kw: Dict[str, Tuple[float, float]]) -> Tuple[Dict[str, float], float]:
+    """
+    Spread a shortfall over nodes in proportion to their remaining headroom
+
+    Args:
+        shortfall_kw: Power left unplaced (positive=charge, negative=discharge)
+        setpoints: Current acknowledged setpoints of the candidate nodes
+        power_bounds_kw: Feasible (lo, hi) power of each candidate node, the
+            same SOC/energy-bounded range the allocator used
+
+    Returns:
+        (new setpoints for nodes that change, power that still does not fit)
+    """
+    direction = 1.0 if shortfall_kw >= 0 else -1.0
+    headroom = {}
+    for node_id, power_kw in setpoints.items():
+        lo, hi = power_bounds_kw.get(node_id, (power_kw, power_kw))
+        headroom[node_id] = max(0.0, hi - power_kw if direction > 0 else power_kw - lo)
+
+    total_headroom = sum(headroom.values())
+    if total_headroom <= 0:
+        return {}, shortfall_kw
+
+    placed = min(abs(shortfall_kw), total_headroom)
+    updates = {
+        node_id: setpoints[node_id] + direction * placed * room / total_headroom
+        for node_id, room in headroom.items()
+        if room > 0
+    }
+    return updates, shortfall_kw - direction * placed
+
+
+class SetpointDispatcher:
+    """
+    Sends power setpoints to campus nodes
+
+    All POST /power requests for a dispatch go out concurrently on the
+    shared client and must complete within the dispatch deadline. Power
+    assigned to nodes that fail to acknowledge is redistributed to the
+    nodes that did, within their rated power, while deadline remains.
+    Each non-final round may use half of the remaining budget.
+
+    A write that timed out after it was sent may still have been applied,
+    so it is reported as unconfirmed rather than failed and its power is
+    not redistributed (that could over-deliver).
+    """
+
+    def __init__(self, client: httpx.AsyncClient, history_size: int = 1000):
+        self.client = client
+        self.dispatch_latencies_ms: deque = deque(maxlen=history_size)
+        self.ack_latencies_ms: deque = deque(maxlen=history_size)
+        self.node_stats: Dict[str, Dict[str, Any]] = {}
+
+    async def _send(self, node_id: str, endpoint_url: str, power_kw: float, timeout_s: float) -> NodeAck:
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                f"{endpoint_url}/power",
+                json={"power_kw": power_kw, "reactive_power_kvar": 0.0},
+                timeout=timeout_s
+            )
+            acked = response.status_code == 200
+            error = None if acked else f"HTTP {response.status_code}"
+            unknown = False
+        except Exception as e:
+            acked = False
+            error = f"{type(e).__name__}: {e}"
+            # Connect/pool timeouts never reached the node; read/write timeouts might have
+            unknown = isinstance(e, (httpx.ReadTimeout, httpx.WriteTimeout))
+
+        ack = NodeAck(
+            node_id=node_id,
+            power_kw=power_kw,
+            acked=acked,
+            latency_ms=(time.perf_counter() - started) * 1000.0,
+            error=error,
+            unknown=unknown
+        )
+        self._record_ack(ack)
+        return ack
+
+    def _record_ack(self, ack: NodeAck):
+        stats = self.node_stats.setdefault(ack.node_id, {"acks": 0, "failures": 0, "unconfirmed": 0,
+                                                            "last_latency_ms": None})
+        if ack.acked:
+            stats["acks"] += 1
+            stats["last_latency_ms"] = ack.latency_ms
+            self.ack_latencies_ms.append(ack.latency_ms)
+            logger.info(f"Dispatched {ack.power_kw:.2f} kW to {ack.node_id} ({ack.latency_ms:.1f} ms)")
+        elif ack.unknown:
+            stats["unconfirmed"] += 1
+            logger.warning(f"No reply from {ack.node_id} for {ack.power_kw:.2f} kW, outcome unknown: {ack.error}")
+        else:
+            stats["failures"] += 1
+            logger.error(f"Failed to dispatch to {ack.node_id}: {ack.error}")
+
+    async def _fan_out(self,
+                       setpoints: Dict[str, float],
+                       endpoints: Dict[str, str],
+                       timeout_s: float) -> List[NodeAck]:
+        return await asyncio.gather(*(
+            self._send(node_id, endpoints[node_id], power_kw, timeout_s)
+            for node_id, power_kw in setpoints.items()
+        ))
+
+    async def dispatch(self,
+                       setpoints: Dict[str, float],
+                       endpoints: Dict[str, str],
+                       power_bounds_kw: Dict[str, Tuple[float, float]],
+                       deadline_s: float = 2.0,
+                       max_rounds: int = 3) -> DispatchResult:
+        """
+        Dispatch setpoints to nodes
+
+        Args:
+            setpoints: node_id -> requested power (kW)
+            endpoints: node_id -> node endpoint URL
+            power_bounds_kw: node_id -> feasible (lo, hi) power, bounds redistribution
+            deadline_s: Time budget for the whole dispatch
+            max_rounds: Initial fan-out plus redistribution rounds
+
+        Returns:
+            DispatchResult
+        """
+        started = time.perf_counter()
+        deadline = started + deadline_s
+
+        requested_kw = sum(setpoints.values())
+        pending = {node_id: power_kw for node_id, power_kw in setpoints.items() if node_id in endpoints}
+        unreachable = [node_id for node_id in setpoints if node_id not in endpoints]
+        shortfall_kw = sum(setpoints[node_id] for node_id in unreachable)
+
+        acked: Dict[str, float] = {}
+        unconfirmed: Dict[str, float] = {}
+        failed = set(unreachable)
+        all_acks: List[NodeAck] = []
+        rounds = 0
+
+        while pending and rounds < max_rounds and time.perf_counter() < deadline:
+            rounds += 1
+
+            # Leave half the remaining budget for redistribution unless this is the last round
+            remaining = max(0.001, deadline - time.perf_counter())
+            round_timeout = remaining if rounds == max_rounds else remaining / 2.0
+            acks = await self._fan_out(pending, endpoints, round_timeout)
+            all_acks.extend(acks)
+
+            for ack in acks:
+                if ack.acked:
+                    acked[ack.node_id] = ack.power_kw
+                elif ack.unknown:
+                    # Neither confirmed nor redistributed; no further writes to this node
+                    unconfirmed[ack.node_id] = ack.power_kw
+                    acked.pop(ack.node_id, None)
+                else:
+                    # A failed update leaves an already-acked node at its old setpoint
+                    shortfall_kw += ack.power_kw - acked.get(ack.node_id, 0.0)
+                    if ack.node_id not in acked:
+                        failed.add(ack.node_id)
+
+            if abs(shortfall_kw) < 0.1:
+                break
+
+            candidates = {node_id: acked[node_id] for node_id in acked if node_id not in failed}
+            pending, shortfall_kw = redistribute_shortfall(shortfall_kw, candidates, power_bounds_kw)
+            if pending:
+                logger.warning(f"Redistributing {sum(pending.values()) - sum(candidates[n] for n in pending):.2f} kW "
+                               f"across {len(pending)} nodes")
+
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        self.dispatch_latencies_ms.append(latency_ms)
+
+        return DispatchResult(
+            requested_kw=requested_kw,
+            setpoints=acked,
+            failed_nodes=sorted(failed),
+            unserved_kw=requested_kw - sum(acked.values()) - sum(unconfirmed.values()),
+            latency_ms=latency_ms,
+            rounds=rounds,
+            acks=all_acks,
+            unconfirmed=unconfirmed
+        )
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, Optional[float]]:
+        if not samples:
+            return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+        ordered = sorted(samples)
+        n = len(ordered)
+
+        def pct(p: float) -> float:
+            return ordered[min(n - 1, int(round(p / 100.0 * (n - 1))))]
+
+        return {"count": n, "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": ordered[-1]}
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """End-to-end and per-ack latency percentiles (ms)"""
+        return {
+            "dispatch_ms": self._percentiles(self.dispatch_latencies_ms),
+            "node_ack_ms": self._percentiles(self.ack_latencies_ms),
+            "nodes": self.node_stats
+        }
@@ -5,20 +5,31 @@ Provides campus-level optimization and redundancy management
 """
 
 import asyncio
+import hmac
 import logging
+import math
 import os
-from typing import Dict, List, Optional, Any
+import time
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 import httpx
+import numpy as np
 
 import sys
 sys.path.append('..')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+from bess_safety import FleetTelemetry, FleetSafetyEvaluator
 from models.location_schema import (
-    Campus, Building, Node, NodeStatus, NodeCapacity,
-    CampusTelemetry, GeoLocation
+    Campus, Building, Node, NodeStatus, NodeCapacity, NodeType,
+    CampusTelemetry, GeoLocation, AggregateStore
 )
+from node_poller import NodePoller
+from dispatcher import SetpointDispatcher, DispatchResult
+from dispatch_optimizer import DispatchLimits, node_power_bounds, solve_optimal_dispatch
+from node_state import NodeStateTable
+from telemetry_history import TelemetryHistory, RESOLUTIONS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,8 +37,39 @@ logger = logging.getLogger(__name__)
 # Environment configuration
 CAMPUS_ID = os.getenv("CAMPUS_ID", "CAMPUS_MUMBAI_ANDHERI")
 AGGREGATOR_URL = os.getenv("AGGREGATOR_URL", "http://localhost:3000")
-LAYER3_URL = os.getenv("LAYER3_URL", "http://layer3_regional:8000")  # Layer 3 regional aggregator
+LAYER3_URL = os.getenv("LAYER3_URL", "http://layer3_regional:8200")  # Layer 3 regional aggregator
 POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "10"))  # seconds
+NODE_TIMEOUT = float(os.getenv("NODE_TIMEOUT", "5.0"))  # Max per-node request timeout (s)
+POLL_STAGGER = float(os.getenv("POLL_STAGGER", "0.5"))  # Window to spread poll requests over (s)
+POLL_MAX_BACKOFF = float(os.getenv("POLL_MAX_BACKOFF", "300"))  # Max skip time for offline nodes (s)
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "200"))  # Shared HTTP pool size
+DISPATCH_DEADLINE_MS = float(os.getenv("DISPATCH_DEADLINE_MS", "2000"))  # Default per-dispatch deadline
+
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.5"))  # Pushed telemetry batching (s)
+STREAM_TOKEN = os.getenv("STREAM_TOKEN", "")  # Bearer token for /ws/telemetry; empty refuses all streams
+DEFAULT_BUILDING_ID = os.getenv("DEFAULT_BUILDING_ID", f"{CAMPUS_ID}_MAIN")  # For streamed nodes without one
+
+# Downsampled history ring sizes (buckets per tier)
+HISTORY_BUCKETS = {
+    "1s": int(os.getenv("HISTORY_1S_BUCKETS", "300")),     # 5 minutes
+    "1m": int(os.getenv("HISTORY_1M_BUCKETS", "1440")),    # 1 day
+    "15m": int(os.getenv("HISTORY_15M_BUCKETS", "672")),   # 7 days
+}
+# Per-node tiers are kept for every node, so they are shorter and only
+# include resolutions the poll interval can fill (~88 B per bucket)
+NODE_HISTORY_BUCKETS = {
+    name: size
+    for name, size in {
+        "1s": HISTORY_BUCKETS["1s"],
+        "1m": int(os.getenv("NODE_HISTORY_1M_BUCKETS", "360")),    # 6 hours
+        "15m": int(os.getenv("NODE_HISTORY_15M_BUCKETS", "672")),  # 7 days
+    }.items()
+    if RESOLUTIONS[name] >= POLL_INTERVAL
+}
+# Streaming nodes additionally get a 1 s tier, allocated while their stream is open
+STREAM_HISTORY_BUCKETS = {"1s": HISTORY_BUCKETS["1s"]}
+NODE_HISTORY_METRICS = ("soc", "soh", "power_kw", "temperature")
+CAMPUS_HISTORY_METRICS = ("total_power_kw", "average_soc", "online_nodes", "total_energy_available_kwh")
 
 # FastAPI app
 app = FastAPI(title="Campus Controller", version="1.0.0")
@@ -37,8 +79,16 @@ app = FastAPI(title="Campus Controller", version="1.0.0")
 class PowerDispatch(BaseModel):
     """Power dispatch command for campus"""
     total_power_kw: float
-    strategy: str = "proportional"  # 'proportional', 'priority', 'balanced'
+    strategy: str = "proportional"  # 'proportional', 'priority', 'balanced', 'optimal'
     node_setpoints: Optional[Dict[str, float]] = None  # Manual per-node setpoints
+    deadline_ms: Optional[float] = None  # Dispatch deadline (defaults to DISPATCH_DEADLINE_MS)
+
+
+class ResponseOffset(BaseModel):
+    """Frequency response added on top of the campus schedule (positive=charge)"""
+    offset_kw: float
+    strategy: Optional[str] = None  # Defaults to the schedule's strategy
+    deadline_ms: Optional[float] = None
 
 
 class OptimizationRequest(BaseModel):
@@ -53,10 +103,47 @@ class CampusController:
 
     def __init__(self, campus_config: Campus):
         self.campus = campus_config
-        self.nodes: Dict[str, Node] = {}  # node_id -> Node
+        self.nodes: Dict[str, Node] = {}  # node_id -> Node (static config; live state is in self.state)
+        self.state = NodeStateTable()  # Hot per-node state as NumPy columns
         self.node_telemetry: Dict[str, Dict] = {}  # node_id -> latest telemetry
+        self.aggregates = AggregateStore()  # Running campus totals, refreshed on every node change
+
+        # Push mode: nodes with an open telemetry stream are not polled
+        self.streaming_nodes: Dict[str, int] = {}  # node_id -> open streams (a reconnect may overlap the old one)
+        self.pending_push: Dict[str, Dict] = {}  # node_id -> newest unapplied pushed sample
+
+        # Rolling min/max/mean tiers; node rows are state table slots, the campus is row 0
+        self.node_history = TelemetryHistory(NODE_HISTORY_METRICS, NODE_HISTORY_BUCKETS)
+        self.campus_history = TelemetryHistory(CAMPUS_HISTORY_METRICS, HISTORY_BUCKETS)
+        # Streaming nodes' 1 s tier; rows are handed out per open stream and reused
+        self.stream_history = TelemetryHistory(NODE_HISTORY_METRICS, STREAM_HISTORY_BUCKETS)
+        self.stream_rows: Dict[str, int] = {}  # node_id -> stream_history row
+        self._free_stream_rows: List[int] = []
         self.is_running = False
 
+        # Shared pooled HTTP client for all node traffic
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS
+            )
+        )
+        self.poller = NodePoller(
+            self.http_client,
+            poll_interval=POLL_INTERVAL,
+            timeout_s=NODE_TIMEOUT,
+            stagger_s=POLL_STAGGER,
+            max_backoff_s=POLL_MAX_BACKOFF,
+            max_concurrency=MAX_CONNECTIONS
+        )
+        self.dispatcher = SetpointDispatcher(self.http_client)
+        self.dispatch_limits = DispatchLimits()
+        self.safety = FleetSafetyEvaluator()  # Pre-validates setpoints against each node's latest telemetry
+
+        # Last scheduled (absolute) dispatch and the response offset riding on it
+        self.schedule = PowerDispatch(total_power_kw=0.0)
+        self.response_offset_kw = 0.0
+
     async def start(self):
         """Start campus controller"""
         logger.info(f"Starting Campus Controller: {self.campus.campus_id}")
@@ -68,12 +155,15 @@ class CampusController:
         await self.register_with_layer3()
 
         self.is_running = True
-        logger.info(f"Campus Controller started: {len(self.nodes)} nodes")
+        logger.info(f"Campus Controller started: {len(self.nodes)} nodes "
+                    f"(history {self.node_history.bytes_per_row // 1024} KB/node, "
+                    f"tiers {', '.join(self.node_history.tiers)})")
 
     async def stop(self):
         """Stop campus controller"""
         logger.info("Stopping Campus Controller")
         self.is_running = False
+        await self.http_client.aclose()
 
     async def discover_nodes(self):
         """Discover all BESS nodes in this campus"""
@@ -94,6 +184,8 @@ class CampusController:
                     for node_data in nodes_data.get('nodes', []):
                         node = Node(**node_data)
                         self.nodes[node.node_id] = node
+                        self.state.add(node)
+                        self.aggregates.upsert(node)
                         logger.info(f"Discovered node: {node.node_id}")
 
                 else:
@@ -110,6 +202,9 @@ class CampusController:
             payload = {
                 "campus_id": self.campus.campus_id,
                 "name": self.campus.name,
+                "city_id": self.campus.city_id,
+                "state_id": self.campus.state_id,
+                "country_id": self.campus.country_id,
                 "location": {
                     "latitude": self.campus.geo_location.latitude,
                     "longitude": self.campus.geo_location.longitude
@@ -135,148 +230,366 @@ class CampusController:
             logger.error(f"Error registering with Layer 3: {e}")
 
     async def poll_node_telemetry(self):
-        """Poll telemetry from all nodes"""
-        for node_id, node in self.nodes.items():
-            try:
-                if not node.endpoint_url:
-                    continue
-
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        f"{node.endpoint_url}/telemetry",
-                        timeout=5.0
-                    )
-
-                    if response.status_code == 200:
-                        telemetry = response.json()
-                        self.node_telemetry[node_id] = telemetry
-
-                        # Update node status
-                        node.status = NodeStatus.ONLINE
-                        node.last_seen = datetime.utcnow()
-                        node.soc = telemetry.get('soc')
-                        node.soh = telemetry.get('soh')
-                        node.power_kw = telemetry.get('power_kw')
-                        node.temperature = telemetry.get('temperature')
-
-                    else:
-                        logger.warning(f"Failed to poll {node_id}: {response.status_code}")
-                        node.status = NodeStatus.OFFLINE
-
-            except Exception as e:
-                logger.error(f"Error polling {node_id}: {e}")
-                node.status = NodeStatus.OFFLINE
+        """Poll telemetry from all nodes that are not streaming, concurrently"""
+        endpoints = {
+            node_id: node.endpoint_url
+            for node_id, node in self.nodes.items()
+            if node.endpoint_url and node_id not in self.streaming_nodes
+        }
 
-    def get_aggregate_capacity(self) -> NodeCapacity:
-        """Calculate aggregate capacity of all campus nodes"""
-        total_power = 0.0
-        total_energy = 0.0
-        available_power = 0.0
-        available_energy = 0.0
-
-        for node in self.nodes.values():
-            total_power += node.capacity.rated_power_kw
-            total_energy += node.capacity.energy_capacity_kwh
-
-            if node.status == NodeStatus.ONLINE:
-                available_power += node.capacity.available_power_kw
-                available_energy += node.capacity.available_energy_kwh
-
-        return NodeCapacity(
-            rated_power_kw=total_power,
-            energy_capacity_kwh=total_energy,
-            available_power_kw=available_power,
-            available_energy_kwh=available_energy
+        results = await self.poller.poll(endpoints)
+        self.apply_telemetry(results)
+
+    def register_streaming_node(self, hello: Dict[str, Any]) -> str:
+        """
+        Register a node that opened a telemetry stream
+
+        Unknown nodes are added straight away (event-driven discovery)
+        instead of waiting for the next aggregator node list.
+        """
+        node_id = hello["node_id"]
+        node = self.nodes.get(node_id)
+
+        if node is None:
+            rated_power = float(hello.get("max_power_kw") or 0.0)
+            energy = float(hello.get("capacity_kwh") or 0.0)
+            node = Node(
+                node_id=node_id,
+                name=hello.get("name") or node_id,
+                type=NodeType(hello.get("type", "bess")),
+                status=NodeStatus.ONLINE,
+                building_id=hello.get("building_id") or DEFAULT_BUILDING_ID,
+                campus_id=self.campus.campus_id,
+                city_id=self.campus.city_id,
+                state_id=self.campus.state_id,
+                country_id=self.campus.country_id,
+                capacity=NodeCapacity(
+                    rated_power_kw=rated_power,
+                    energy_capacity_kwh=energy,
+                    available_power_kw=rated_power,
+                    available_energy_kwh=energy
+                ),
+                endpoint_url=hello.get("endpoint_url")
+            )
+            self.nodes[node_id] = node
+            self.state.add(node)
+            self.aggregates.upsert(node)
+            logger.info(f"Discovered streaming node: {node_id}")
+        elif hello.get("endpoint_url") and hello["endpoint_url"] != node.endpoint_url:
+            # Setpoints go to the configured endpoint; a stream cannot redirect them
+            if node.endpoint_url:
+                logger.warning(f"Ignoring endpoint_url from {node_id} stream hello "
+                               f"(registered: {node.endpoint_url})")
+            else:
+                node.endpoint_url = hello["endpoint_url"]
+
+        self.streaming_nodes[node_id] = self.streaming_nodes.get(node_id, 0) + 1
+        if node_id not in self.stream_rows and "1s" not in self.node_history.tiers:
+            if self._free_stream_rows:
+                row = self._free_stream_rows.pop()
+                self.stream_history.reset_row(row)
+            else:
+                row = len(self.stream_rows)
+            self.stream_rows[node_id] = row
+        return node_id
+
+    def ingest_pushed_telemetry(self, node_id: str, telemetry: Dict[str, Any]):
+        """Buffer a pushed sample; only the newest per node is applied on flush"""
+        self.pending_push[node_id] = telemetry
+
+    def flush_pushed_telemetry(self):
+        """Apply buffered pushed samples in one column-wise batch"""
+        if self.pending_push:
+            pending, self.pending_push = self.pending_push, {}
+            self.apply_telemetry(pending)
+
+    def stream_closed(self, node_id: str):
+        """A node's stream ended: apply its last sample, mark it offline and resume polling it"""
+        remaining = self.streaming_nodes.pop(node_id, 1) - 1
+        if remaining > 0:
+            self.streaming_nodes[node_id] = remaining
+            return
+        self.flush_pushed_telemetry()
+        self.apply_telemetry({node_id: None})
+        row = self.stream_rows.pop(node_id, None)
+        if row is not None:
+            self._free_stream_rows.append(row)
+
+    @staticmethod
+    def _telemetry_values(telemetry: Any) -> Optional[Tuple[Optional[float], ...]]:
+        """(soc, soh, power_kw, temperature) from a sample, or None if the sample is malformed"""
+        if not isinstance(telemetry, dict):
+            return None
+        values = []
+        for key in NODE_HISTORY_METRICS:
+            value = telemetry.get(key)
+            if value is not None:
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                    return None
+                value = float(value)
+            values.append(value)
+        return tuple(values)
+
+    def apply_telemetry(self, results: Dict[str, Optional[Dict[str, Any]]]):
+        """
+        Update node state from polled or pushed telemetry
+
+        Malformed samples are logged and skipped; the rest of the batch is applied.
+
+        Args:
+            results: node_id -> telemetry dict, or None if the node is unreachable
+        """
+        # Column-wise update of the state table; no per-node model mutation
+        failed_slots = []
+        slots, socs, sohs, powers, temperatures = [], [], [], [], []
+
+        for node_id, telemetry in results.items():
+            slot = self.state.slots.get(node_id)
+            if slot is None:
+                continue
+
+            if telemetry is None:
+                failed_slots.append(slot)
+                continue
+
+            values = self._telemetry_values(telemetry)
+            if values is None:
+                logger.warning(f"Dropping malformed telemetry from {node_id}")
+                continue
+
+            self.node_telemetry[node_id] = telemetry
+            slots.append(slot)
+            socs.append(values[0])
+            sohs.append(values[1])
+            powers.append(values[2])
+            temperatures.append(values[3])
+
+        self.state.set_status(failed_slots, NodeStatus.OFFLINE)
+        self.state.update_telemetry(slots, socs, sohs, powers, temperatures)
+
+        for slot in failed_slots:
+            self._update_aggregates(slot, NodeStatus.OFFLINE)
+        for slot, power_kw, soc, soh in zip(slots, powers, socs, sohs):
+            self._update_aggregates(slot, NodeStatus.ONLINE, power_kw, soc, soh)
+
+        self._record_history(slots)
+
+    def _record_history(self, slots: List[int]):
+        """Add this poll's node samples and the campus totals to the history tiers"""
+        now = time.time()
+        if slots:
+            idx = np.asarray(slots, dtype=np.intp)
+            state = self.state
+            values = np.column_stack([state.soc[idx], state.soh[idx], state.power_kw[idx], state.temperature[idx]])
+            self.node_history.record(idx, values, timestamp=now)
+
+            if self.stream_rows:
+                stream_rows = np.array([self.stream_rows.get(state.node_ids[slot], -1) for slot in slots])
+                streamed = stream_rows >= 0
+                if streamed.any():
+                    self.stream_history.record(stream_rows[streamed], values[streamed], timestamp=now)
+
+        agg = self.aggregates
+        self.campus_history.record(
+            [0],
+            [[agg.total_power_kw, agg.average_soc, agg.online_nodes, agg.available_energy_kwh]],
+            timestamp=now
         )
 
-    def get_campus_telemetry(self) -> CampusTelemetry:
-        """Generate aggregated campus telemetry"""
-        online_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.ONLINE]
-        fault_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.FAULT]
+    def _update_aggregates(self,
+                           slot: int,
+                           status: NodeStatus,
+                           power_kw: Optional[float] = None,
+                           soc: Optional[float] = None,
+                           soh: Optional[float] = None):
+        node_id = self.state.node_ids[slot]
+        capacity = self.nodes[node_id].capacity
+        if status != NodeStatus.ONLINE:
+            # Keep last known values; offline nodes do not contribute them anyway
+            power_kw, soc, soh = None, None, None
+        self.aggregates.update(
+            node_id, status,
+            capacity.rated_power_kw, capacity.energy_capacity_kwh,
+            capacity.available_power_kw, capacity.available_energy_kwh,
+            power_kw, soc, soh
+        )
 
-        # Calculate aggregates
-        total_power = sum(n.power_kw for n in online_nodes if n.power_kw is not None)
-        socs = [n.soc for n in online_nodes if n.soc is not None]
-        sohs = [n.soh for n in online_nodes if n.soh is not None]
+    def get_node(self, node_id: str) -> Node:
+        """Node model with its current state (built on demand for the API)"""
+        return self.state.to_node(self.nodes[node_id])
+
+    def get_nodes(self, online_only: bool = False) -> List[Node]:
+        """Node models with current state, optionally online nodes only"""
+        if online_only:
+            return [self.get_node(node_id) for node_id in self.state.online_node_ids()]
+        return [self.get_node(node_id) for node_id in self.nodes]
+
+    async def push_telemetry_to_layer3(self):
+        """Report campus telemetry to the Layer 3 regional aggregator"""
+        payload = {
+            "telemetry": self.get_campus_telemetry().model_dump(mode="json"),
+            "capacity": self.get_aggregate_capacity().model_dump()
+        }
+        try:
+            response = await self.http_client.post(
+                f"{LAYER3_URL}/api/campus/telemetry",
+                json=payload,
+                timeout=5.0
+            )
+            if response.status_code == 404:
+                # Regional aggregator restarted and forgot us
+                await self.register_with_layer3()
+            elif response.status_code != 200:
+                logger.warning(f"Failed to push telemetry to Layer 3: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Error pushing telemetry to Layer 3: {e}")
 
-        avg_soc = sum(socs) / len(socs) if socs else 0.0
-        avg_soh = sum(sohs) / len(sohs) if sohs else 100.0
-        min_soc = min(socs) if socs else 0.0
-        max_soc = max(socs) if socs else 0.0
+    def get_aggregate_capacity(self) -> NodeCapacity:
+        """Aggregate capacity of all campus nodes (maintained incrementally)"""
+        return self.aggregates.capacity()
 
-        capacity = self.get_aggregate_capacity()
+    def get_campus_telemetry(self) -> CampusTelemetry:
+        """Generate aggregated campus telemetry"""
+        agg = self.aggregates
 
         return CampusTelemetry(
             campus_id=self.campus.campus_id,
             timestamp=datetime.utcnow(),
-            total_power_kw=total_power,
-            total_capacity_kwh=capacity.energy_capacity_kwh,
-            average_soc=avg_soc,
-            average_soh=avg_soh,
-            total_nodes=len(self.nodes),
-            online_nodes=len(online_nodes),
-            fault_nodes=len(fault_nodes),
-            min_soc=min_soc,
-            max_soc=max_soc,
-            total_energy_available_kwh=capacity.available_energy_kwh
+            total_power_kw=agg.total_power_kw,
+            total_capacity_kwh=agg.energy_capacity_kwh,
+            average_soc=agg.average_soc,
+            average_soh=agg.average_soh,
+            total_nodes=agg.total_nodes,
+            online_nodes=agg.online_nodes,
+            fault_nodes=agg.fault_nodes,
+            min_soc=agg.min_soc,
+            max_soc=agg.max_soc,
+            total_energy_available_kwh=agg.available_energy_kwh
         )
 
-    async def dispatch_power(self, dispatch: PowerDispatch) -> Dict[str, float]:
+    async def dispatch_power(self, dispatch: PowerDispatch) -> DispatchResult:
         """
         Dispatch power across campus nodes
 
+        The dispatch becomes the campus schedule; an active response
+        offset (see apply_response_offset) stays on top of it.
+
         Args:
             dispatch: Power dispatch command
 
         Returns:
-            Dictionary of node_id -> power_kw setpoints
+            DispatchResult with acknowledged node_id -> power_kw setpoints
         """
-        online_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.ONLINE]
+        self.schedule = dispatch
+        return await self._dispatch(dispatch, self.response_offset_kw)
+
+    async def apply_response_offset(self, offset: ResponseOffset) -> DispatchResult:
+        """Re-dispatch the current schedule plus a frequency response offset"""
+        self.response_offset_kw = offset.offset_kw
+        dispatch = self.schedule.model_copy(update={
+            "strategy": offset.strategy or self.schedule.strategy,
+            "deadline_ms": offset.deadline_ms
+        })
+        return await self._dispatch(dispatch, offset.offset_kw)
+
+    def _safety_check(self, node_ids: List[str]):
+        """Fleet safety evaluation of nodes' latest telemetry"""
+        fleet = FleetTelemetry.from_telemetry([self.node_telemetry.get(node_id) or {} for node_id in node_ids])
+        fleet.unit_ids = list(node_ids)
+        return self.safety.evaluate(fleet)
+
+    async def _dispatch(self, dispatch: PowerDispatch, offset_kw: float = 0.0) -> DispatchResult:
+        online_nodes = self.get_nodes(online_only=True)
+
+        # Nodes the safety rules block (BMS fault, limit trip, local e-stop)
+        # are left out so the allocators give their share to the others;
+        # the rest are capped by their safety power factor below
+        safety = self._safety_check([n.node_id for n in online_nodes])
+        factors = {n.node_id: factor for n, factor in zip(online_nodes, safety.power_factor.tolist())}
+        limited = {node_id: [v.category for v in violations]
+                   for node_id, violations in safety.violations.items()
+                   if factors[node_id] < 1.0}
+        if limited:
+            logger.warning(f"Safety-limited dispatch: {limited}")
+        online_nodes = [n for n in online_nodes if factors[n.node_id] > 0.0]
 
         if not online_nodes:
-            raise ValueError("No online nodes available")
+            raise ValueError(f"No online nodes available ({len(limited)} blocked by safety checks)")
+
+        total_power_kw = dispatch.total_power_kw + offset_kw
 
         # Calculate per-node setpoints based on strategy
         if dispatch.node_setpoints:
-            # Manual setpoints provided
-            setpoints = dispatch.node_setpoints
+            # Manual setpoints provided; an offset is spread by capacity
+            setpoints = dict(dispatch.node_setpoints)
+            if offset_kw:
+                for node_id, power_kw in self._proportional_dispatch(offset_kw, online_nodes).items():
+                    setpoints[node_id] = setpoints.get(node_id, 0.0) + power_kw
         elif dispatch.strategy == "proportional":
             # Distribute proportionally to capacity
-            setpoints = self._proportional_dispatch(dispatch.total_power_kw, online_nodes)
+            setpoints = self._proportional_dispatch(total_power_kw, online_nodes)
         elif dispatch.strategy == "balanced":
             # Balance SOC across nodes
-            setpoints = self._balanced_dispatch(dispatch.total_power_kw, online_nodes)
+            setpoints = self._balanced_dispatch(total_power_kw, online_nodes)
         elif dispatch.strategy == "priority":
             # Priority-based dispatch (highest SOC first for discharge)
-            setpoints = self._priority_dispatch(dispatch.total_power_kw, online_nodes)
+            setpoints = self._priority_dispatch(total_power_kw, online_nodes)
+        elif dispatch.strategy == "optimal":
+            # Constrained QP: balance SOC, limit degradation, respect node limits
+            setpoints = self._optimal_dispatch(total_power_kw, online_nodes)
         else:
             raise ValueError(f"Unknown dispatch strategy: {dispatch.strategy}")
 
-        # Send setpoints to nodes
-        results = {}
-        for node_id, power_kw in setpoints.items():
-            try:
-                node = self.nodes[node_id]
-                if not node.endpoint_url:
-                    continue
+        # Manual setpoints may name blocked nodes; every setpoint is scaled by its safety factor
+        setpoints = {
+            node_id: power_kw * factors.get(node_id, 1.0)
+            for node_id, power_kw in setpoints.items()
+            if factors.get(node_id, 1.0) > 0.0
+        }
 
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{node.endpoint_url}/power",
-                        json={"power_kw": power_kw, "reactive_power_kvar": 0.0},
-                        timeout=5.0
-                    )
+        # Send setpoints to all nodes concurrently; shortfall from nodes
+        # that fail to acknowledge is moved to the online nodes that did
+        endpoints = {
+            node_id: self.nodes[node_id].endpoint_url
+            for node_id in setpoints
+            if node_id in self.nodes and self.nodes[node_id].endpoint_url
+        }
+        # Redistribution stays within the same SOC/energy-bounded ranges the
+        # allocator uses, narrowed by the safety power factor
+        power_bounds = {
+            node_id: (lo * factors.get(node_id, 1.0), hi * factors.get(node_id, 1.0))
+            for node_id, (lo, hi) in self._power_bounds(online_nodes).items()
+        }
 
-                    if response.status_code == 200:
-                        results[node_id] = power_kw
-                        logger.info(f"Dispatched {power_kw:.2f} kW to {node_id}")
-                    else:
-                        logger.error(f"Failed to dispatch to {node_id}: {response.status_code}")
+        deadline_ms = dispatch.deadline_ms or DISPATCH_DEADLINE_MS
+        result = await self.dispatcher.dispatch(
+            setpoints,
+            endpoints,
+            power_bounds,
+            deadline_s=deadline_ms / 1000.0
+        )
+        result.safety_limited = limited
+        return result
 
-            except Exception as e:
-                logger.error(f"Error dispatching to {node_id}: {e}")
+    def _node_arrays(self, nodes: List[Node]) -> Dict[str, np.ndarray]:
+        """Per-node SOC, SOH, energy, rated power and available energy as arrays"""
+        return {
+            "soc": np.array([n.soc if n.soc is not None else 50.0 for n in nodes]),
+            "soh": np.array([n.soh if n.soh is not None else 100.0 for n in nodes]),
+            "energy": np.array([n.capacity.energy_capacity_kwh for n in nodes]),
+            "rated": np.array([n.capacity.rated_power_kw for n in nodes]),
+            "available_energy": np.array([n.capacity.available_energy_kwh for n in nodes]),
+        }
 
-        return results
+    def _power_bounds(self, nodes: List[Node]) -> Dict[str, Tuple[float, float]]:
+        """Feasible (lo, hi) power per node (positive=charge), see dispatch_optimizer"""
+        arrays = self._node_arrays(nodes)
+        lo, hi = node_power_bounds(
+            arrays["soc"], np.maximum(arrays["energy"], 1e-6), arrays["rated"],
+            available_energy_kwh=arrays["available_energy"],
+            limits=self.dispatch_limits
+        )
+        return {node.node_id: (float(l), float(h)) for node, l, h in zip(nodes, lo, hi)}
 
     def _proportional_dispatch(self, total_power_kw: float, nodes: List[Node]) -> Dict[str, float]:
         """Distribute power proportionally to node capacity"""
@@ -352,6 +665,19 @@ class CampusController:
 
         return setpoints
 
+    def _optimal_dispatch(self, total_power_kw: float, nodes: List[Node]) -> Dict[str, float]:
+        """Optimal dispatch respecting SOC, energy and power limits (see dispatch_optimizer)"""
+        arrays = self._node_arrays(nodes)
+        power, unserved_kw = solve_optimal_dispatch(
+            total_power_kw, arrays["soc"], arrays["soh"], arrays["energy"], arrays["rated"],
+            available_energy_kwh=arrays["available_energy"],
+            limits=self.dispatch_limits
+        )
+        if abs(unserved_kw) > 0.1:
+            logger.warning(f"Optimal dispatch: {unserved_kw:.2f} kW exceeds campus limits")
+
+        return {node.node_id: float(p) for node, p in zip(nodes, power)}
+
 
 # Global controller instance
 # In production, this would be loaded from configuration
@@ -370,11 +696,22 @@ controller = CampusController(campus_config)
 
 
 # Background polling task
+async def stream_flush_loop():
+    """Apply pushed telemetry every STREAM_FLUSH_INTERVAL seconds"""
+    while controller.is_running:
+        await asyncio.sleep(STREAM_FLUSH_INTERVAL)
+        try:
+            controller.flush_pushed_telemetry()
+        except Exception as e:
+            logger.error(f"Error applying pushed telemetry: {e}")
+
+
 async def polling_loop():
     """Poll node telemetry periodically"""
     while controller.is_running:
         try:
             await controller.poll_node_telemetry()
+            await controller.push_telemetry_to_layer3()
         except Exception as e:
             logger.error(f"Error in polling loop: {e}")
 
@@ -387,6 +724,7 @@ async def startup():
     """Start controller and background tasks"""
     await controller.start()
     asyncio.create_task(polling_loop())
+    asyncio.create_task(stream_flush_loop())
 
 
 @app.on_event("shutdown")
@@ -402,7 +740,8 @@ async def health_check():
         "status": "healthy",
         "campus_id": controller.campus.campus_id,
         "num_nodes": len(controller.nodes),
-        "online_nodes": sum(1 for n in controller.nodes.values() if n.status == NodeStatus.ONLINE)
+        "online_nodes": controller.aggregates.online_nodes,
+        "streaming_nodes": len(controller.streaming_nodes)
     }
 
 
@@ -413,12 +752,91 @@ async def get_telemetry():
     return telemetry.dict()
 
 
+@app.websocket("/ws/telemetry")
+async def telemetry_stream(websocket: WebSocket):
+    """
+    Push-mode telemetry from BESS controllers
+
+    The connection must carry "Authorization: Bearer <STREAM_TOKEN>".
+    First frame: {"type": "hello", "node": {node_id, capacity_kwh, max_power_kw, endpoint_url, ...}}
+    Then:        {"type": "telemetry", "data": {...same fields as GET /telemetry on the node...}}
+    """
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    authorized = (STREAM_TOKEN and scheme.lower() == "bearer"
+                  and hmac.compare_digest(token.encode(), STREAM_TOKEN.encode()))
+    if not authorized:
+        logger.warning(f"Refused unauthenticated telemetry stream from {websocket.client}")
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    node_id = None
+    try:
+        hello = await websocket.receive_json()
+        if hello.get("type") != "hello" or not hello.get("node", {}).get("node_id"):
+            await websocket.close(code=1008)
+            return
+        node_id = controller.register_streaming_node(hello["node"])
+
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and message.get("type") == "telemetry":
+                controller.ingest_pushed_telemetry(node_id, message.get("data") or {})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Telemetry stream error ({node_id}): {e!r}")
+    finally:
+        if node_id is not None:
+            controller.stream_closed(node_id)
+            logger.info(f"Telemetry stream closed: {node_id}")
+
+
+@app.get("/telemetry/history")
+async def get_telemetry_history(resolution: str = "1m",
+                                node_id: Optional[str] = None,
+                                start: Optional[float] = None,
+                                end: Optional[float] = None,
+                                metrics: Optional[str] = None):
+    """
+    Downsampled campus (or node) telemetry
+
+    resolution: 1s, 1m or 15m; start/end: Unix seconds (default: whole tier);
+    metrics: comma-separated subset
+    """
+    if resolution not in RESOLUTIONS or resolution not in controller.campus_history.tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution: {resolution}")
+
+    if node_id is None:
+        history, row = controller.campus_history, 0
+    else:
+        if node_id not in controller.state:
+            raise HTTPException(status_code=404, detail="Node not found")
+        history, row = controller.node_history, controller.state.slots[node_id]
+        if resolution not in history.tiers:
+            if node_id not in controller.stream_rows:
+                raise HTTPException(status_code=404,
+                                    detail=f"No {resolution} history for a polled node (poll interval {POLL_INTERVAL} s)")
+            history, row = controller.stream_history, controller.stream_rows[node_id]
+
+    try:
+        result = history.query(row, resolution, start, end, metrics.split(",") if metrics else None)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "campus_id": controller.campus.campus_id,
+        "node_id": node_id,
+        **result
+    }
+
+
 @app.get("/nodes")
 async def get_nodes():
     """Get all campus nodes"""
     return {
         "campus_id": controller.campus.campus_id,
-        "nodes": [node.dict() for node in controller.nodes.values()]
+        "nodes": [node.dict() for node in controller.get_nodes()]
     }
 
 
@@ -428,7 +846,7 @@ async def get_node(node_id: str):
     if node_id not in controller.nodes:
         raise HTTPException(status_code=404, detail="Node not found")
 
-    node = controller.nodes[node_id]
+    node = controller.get_node(node_id)
     telemetry = controller.node_telemetry.get(node_id)
 
     return {
@@ -437,22 +855,62 @@ async def get_node(node_id: str):
     }
 
 
+@app.get("/polling")
+async def get_polling_stats():
+    """Per-node polling latency, timeouts and backoff"""
+    return controller.poller.get_stats()
+
+
 @app.post("/dispatch")
 async def dispatch_power(dispatch: PowerDispatch):
     """Dispatch power across campus nodes"""
     try:
-        setpoints = await controller.dispatch_power(dispatch)
+        result = await controller.dispatch_power(dispatch)
         return {
-            "status": "success",
+            "status": "success" if not (result.failed_nodes or result.unconfirmed) else "partial",
             "total_power_kw": dispatch.total_power_kw,
             "strategy": dispatch.strategy,
-            "setpoints": setpoints
+            "setpoints": result.setpoints,
+            "failed_nodes": result.failed_nodes,
+            "unconfirmed": result.unconfirmed,
+            "unserved_kw": result.unserved_kw,
+            "safety_limited": result.safety_limited,
+            "latency_ms": result.latency_ms,
+            "rounds": result.rounds
         }
     except Exception as e:
         logger.error(f"Dispatch error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/dispatch/offset")
+async def dispatch_response_offset(offset: ResponseOffset):
+    """Ride a frequency response offset on the current schedule (offset_kw=0 ends it)"""
+    try:
+        result = await controller.apply_response_offset(offset)
+        return {
+            "status": "success" if not (result.failed_nodes or result.unconfirmed) else "partial",
+            "scheduled_power_kw": controller.schedule.total_power_kw,
+            "offset_kw": offset.offset_kw,
+            "setpoints": result.setpoints,
+            "failed_nodes": result.failed_nodes,
+            "unconfirmed": result.unconfirmed,
+            "unserved_kw": result.unserved_kw,
+            "safety_limited": result.safety_limited,
+            "latency_ms": result.latency_ms,
+            "rounds": result.rounds
+        }
+    except Exception as e:
+        logger.error(f"Response offset dispatch error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/dispatch/latency")
+async def get_dispatch_latency():
+    """Dispatch end-to-end and per-node acknowledgment latency percentiles"""
+    return controller.dispatcher.get_latency_stats()
+
+
 @app.get("/capacity")
 async def get_capacity():
     """Get aggregate campus capacity"""
@@ -0,0 +1,168 @@
+"""
+Concurrent Node Poller
+Polls BESS node telemetry in parallel over a shared connection pool
+"""
+
+import asyncio
+import logging
+import time
+import zlib
+from typing import Dict, Optional, Any, Tuple
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NodePollState:
+    """Per-node polling state"""
+    latency_ewma_s: Optional[float] = None   # Smoothed response latency
+    consecutive_failures: int = 0
+    next_poll_at: float = 0.0                 # Monotonic time the node is next due
+    last_error: Optional[str] = None
+
+
+class NodePoller:
+    """
+    Polls GET {endpoint}/telemetry on many nodes concurrently
+
+    - All requests share one pooled httpx.AsyncClient
+    - Each node's timeout adapts to its own observed latency, so a dead
+      node costs at most its timeout and never delays the others
+    - Request starts are staggered by a fixed per-node phase so a large
+      campus does not hit the network in one burst
+    - Failing nodes back off exponentially and are skipped until due
+    """
+
+    def __init__(self,
+                 client: httpx.AsyncClient,
+                 poll_interval: float,
+                 timeout_s: float = 5.0,
+                 min_timeout_s: float = 1.0,
+                 stagger_s: float = 0.5,
+                 max_backoff_s: float = 300.0,
+                 max_concurrency: int = 100):
+        """
+        Initialize poller
+
+        Args:
+            client: Shared HTTP client
+            poll_interval: Nominal poll interval (seconds), base for backoff
+            timeout_s: Upper bound on any node's request timeout
+            min_timeout_s: Lower bound on adaptive timeouts
+            stagger_s: Window over which request starts are spread
+            max_backoff_s: Longest time an offline node is skipped
+            max_concurrency: Max requests in flight
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.timeout_s = timeout_s
+        self.min_timeout_s = min_timeout_s
+        self.stagger_s = stagger_s
+        self.max_backoff_s = max_backoff_s
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.states: Dict[str, NodePollState] = {}
+        self.last_poll_duration_s: Optional[float] = None
+
+    def _timeout_for(self, state: NodePollState) -> float:
+        """Adaptive per-node timeout: 5x smoothed latency, clamped"""
+        if state.latency_ewma_s is None:
+            return self.timeout_s
+        return min(self.timeout_s, max(self.min_timeout_s, 5.0 * state.latency_ewma_s))
+
+    def _stagger_offset(self, node_id: str) -> float:
+        """Stable per-node start offset within the stagger window"""
+        return (zlib.crc32(node_id.encode()) % 1000) / 1000.0 * self.stagger_s
+
+    def _record_success(self, state: NodePollState, latency_s: float, now: float):
+        state.latency_ewma_s = latency_s if state.latency_ewma_s is None else (
+            0.8 * state.latency_ewma_s + 0.2 * latency_s
+        )
+        state.consecutive_failures = 0
+        state.next_poll_at = now
+        state.last_error = None
+
+    def _record_failure(self, state: NodePollState, error: str, now: float):
+        state.consecutive_failures += 1
+        backoff = min(self.max_backoff_s, self.poll_interval * 2 ** (state.consecutive_failures - 1))
+        state.next_poll_at = now + backoff
+        state.last_error = error
+
+    async def _poll_one(self, node_id: str, endpoint_url: str, state: NodePollState) -> Tuple[str, Optional[Dict[str, Any]]]:
+        await asyncio.sleep(self._stagger_offset(node_id))
+
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                response = await self.client.get(
+                    f"{endpoint_url}/telemetry",
+                    timeout=self._timeout_for(state)
+                )
+            except Exception as e:
+                self._record_failure(state, f"{type(e).__name__}: {e}", time.monotonic())
+                logger.error(f"Error polling {node_id}: {e!r}")
+                return node_id, None
+
+        now = time.monotonic()
+        if response.status_code != 200:
+            self._record_failure(state, f"HTTP {response.status_code}", now)
+            logger.warning(f"Failed to poll {node_id}: {response.status_code}")
+            return node_id, None
+
+        try:
+            telemetry = response.json()
+        except ValueError as e:
+            self._record_failure(state, f"Invalid JSON: {e}", now)
+            logger.warning(f"Invalid telemetry from {node_id}: {e}")
+            return node_id, None
+
+        self._record_success(state, now - started, now)
+        return node_id, telemetry
+
+    async def poll(self, endpoints: Dict[str, str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Poll every due node concurrently
+
+        Args:
+            endpoints: node_id -> endpoint URL
+
+        Returns:
+            node_id -> telemetry dict (None if the poll failed).
+            Nodes still in backoff are not included.
+        """
+        started = time.monotonic()
+
+        # Forget nodes that are no longer registered
+        for node_id in list(self.states):
+            if node_id not in endpoints:
+                del self.states[node_id]
+
+        tasks = []
+        for node_id, endpoint_url in endpoints.items():
+            state = self.states.setdefault(node_id, NodePollState())
+            if state.next_poll_at <= started:
+                tasks.append(self._poll_one(node_id, endpoint_url, state))
+
+        results = dict(await asyncio.gather(*tasks)) if tasks else {}
+        self.last_poll_duration_s = time.monotonic() - started
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Polling statistics"""
+        now = time.monotonic()
+        return {
+            "last_poll_duration_s": self.last_poll_duration_s,
+            "nodes": {
+                node_id: {
+                    "latency_ms": state.latency_ewma_s * 1000.0 if state.latency_ewma_s is not None else None,
+                    "timeout_s": self._timeout_for(state),
+                    "consecutive_failures": state.consecutive_failures,
+                    "backoff_remaining_s": max(0.0, state.next_poll_at - now),
+                    "last_error": state.last_error
+                }
+                for node_id, state in self.states.items()
+            }
+        }
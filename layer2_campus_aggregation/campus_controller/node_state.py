@@ -0,0 +1,152 @@
+"""
+Campus Node State Table
+Struct-of-arrays store for the per-node fields that change on every poll
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import sys
+sys.path.append('..')
+from models.location_schema import Node, NodeStatus
+
+# Status <-> int8 code, in NodeStatus declaration order
+STATUSES: List[NodeStatus] = list(NodeStatus)
+STATUS_CODES: Dict[NodeStatus, int] = {status: code for code, status in enumerate(STATUSES)}
+ONLINE = STATUS_CODES[NodeStatus.ONLINE]
+
+
+class NodeStateTable:
+    """
+    Hot node state as NumPy columns indexed by node slot
+
+    Polling writes soc/soh/power/temperature/status/last_seen for many
+    nodes at once with fancy indexing instead of mutating one Pydantic
+    model per node. Missing values are NaN. Static node configuration
+    (capacity, endpoint, hierarchy) stays in the Node models; Node objects
+    with the current state are only built at the API boundary.
+    """
+
+    def __init__(self, initial_capacity: int = 64):
+        self.slots: Dict[str, int] = {}   # node_id -> slot
+        self.node_ids: List[str] = []     # slot -> node_id
+        self._capacity = 0
+
+        self.soc = np.empty(0)
+        self.soh = np.empty(0)
+        self.power_kw = np.empty(0)
+        self.temperature = np.empty(0)
+        self.last_seen = np.empty(0)      # Unix time, NaN if never seen
+        self.status = np.empty(0, dtype=np.int8)
+
+        self._grow(initial_capacity)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.slots
+
+    def _grow(self, capacity: int):
+        """Reallocate columns to hold at least `capacity` slots"""
+        capacity = max(capacity, 2 * self._capacity, 1)
+        n = len(self.node_ids)
+
+        def resized(column: np.ndarray, fill) -> np.ndarray:
+            new = np.full(capacity, fill, dtype=column.dtype)
+            new[:n] = column[:n]
+            return new
+
+        self.soc = resized(self.soc, np.nan)
+        self.soh = resized(self.soh, np.nan)
+        self.power_kw = resized(self.power_kw, np.nan)
+        self.temperature = resized(self.temperature, np.nan)
+        self.last_seen = resized(self.last_seen, np.nan)
+        self.status = resized(self.status, STATUS_CODES[NodeStatus.OFFLINE])
+        self._capacity = capacity
+
+    def add(self, node: Node) -> int:
+        """Register a node (or refresh an existing one) from its model, return its slot"""
+        slot = self.slots.get(node.node_id)
+        if slot is None:
+            slot = len(self.node_ids)
+            if slot >= self._capacity:
+                self._grow(slot + 1)
+            self.slots[node.node_id] = slot
+            self.node_ids.append(node.node_id)
+
+        self.soc[slot] = np.nan if node.soc is None else node.soc
+        self.soh[slot] = np.nan if node.soh is None else node.soh
+        self.power_kw[slot] = np.nan if node.power_kw is None else node.power_kw
+        self.temperature[slot] = np.nan if node.temperature is None else node.temperature
+        self.last_seen[slot] = np.nan if node.last_seen is None else self._timestamp(node.last_seen)
+        self.status[slot] = STATUS_CODES[node.status]
+        return slot
+
+    def update_telemetry(self,
+                         slots: Sequence[int],
+                         soc: Sequence[Optional[float]],
+                         soh: Sequence[Optional[float]],
+                         power_kw: Sequence[Optional[float]],
+                         temperature: Sequence[Optional[float]],
+                         seen_at: Optional[float] = None):
+        """
+        Record telemetry for several nodes and mark them online
+
+        Value sequences are aligned with `slots`; None becomes NaN.
+        """
+        if not slots:
+            return
+        idx = np.asarray(slots, dtype=np.intp)
+        self.soc[idx] = np.array(soc, dtype=float)
+        self.soh[idx] = np.array(soh, dtype=float)
+        self.power_kw[idx] = np.array(power_kw, dtype=float)
+        self.temperature[idx] = np.array(temperature, dtype=float)
+        self.last_seen[idx] = time.time() if seen_at is None else seen_at
+        self.status[idx] = ONLINE
+
+    def set_status(self, slots: Sequence[int], status: NodeStatus):
+        """Set the status of several nodes"""
+        if slots:
+            self.status[np.asarray(slots, dtype=np.intp)] = STATUS_CODES[status]
+
+    def get_status(self, slot: int) -> NodeStatus:
+        return STATUSES[self.status[slot]]
+
+    def online_slots(self) -> np.ndarray:
+        """Slots of all online nodes"""
+        return np.flatnonzero(self.status[:len(self.node_ids)] == ONLINE)
+
+    def online_node_ids(self) -> List[str]:
+        return [self.node_ids[slot] for slot in self.online_slots()]
+
+    @staticmethod
+    def _timestamp(value: datetime) -> float:
+        # Naive datetimes in this service are UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    @staticmethod
+    def _value(column: np.ndarray, slot: int) -> Optional[float]:
+        value = column[slot]
+        return None if np.isnan(value) else float(value)
+
+    def to_node(self, node: Node) -> Node:
+        """Copy of a node's model with the current state filled in"""
+        slot = self.slots.get(node.node_id)
+        if slot is None:
+            return node
+
+        last_seen = self.last_seen[slot]
+        return node.model_copy(update={
+            "status": STATUSES[self.status[slot]],
+            "soc": self._value(self.soc, slot),
+            "soh": self._value(self.soh, slot),
+            "power_kw": self._value(self.power_kw, slot),
+            "temperature": self._value(self.temperature, slot),
+            "last_seen": None if np.isnan(last_seen) else datetime.utcfromtimestamp(last_seen),
+        })
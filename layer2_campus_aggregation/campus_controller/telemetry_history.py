@@ -0,0 +1,191 @@
+"""
+Downsampled Telemetry History
+Rolling 1 s / 1 min / 15 min tiers with min/max/mean per bucket
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence, Any
+
+import numpy as np
+
+# (name, bucket width in seconds)
+RESOLUTIONS = {"1s": 1, "1m": 60, "15m": 900}
+
+
+class HistoryTier:
+    """
+    Fixed-size ring of time buckets for many series at once
+
+    Arrays are shaped (rows, buckets, metrics); a row is one entity (node
+    slot or campus). A sample for time t lands in bucket t // width at ring
+    position (t // width) % buckets, resetting it if it held an older
+    bucket. Recording a poll for all nodes is a handful of vectorized
+    operations regardless of node count. NaN values are not counted.
+    """
+
+    def __init__(self, width_s: int, buckets: int, num_metrics: int, initial_rows: int = 1):
+        self.width_s = width_s
+        self.buckets = buckets
+        self.num_metrics = num_metrics
+        self.rows = 0
+
+        self.bucket_index = np.empty((0, buckets), dtype=np.int64)
+        self.count = np.empty((0, buckets, num_metrics), dtype=np.int32)
+        self.sum = np.empty((0, buckets, num_metrics), dtype=np.float64)
+        self.min = np.empty((0, buckets, num_metrics), dtype=np.float32)
+        self.max = np.empty((0, buckets, num_metrics), dtype=np.float32)
+
+        self._grow(initial_rows)
+
+    @property
+    def bytes_per_row(self) -> int:
+        return sum(a[0].nbytes for a in (self.bucket_index, self.count, self.sum, self.min, self.max))
+
+    def reset_row(self, row: int):
+        """Forget a row's buckets (before reusing it for another series)"""
+        if row < self.rows:
+            self.bucket_index[row] = -1
+
+    def _grow(self, rows: int):
+        rows = max(rows, 2 * self.rows, 1)
+
+        def resized(array: np.ndarray, fill) -> np.ndarray:
+            new = np.full((rows,) + array.shape[1:], fill, dtype=array.dtype)
+            new[:self.rows] = array[:self.rows]
+            return new
+
+        self.bucket_index = resized(self.bucket_index, -1)
+        self.count = resized(self.count, 0)
+        self.sum = resized(self.sum, 0.0)
+        self.min = resized(self.min, np.inf)
+        self.max = resized(self.max, -np.inf)
+        self.rows = rows
+
+    def record(self, rows: np.ndarray, timestamp: float, values: np.ndarray):
+        """
+        Add one sample per row
+
+        Args:
+            rows: Row indices (n,)
+            timestamp: Unix time of the samples
+            values: (n, metrics) array, NaN for missing
+        """
+        if rows.size and rows.max() >= self.rows:
+            self._grow(int(rows.max()) + 1)
+
+        bucket = int(timestamp // self.width_s)
+        pos = bucket % self.buckets
+
+        # Reset ring positions that still hold an older bucket
+        stale = rows[self.bucket_index[rows, pos] != bucket]
+        if stale.size:
+            self.bucket_index[stale, pos] = bucket
+            self.count[stale, pos] = 0
+            self.sum[stale, pos] = 0.0
+            self.min[stale, pos] = np.inf
+            self.max[stale, pos] = -np.inf
+
+        valid = ~np.isnan(values)
+        self.count[rows, pos] += valid
+        self.sum[rows, pos] += np.where(valid, values, 0.0)
+        self.min[rows, pos] = np.fmin(self.min[rows, pos], values)
+        self.max[rows, pos] = np.fmax(self.max[rows, pos], values)
+
+    def query(self, row: int, start: float, end: float) -> Dict[str, np.ndarray]:
+        """Buckets of one row with start <= bucket time <= end, oldest first"""
+        if row >= self.rows:
+            empty = np.empty((0, self.num_metrics))
+            return {"timestamps": np.empty(0), "count": empty, "min": empty, "max": empty, "mean": empty}
+
+        index = self.bucket_index[row]
+        selected = np.flatnonzero((index >= start // self.width_s) & (index <= end // self.width_s))
+        selected = selected[np.argsort(index[selected])]
+
+        count = self.count[row, selected]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, self.sum[row, selected] / count, np.nan)
+        return {
+            "timestamps": index[selected] * self.width_s,
+            "count": count,
+            "min": np.where(count > 0, self.min[row, selected], np.nan),
+            "max": np.where(count > 0, self.max[row, selected], np.nan),
+            "mean": mean,
+        }
+
+
+class TelemetryHistory:
+    """All resolution tiers for a set of series sharing one metric list"""
+
+    def __init__(self, metrics: Sequence[str], buckets: Dict[str, int], initial_rows: int = 1):
+        """
+        Args:
+            metrics: Metric names, in column order
+            buckets: resolution name ("1s", "1m", "15m") -> ring size
+            initial_rows: Rows to preallocate
+        """
+        self.metrics = list(metrics)
+        self.tiers: Dict[str, HistoryTier] = {
+            name: HistoryTier(RESOLUTIONS[name], size, len(self.metrics), initial_rows)
+            for name, size in buckets.items()
+        }
+
+    def record(self, rows: Sequence[int], values: np.ndarray, timestamp: Optional[float] = None):
+        """Record one sample per row into every tier"""
+        rows = np.asarray(rows, dtype=np.intp)
+        if not rows.size:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        values = np.asarray(values, dtype=np.float64).reshape(rows.size, len(self.metrics))
+        for tier in self.tiers.values():
+            tier.record(rows, timestamp, values)
+
+    def reset_row(self, row: int):
+        for tier in self.tiers.values():
+            tier.reset_row(row)
+
+    @property
+    def bytes_per_row(self) -> int:
+        """Memory held per row across all tiers"""
+        return sum(tier.bytes_per_row for tier in self.tiers.values())
+
+    def query(self,
+              row: int,
+              resolution: str,
+              start: Optional[float] = None,
+              end: Optional[float] = None,
+              metrics: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Downsampled series for one row, JSON-ready
+
+        Returns:
+            {"resolution_s", "timestamps": [...], "series": {metric: {"min", "max", "mean", "count"}}}
+        """
+        tier = self.tiers[resolution]
+        end = time.time() if end is None else end
+        start = end - tier.width_s * tier.buckets if start is None else start
+
+        names = list(metrics) if metrics else self.metrics
+        unknown = [name for name in names if name not in self.metrics]
+        if unknown:
+            raise KeyError(f"Unknown metrics: {', '.join(unknown)}")
+
+        result = tier.query(row, start, end)
+
+        def column(array: np.ndarray, i: int) -> List[Optional[float]]:
+            return [None if np.isnan(v) else float(v) for v in array[:, i]]
+
+        series = {}
+        for name in names:
+            i = self.metrics.index(name)
+            series[name] = {
+                "min": column(result["min"], i),
+                "max": column(result["max"], i),
+                "mean": column(result["mean"], i),
+                "count": result["count"][:, i].tolist(),
+            }
+
+        return {
+            "resolution_s": tier.width_s,
+            "timestamps": result["timestamps"].tolist(),
+            "series": series,
+        }
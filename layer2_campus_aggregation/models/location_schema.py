@@ -4,14 +4,15 @@ Defines geographic and organizational hierarchy for BESS deployment
 """
 
 from enum import Enum
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Sequence
+from pydantic import BaseModel, Field, PrivateAttr, computed_field
 from datetime import datetime
 
 
 class LocationLevel(str, Enum):
     """Hierarchical location levels"""
     COUNTRY = "country"
+    REGION = "region"                # Grid region (RLDC), groups states
     STATE = "state"
     CITY = "city"
     CAMPUS = "campus"
@@ -89,6 +90,194 @@ class Node(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class AggregateStore:
+    """
+    Incrementally maintained aggregates over a set of nodes
+
+    Each node's last contribution is remembered, so an update subtracts the
+    old contribution and adds the new one: O(1) per change, O(1) per read.
+    SOC min/max are tracked with the extreme node and only rescanned when
+    that node moves back towards the middle.
+    Call upsert() whenever a node's capacity, status or telemetry changes.
+    Every `rebaseline_every` changes the running sums are recomputed from
+    the stored contributions so floating-point drift cannot accumulate.
+    """
+
+    def __init__(self, rebaseline_every: int = 10000):
+        self.rebaseline_every = rebaseline_every
+        self._contrib: Dict[str, tuple] = {}
+        self._online_soc: Dict[str, float] = {}
+        self._changes = 0
+        self._reset_totals()
+
+        self._min_soc: Optional[float] = None
+        self._min_soc_node: Optional[str] = None
+        self._max_soc: Optional[float] = None
+        self._max_soc_node: Optional[str] = None
+
+    def _reset_totals(self):
+        self.total_nodes = 0
+        self.online_nodes = 0
+        self.fault_nodes = 0
+        self.rated_power_kw = 0.0
+        self.energy_capacity_kwh = 0.0
+        self.available_power_kw = 0.0      # Online nodes only
+        self.available_energy_kwh = 0.0    # Online nodes only
+        self.total_power_kw = 0.0          # Online nodes reporting power
+        self.soc_sum = 0.0
+        self.soh_sum = 0.0
+        self.soh_count = 0
+
+    def rebaseline(self):
+        """Recompute the running sums exactly from the stored contributions (O(n))"""
+        self._reset_totals()
+        for contrib in self._contrib.values():
+            self._apply(contrib, 1)
+        self._rescan_soc()
+        self._changes = 0
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= self.rebaseline_every:
+            self.rebaseline()
+
+    def __len__(self) -> int:
+        return self.total_nodes
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._contrib
+
+    @staticmethod
+    def _contribution(status: NodeStatus,
+                      rated_power_kw: float,
+                      energy_capacity_kwh: float,
+                      available_power_kw: float,
+                      available_energy_kwh: float,
+                      power_kw: Optional[float],
+                      soc: Optional[float],
+                      soh: Optional[float]) -> tuple:
+        online = status == NodeStatus.ONLINE
+        return (
+            online,
+            status == NodeStatus.FAULT,
+            rated_power_kw,
+            energy_capacity_kwh,
+            available_power_kw if online else 0.0,
+            available_energy_kwh if online else 0.0,
+            power_kw if online and power_kw is not None else 0.0,
+            soc if online else None,
+            soh if online else None,
+        )
+
+    def _apply(self, contrib: tuple, sign: int):
+        online, fault, rated, energy, avail_p, avail_e, power, soc, soh = contrib
+        self.total_nodes += sign
+        self.online_nodes += sign * online
+        self.fault_nodes += sign * fault
+        self.rated_power_kw += sign * rated
+        self.energy_capacity_kwh += sign * energy
+        self.available_power_kw += sign * avail_p
+        self.available_energy_kwh += sign * avail_e
+        self.total_power_kw += sign * power
+        if soc is not None:
+            self.soc_sum += sign * soc
+        if soh is not None:
+            self.soh_sum += sign * soh
+            self.soh_count += sign
+
+    def _set_soc(self, node_id: str, soc: Optional[float]):
+        """Maintain the online SOC map and its min/max"""
+        if soc is None:
+            if self._online_soc.pop(node_id, None) is None:
+                return
+            if node_id in (self._min_soc_node, self._max_soc_node):
+                self._rescan_soc()
+            return
+
+        self._online_soc[node_id] = soc
+
+        if self._min_soc is None or soc <= self._min_soc:
+            self._min_soc, self._min_soc_node = soc, node_id
+        elif node_id == self._min_soc_node:
+            self._rescan_soc()
+
+        if self._max_soc is None or soc >= self._max_soc:
+            self._max_soc, self._max_soc_node = soc, node_id
+        elif node_id == self._max_soc_node:
+            self._rescan_soc()
+
+    def _rescan_soc(self):
+        if not self._online_soc:
+            self._min_soc = self._min_soc_node = self._max_soc = self._max_soc_node = None
+            return
+        self._min_soc_node = min(self._online_soc, key=self._online_soc.__getitem__)
+        self._max_soc_node = max(self._online_soc, key=self._online_soc.__getitem__)
+        self._min_soc = self._online_soc[self._min_soc_node]
+        self._max_soc = self._online_soc[self._max_soc_node]
+
+    def update(self,
+               node_id: str,
+               status: NodeStatus,
+               rated_power_kw: float,
+               energy_capacity_kwh: float,
+               available_power_kw: float,
+               available_energy_kwh: float,
+               power_kw: Optional[float] = None,
+               soc: Optional[float] = None,
+               soh: Optional[float] = None):
+        """Add or replace one node's contribution from raw fields"""
+        new = self._contribution(status, rated_power_kw, energy_capacity_kwh, available_power_kw,
+                                 available_energy_kwh, power_kw, soc, soh)
+        old = self._contrib.get(node_id)
+        if old == new:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(new, 1)
+        self._contrib[node_id] = new
+        self._set_soc(node_id, new[7])
+        self._changed()
+
+    def upsert(self, node: Node):
+        """Add or refresh a node's contribution"""
+        cap = node.capacity
+        self.update(node.node_id, node.status, cap.rated_power_kw, cap.energy_capacity_kwh,
+                    cap.available_power_kw, cap.available_energy_kwh, node.power_kw, node.soc, node.soh)
+
+    def remove(self, node_id: str):
+        """Drop a node's contribution"""
+        old = self._contrib.pop(node_id, None)
+        if old is not None:
+            self._apply(old, -1)
+            self._set_soc(node_id, None)
+            self._changed()
+
+    def capacity(self) -> NodeCapacity:
+        """Aggregate capacity (available figures count online nodes only)"""
+        return NodeCapacity(
+            rated_power_kw=self.rated_power_kw,
+            energy_capacity_kwh=self.energy_capacity_kwh,
+            available_power_kw=self.available_power_kw,
+            available_energy_kwh=self.available_energy_kwh
+        )
+
+    @property
+    def average_soc(self) -> float:
+        return self.soc_sum / len(self._online_soc) if self._online_soc else 0.0
+
+    @property
+    def average_soh(self) -> float:
+        return self.soh_sum / self.soh_count if self.soh_count else 100.0
+
+    @property
+    def min_soc(self) -> float:
+        return self._min_soc if self._min_soc is not None else 0.0
+
+    @property
+    def max_soc(self) -> float:
+        return self._max_soc if self._max_soc is not None else 0.0
+
+
 class Building(BaseModel):
     """Building within a campus"""
     building_id: str
@@ -99,9 +288,6 @@ class Building(BaseModel):
     geo_location: Optional[GeoLocation] = None
     address: Optional[str] = None
 
-    # Nodes
-    nodes: List[Node] = Field(default_factory=list)
-
     # Aggregate capacity
     total_capacity_kwh: float = 0.0
     total_power_kw: float = 0.0
@@ -110,19 +296,40 @@ class Building(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Nodes are held as private copies keyed by node_id, so every change goes
+    # through add_node/update_node/remove_node and the aggregates stay exact
+    _nodes: Dict[str, Node] = PrivateAttr(default_factory=dict)
+    _aggregates: AggregateStore = PrivateAttr(default_factory=AggregateStore)
+
+    def __init__(self, nodes: Sequence[Any] = (), **data):
+        super().__init__(**data)
+        for node in nodes:
+            self.add_node(node if isinstance(node, Node) else Node.model_validate(node))
+
+    @computed_field
+    @property
+    def nodes(self) -> List[Node]:
+        """Copies of the building's nodes; mutating them does not change the building"""
+        return [node.model_copy(deep=True) for node in self._nodes.values()]
+
+    def add_node(self, node: Node):
+        """Add a node and include it in the running aggregates"""
+        self.update_node(node)
+
+    def update_node(self, node: Node):
+        """Store a copy of the node (replacing any with the same node_id) and refresh the aggregates"""
+        node = node.model_copy(deep=True)
+        self._nodes[node.node_id] = node
+        self._aggregates.upsert(node)
+
+    def remove_node(self, node_id: str):
+        """Remove a node and its contribution"""
+        self._nodes.pop(node_id, None)
+        self._aggregates.remove(node_id)
+
     def aggregate_capacity(self) -> NodeCapacity:
         """Calculate aggregate capacity of all nodes"""
-        total_power = sum(node.capacity.rated_power_kw for node in self.nodes)
-        total_energy = sum(node.capacity.energy_capacity_kwh for node in self.nodes)
-        available_power = sum(node.capacity.available_power_kw for node in self.nodes if node.status == NodeStatus.ONLINE)
-        available_energy = sum(node.capacity.available_energy_kwh for node in self.nodes if node.status == NodeStatus.ONLINE)
-
-        return NodeCapacity(
-            rated_power_kw=total_power,
-            energy_capacity_kwh=total_energy,
-            available_power_kw=available_power,
-            available_energy_kwh=available_energy
-        )
+        return self._aggregates.capacity()
 
 
 class Campus(BaseModel):
@@ -177,6 +384,13 @@ class Campus(BaseModel):
             available_energy_kwh=available_energy
         )
 
+    def update_node(self, node: Node):
+        """Refresh the owning building's aggregates after a node changed"""
+        for building in self.buildings:
+            if building.building_id == node.building_id:
+                building.update_node(node)
+                return
+
     def get_all_nodes(self) -> List[Node]:
         """Get all nodes across all buildings"""
         nodes = []
@@ -0,0 +1,175 @@
+"""
+Fleet Droop Engine
+Vectorized primary frequency response for many BESS units at once
+"""
+
+import logging
+from typing import Optional, Dict, Any, List, Sequence, Union
+
+import numpy as np
+
+from frequency_droop import DroopSettings, ResponseMode
+
+logger = logging.getLogger(__name__)
+
+ArrayLike = Union[float, Sequence[float], np.ndarray]
+
+
+class FleetDroopEngine:
+    """
+    Droop response for a whole fleet in one call per PMU sample
+
+    Holds per-unit settings, SOC, temperature and last setpoints as NumPy
+    arrays and reproduces FrequencyDroopController /
+    AdaptiveDroopController semantics element-wise: deadband, droop,
+    ROCOF damping, power clamp, ramp limit and (for adaptive units) the
+    SOC and temperature factors.
+    """
+
+    F_NOMINAL = 50.0
+
+    def __init__(self,
+                 settings: Sequence[DroopSettings],
+                 unit_ids: Optional[Sequence[str]] = None,
+                 adaptive: Union[bool, Sequence[bool]] = True):
+        """
+        Args:
+            settings: One DroopSettings per unit
+            unit_ids: Optional unit identifiers (index order)
+            adaptive: Apply SOC/temperature factors (all units or per unit)
+        """
+        n = len(settings)
+        self.unit_ids = list(unit_ids) if unit_ids is not None else [str(i) for i in range(n)]
+        self.index = {unit_id: i for i, unit_id in enumerate(self.unit_ids)}
+
+        self.droop_fraction = np.array([s.droop_percent / 100.0 for s in settings])
+        self.deadband_low = np.array([s.deadband_low for s in settings])
+        self.deadband_high = np.array([s.deadband_high for s in settings])
+        self.max_power_kw = np.array([s.max_power_kw for s in settings])
+        self.ramp_rate_kw_per_s = np.array([s.ramp_rate_kw_per_s for s in settings])
+        self.damping_gain = np.array([s.damping_gain if s.enable_damping else 0.0 for s in settings])
+        self.mode_on = np.array([s.response_mode != ResponseMode.OFF for s in settings])
+        self.adaptive = np.broadcast_to(np.asarray(adaptive, dtype=bool), (n,)).copy()
+
+        # State
+        self.enabled = np.zeros(n, dtype=bool)
+        self.setpoint_kw = np.zeros(n)
+        self.soc = np.full(n, 80.0)
+        self.temperature = np.full(n, 25.0)
+        self.last_frequency = self.F_NOMINAL
+
+    def __len__(self) -> int:
+        return len(self.unit_ids)
+
+    def enable(self, units: Optional[Sequence[str]] = None):
+        """Enable all units (or the given ones)"""
+        self.enabled[self._mask(units)] = True
+
+    def disable(self, units: Optional[Sequence[str]] = None):
+        """Disable units and zero their setpoints"""
+        mask = self._mask(units)
+        self.enabled[mask] = False
+        self.setpoint_kw[mask] = 0.0
+
+    def _mask(self, units: Optional[Sequence[str]]) -> np.ndarray:
+        if units is None:
+            return np.ones(len(self), dtype=bool)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[[self.index[u] for u in units]] = True
+        return mask
+
+    def update_state(self, soc: Optional[ArrayLike] = None, temperature: Optional[ArrayLike] = None):
+        """Update SOC/temperature (full arrays; NaN keeps a unit's previous value)"""
+        if soc is not None:
+            soc = np.broadcast_to(np.asarray(soc, dtype=float), self.soc.shape)
+            self.soc = np.where(np.isnan(soc), self.soc, soc)
+        if temperature is not None:
+            temperature = np.broadcast_to(np.asarray(temperature, dtype=float), self.temperature.shape)
+            self.temperature = np.where(np.isnan(temperature), self.temperature, temperature)
+
+    def soc_factor(self, frequency: ArrayLike) -> np.ndarray:
+        """SOC scaling: discharge capability at low f, charge headroom at high f"""
+        soc = self.soc
+        discharge = np.select([soc > 80, soc > 50, soc > 20], [1.0, 0.7, 0.3], 0.0)
+        charge = np.select([soc < 20, soc < 50, soc < 80], [1.0, 0.7, 0.3], 0.0)
+        return np.where(np.asarray(frequency) - self.F_NOMINAL < 0, discharge, charge)
+
+    def temperature_factor(self) -> np.ndarray:
+        """Full power at 15-35 °C, derated outside, 0.2 at/above 50 °C"""
+        t = self.temperature
+        return np.select(
+            [(t >= 15) & (t <= 35), t < 15, t < 50],
+            [1.0, np.maximum(0.5, 1.0 - (15 - t) * 0.02), np.maximum(0.5, 1.0 - (t - 35) * 0.02)],
+            0.2
+        )
+
+    def compute(self,
+                frequency: ArrayLike,
+                rocof: Optional[ArrayLike] = None,
+                dt_s: float = 1.0,
+                soc: Optional[ArrayLike] = None,
+                temperature: Optional[ArrayLike] = None) -> np.ndarray:
+        """
+        Power response of every unit for one frequency sample
+
+        Args:
+            frequency: Grid frequency (Hz), scalar or per unit (e.g. per zone)
+            rocof: Rate of change of frequency (Hz/s), optional
+            dt_s: Time since the previous call, scales the ramp limit
+                  (the scalar controllers assume 1 s)
+            soc, temperature: Optional state updates applied first
+
+        Returns:
+            Per-unit power (kW), positive = discharge, negative = charge
+        """
+        self.update_state(soc, temperature)
+        frequency = np.asarray(frequency, dtype=float)
+
+        active = self.enabled & self.mode_on
+        outside = (frequency < self.deadband_low) | (frequency > self.deadband_high)
+        responding = active & outside
+
+        # Droop: dP = -(P_max / droop) * (df / f_nominal)
+        deviation = frequency - self.F_NOMINAL
+        power = -(self.max_power_kw / self.droop_fraction) * (deviation / self.F_NOMINAL)
+
+        if rocof is not None:
+            power = power - self.damping_gain * np.asarray(rocof, dtype=float) * self.max_power_kw
+
+        power = np.clip(power, -self.max_power_kw, self.max_power_kw)
+
+        # Ramp limit from the last setpoint
+        step = self.ramp_rate_kw_per_s * dt_s
+        power = np.clip(power, self.setpoint_kw - step, self.setpoint_kw + step)
+
+        # Units in the deadband output zero but keep their setpoint, like the scalar controller
+        self.setpoint_kw = np.where(responding, power, self.setpoint_kw)
+        base = np.where(responding, power, 0.0)
+
+        factor = np.where(self.adaptive, self.soc_factor(frequency) * self.temperature_factor(), 1.0)
+        self.last_frequency = frequency
+        return base * factor
+
+    def compute_total(self, frequency: ArrayLike, rocof: Optional[ArrayLike] = None, dt_s: float = 1.0) -> float:
+        """Aggregate fleet response (kW)"""
+        return float(self.compute(frequency, rocof, dt_s).sum())
+
+    def to_dict(self, power_kw: np.ndarray) -> Dict[str, float]:
+        """Per-unit response keyed by unit id"""
+        return dict(zip(self.unit_ids, power_kw.tolist()))
+
+    def get_status(self) -> Dict[str, Any]:
+        """Fleet summary"""
+        return {
+            "units": len(self),
+            "enabled_units": int(self.enabled.sum()),
+            "total_setpoint_kw": float(self.setpoint_kw.sum()),
+            "max_power_kw": float(self.max_power_kw[self.enabled].sum()),
+            "last_frequency": float(np.mean(self.last_frequency))
+        }
+
+    @classmethod
+    def uniform(cls, settings: DroopSettings, count: int, unit_ids: Optional[List[str]] = None,
+                adaptive: bool = True) -> "FleetDroopEngine":
+        """Fleet of identical units"""
+        return cls([settings] * count, unit_ids, adaptive)
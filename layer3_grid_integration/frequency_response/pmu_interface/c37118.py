@@ -0,0 +1,541 @@
+"""
+IEEE C37.118 Synchrophasor Protocol
+Frame encoding/decoding and an asyncio TCP connection to a PMU or PDC
+
+Supports configuration frames (CFG-1/CFG-2), data frames with integer or
+floating point, rectangular or polar phasors, and command frames. Data
+frames are decoded with one precompiled struct per PMU block, built once
+per configuration.
+"""
+
+import asyncio
+import logging
+import math
+import struct
+import time
+from binascii import crc_hqx
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import List, Optional, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+SYNC_BYTE = 0xAA
+HEADER = struct.Struct(">HHHII")      # SYNC, FRAMESIZE, IDCODE, SOC, FRACSEC
+CHK = struct.Struct(">H")
+HEADER_SIZE = HEADER.size              # 14
+PREFIX = struct.Struct(">HH")          # SYNC, FRAMESIZE (enough to frame a stream)
+
+_U16 = struct.Struct(">H")
+_CFG_START = struct.Struct(">IH")      # TIME_BASE, NUM_PMU
+_CFG_PMU = struct.Struct(">16sHHHHH")  # STN, IDCODE, FORMAT, PHNMR, ANNMR, DGNMR
+_CFG_TAIL = struct.Struct(">HH")       # FNOM, CFGCNT
+_I32 = struct.Struct(">I")
+_DATA_RATE = struct.Struct(">h")
+
+
+class FrameType(IntEnum):
+    """Frame type, bits 6-4 of the second SYNC byte"""
+    DATA = 0
+    HEADER = 1
+    CONFIG1 = 2
+    CONFIG2 = 3
+    COMMAND = 4
+    CONFIG3 = 5
+
+
+class Command(IntEnum):
+    """Command frame CMD values"""
+    DATA_OFF = 1
+    DATA_ON = 2
+    SEND_HEADER = 3
+    SEND_CONFIG1 = 4
+    SEND_CONFIG2 = 5
+
+
+class C37118Error(Exception):
+    """Malformed or unsupported frame"""
+    pass
+
+
+# FORMAT word bits
+FORMAT_FREQ_FLOAT = 0x8
+FORMAT_ANALOG_FLOAT = 0x4
+FORMAT_PHASOR_FLOAT = 0x2
+FORMAT_PHASOR_POLAR = 0x1
+
+# STAT word bits
+STAT_DATA_ERROR = 0xC000
+STAT_SYNC_LOST = 0x2000
+
+
+@dataclass
+class PMUConfig:
+    """Configuration of one PMU block inside a configuration frame"""
+    station_name: str
+    idcode: int
+    format: int
+    phasor_names: List[str]
+    analog_names: List[str] = field(default_factory=list)
+    digital_names: List[str] = field(default_factory=list)   # 16 names per digital word
+    phasor_units: List[int] = field(default_factory=list)    # PHUNIT: type byte + 24-bit scale (1e-5 V|A per bit)
+    analog_units: List[int] = field(default_factory=list)
+    digital_units: List[int] = field(default_factory=list)
+    nominal_frequency: float = 50.0
+    cfgcnt: int = 0
+
+    @property
+    def num_digital(self) -> int:
+        return len(self.digital_names) // 16
+
+    @property
+    def phasor_float(self) -> bool:
+        return bool(self.format & FORMAT_PHASOR_FLOAT)
+
+    @property
+    def phasor_polar(self) -> bool:
+        return bool(self.format & FORMAT_PHASOR_POLAR)
+
+    @property
+    def freq_float(self) -> bool:
+        return bool(self.format & FORMAT_FREQ_FLOAT)
+
+    @property
+    def analog_float(self) -> bool:
+        return bool(self.format & FORMAT_ANALOG_FLOAT)
+
+    def phasor_index(self, current: bool = False) -> Optional[int]:
+        """Index of the first voltage (or current) phasor, from the PHUNIT type byte"""
+        kind = 1 if current else 0
+        for i, unit in enumerate(self.phasor_units):
+            if unit >> 24 == kind:
+                return i
+        return None
+
+    def data_struct(self) -> struct.Struct:
+        """Struct for this PMU's block in a data frame"""
+        if self.phasor_float:
+            phasor = "ff"
+        else:
+            phasor = "Hh" if self.phasor_polar else "hh"
+        freq = "ff" if self.freq_float else "hh"
+        analog = "f" if self.analog_float else "h"
+        return struct.Struct(
+            ">H" + phasor * len(self.phasor_names) + freq
+            + analog * len(self.analog_names) + "H" * self.num_digital
+        )
+
+
+@dataclass
+class ConfigFrame:
+    """CFG-1/CFG-2 frame"""
+    idcode: int
+    time_base: int
+    pmus: List[PMUConfig]
+    data_rate: int                      # Frames/s (>0) or seconds/frame (<0)
+    frame_type: FrameType = FrameType.CONFIG2
+    version: int = 1
+
+    @property
+    def frames_per_second(self) -> float:
+        return float(self.data_rate) if self.data_rate > 0 else 1.0 / -self.data_rate
+
+
+@dataclass
+class PhasorSample:
+    """Decoded values of one PMU block"""
+    idcode: int
+    station_name: str
+    timestamp: float                    # Unix time
+    stat: int
+    frequency: float                    # Hz
+    rocof: float                        # Hz/s
+    phasors: List[Tuple[float, float]]  # (magnitude in V|A, angle in radians)
+    analogs: List[float]
+    digitals: List[int]
+
+    @property
+    def data_valid(self) -> bool:
+        return not (self.stat & STAT_DATA_ERROR)
+
+    @property
+    def sync_locked(self) -> bool:
+        return not (self.stat & STAT_SYNC_LOST)
+
+
+def frame_type_of(sync: int) -> FrameType:
+    return FrameType((sync >> 4) & 0x7)
+
+
+def _finish(body: bytearray) -> bytes:
+    """Fill FRAMESIZE and append the CRC-CCITT checksum"""
+    _U16.pack_into(body, 2, len(body) + CHK.size)
+    body += CHK.pack(crc_hqx(bytes(body), 0xFFFF))
+    return bytes(body)
+
+
+def _header(frame_type: FrameType, idcode: int, soc: int, fracsec: int, version: int = 1) -> bytearray:
+    sync = (SYNC_BYTE << 8) | (int(frame_type) << 4) | version
+    return bytearray(HEADER.pack(sync, 0, idcode, soc, fracsec))
+
+
+def check_frame(frame: bytes) -> Tuple[FrameType, int, int, int]:
+    """
+    Validate SYNC, size and CRC
+
+    Returns:
+        (frame type, idcode, soc, fracsec)
+    """
+    if len(frame) < HEADER_SIZE + CHK.size:
+        raise C37118Error(f"Frame too short: {len(frame)} bytes")
+    sync, size, idcode, soc, fracsec = HEADER.unpack_from(frame)
+    if sync >> 8 != SYNC_BYTE:
+        raise C37118Error(f"Bad SYNC word 0x{sync:04x}")
+    if size != len(frame):
+        raise C37118Error(f"FRAMESIZE {size} does not match {len(frame)} bytes")
+    if crc_hqx(frame[:-2], 0xFFFF) != CHK.unpack_from(frame, size - 2)[0]:
+        raise C37118Error("CRC mismatch")
+    return frame_type_of(sync), idcode, soc, fracsec
+
+
+# ---------------------------------------------------------------------------
+# Configuration and command frames
+# ---------------------------------------------------------------------------
+
+def _name(raw: bytes) -> str:
+    return raw.decode("ascii", errors="replace").rstrip(" \x00")
+
+
+def parse_config_frame(frame: bytes) -> ConfigFrame:
+    """Decode a CFG-1/CFG-2 frame"""
+    frame_type, idcode, _, _ = check_frame(frame)
+    if frame_type not in (FrameType.CONFIG1, FrameType.CONFIG2):
+        raise C37118Error(f"Not a CFG-1/2 frame: {frame_type.name}")
+
+    time_base, num_pmu = _CFG_START.unpack_from(frame, HEADER_SIZE)
+    offset = HEADER_SIZE + _CFG_START.size
+    pmus = []
+
+    for _ in range(num_pmu):
+        stn, pmu_id, fmt, phnmr, annmr, dgnmr = _CFG_PMU.unpack_from(frame, offset)
+        offset += _CFG_PMU.size
+
+        names = [_name(frame[offset + 16 * i: offset + 16 * (i + 1)]) for i in range(phnmr + annmr + 16 * dgnmr)]
+        offset += 16 * len(names)
+
+        units = [_I32.unpack_from(frame, offset + 4 * i)[0] for i in range(phnmr + annmr + dgnmr)]
+        offset += 4 * len(units)
+
+        fnom, cfgcnt = _CFG_TAIL.unpack_from(frame, offset)
+        offset += _CFG_TAIL.size
+
+        pmus.append(PMUConfig(
+            station_name=_name(stn),
+            idcode=pmu_id,
+            format=fmt,
+            phasor_names=names[:phnmr],
+            analog_names=names[phnmr:phnmr + annmr],
+            digital_names=names[phnmr + annmr:],
+            phasor_units=units[:phnmr],
+            analog_units=units[phnmr:phnmr + annmr],
+            digital_units=units[phnmr + annmr:],
+            nominal_frequency=50.0 if fnom & 0x1 else 60.0,
+            cfgcnt=cfgcnt
+        ))
+
+    data_rate, = _DATA_RATE.unpack_from(frame, offset)
+    return ConfigFrame(
+        idcode=idcode,
+        time_base=time_base & 0xFFFFFF,
+        pmus=pmus,
+        data_rate=data_rate,
+        frame_type=frame_type,
+        version=HEADER.unpack_from(frame)[0] & 0xF
+    )
+
+
+def encode_config_frame(config: ConfigFrame, soc: int, fracsec: int = 0) -> bytes:
+    """Build a CFG-1/CFG-2 frame"""
+    body = _header(config.frame_type, config.idcode, soc, fracsec, config.version)
+    body += _CFG_START.pack(config.time_base, len(config.pmus))
+
+    for pmu in config.pmus:
+        if len(pmu.digital_names) % 16:
+            raise C37118Error("Digital channel names must come in groups of 16")
+        body += _CFG_PMU.pack(
+            pmu.station_name.encode("ascii").ljust(16)[:16], pmu.idcode, pmu.format,
+            len(pmu.phasor_names), len(pmu.analog_names), pmu.num_digital
+        )
+        for name in pmu.phasor_names + pmu.analog_names + pmu.digital_names:
+            body += name.encode("ascii").ljust(16)[:16]
+        phasor_units = pmu.phasor_units or [0] * len(pmu.phasor_names)
+        analog_units = pmu.analog_units or [0] * len(pmu.analog_names)
+        digital_units = pmu.digital_units or [0] * pmu.num_digital
+        for unit in phasor_units + analog_units + digital_units:
+            body += _I32.pack(unit)
+        body += _CFG_TAIL.pack(1 if pmu.nominal_frequency == 50.0 else 0, pmu.cfgcnt)
+
+    body += _DATA_RATE.pack(config.data_rate)
+    return _finish(body)
+
+
+def encode_command_frame(idcode: int, command: Command, soc: int = 0, fracsec: int = 0) -> bytes:
+    body = _header(FrameType.COMMAND, idcode, soc, fracsec)
+    body += _U16.pack(int(command))
+    return _finish(body)
+
+
+def parse_command_frame(frame: bytes) -> Command:
+    frame_type, _, _, _ = check_frame(frame)
+    if frame_type != FrameType.COMMAND:
+        raise C37118Error(f"Not a command frame: {frame_type.name}")
+    return Command(_U16.unpack_from(frame, HEADER_SIZE)[0])
+
+
+# ---------------------------------------------------------------------------
+# Data frames
+# ---------------------------------------------------------------------------
+
+class DataFrameCodec:
+    """
+    Encoder/decoder for data frames of one configuration
+
+    The per-PMU struct layouts, scale factors and nominal frequencies are
+    computed once here; decoding a frame is then one unpack_from per PMU.
+    """
+
+    def __init__(self, config: ConfigFrame):
+        self.config = config
+        self.time_base = config.time_base or 1
+        self.layouts: List[Tuple[PMUConfig, struct.Struct, List[float]]] = []
+        size = HEADER_SIZE + CHK.size
+
+        for pmu in config.pmus:
+            layout = pmu.data_struct()
+            scales = [
+                1.0 if pmu.phasor_float else (unit & 0xFFFFFF) * 1e-5
+                for unit in (pmu.phasor_units or [0] * len(pmu.phasor_names))
+            ]
+            self.layouts.append((pmu, layout, scales))
+            size += layout.size
+
+        self.frame_size = size
+
+    def decode(self, frame: bytes, verify: bool = True) -> List[PhasorSample]:
+        """Decode a data frame into one PhasorSample per PMU"""
+        if verify:
+            frame_type, _, soc, fracsec = check_frame(frame)
+            if frame_type != FrameType.DATA:
+                raise C37118Error(f"Not a data frame: {frame_type.name}")
+        else:
+            _, _, _, soc, fracsec = HEADER.unpack_from(frame)
+
+        if len(frame) != self.frame_size:
+            raise C37118Error(f"Data frame is {len(frame)} bytes, configuration expects {self.frame_size}")
+
+        timestamp = soc + (fracsec & 0xFFFFFF) / self.time_base
+        offset = HEADER_SIZE
+        samples = []
+
+        for pmu, layout, scales in self.layouts:
+            values = layout.unpack_from(frame, offset)
+            offset += layout.size
+
+            stat = values[0]
+            n_phasors = len(scales)
+            raw = values[1:1 + 2 * n_phasors]
+            phasors = []
+            for i, scale in enumerate(scales):
+                a, b = raw[2 * i], raw[2 * i + 1]
+                if pmu.phasor_polar:
+                    phasors.append((a * scale, b if pmu.phasor_float else b * 1e-4))
+                else:
+                    phasors.append((math.hypot(a, b) * scale, math.atan2(b, a)))
+
+            i = 1 + 2 * n_phasors
+            freq, dfreq = values[i], values[i + 1]
+            if pmu.freq_float:
+                frequency, rocof = freq, dfreq
+            else:
+                frequency, rocof = pmu.nominal_frequency + freq / 1000.0, dfreq / 100.0
+
+            i += 2
+            n_analog = len(pmu.analog_names)
+            samples.append(PhasorSample(
+                idcode=pmu.idcode,
+                station_name=pmu.station_name,
+                timestamp=timestamp,
+                stat=stat,
+                frequency=frequency,
+                rocof=rocof,
+                phasors=phasors,
+                analogs=list(values[i:i + n_analog]),
+                digitals=list(values[i + n_analog:])
+            ))
+
+        return samples
+
+    def encode(self, soc: int, fracsec: int, samples: List[PhasorSample]) -> bytes:
+        """Build a data frame (one sample per configured PMU, in order)"""
+        body = _header(FrameType.DATA, self.config.idcode, soc, fracsec, self.config.version)
+
+        for (pmu, layout, scales), sample in zip(self.layouts, samples):
+            values = [sample.stat]
+            for (magnitude, angle), scale in zip(sample.phasors, scales):
+                if pmu.phasor_float:
+                    values += [magnitude, angle] if pmu.phasor_polar else [magnitude * math.cos(angle), magnitude * math.sin(angle)]
+                elif pmu.phasor_polar:
+                    values += [min(0xFFFF, round(magnitude / scale)), round(angle * 1e4)]
+                else:
+                    values += [round(magnitude * math.cos(angle) / scale), round(magnitude * math.sin(angle) / scale)]
+
+            if pmu.freq_float:
+                values += [sample.frequency, sample.rocof]
+            else:
+                values += [round((sample.frequency - pmu.nominal_frequency) * 1000.0), round(sample.rocof * 100.0)]
+
+            values += [v if pmu.analog_float else round(v) for v in sample.analogs]
+            values += sample.digitals or [0] * pmu.num_digital
+            body += layout.pack(*values)
+
+        return _finish(body)
+
+
+def split_frames(buffer: bytes) -> Iterator[bytes]:
+    """Split a captured byte stream into frames (for file replay/tests)"""
+    offset = 0
+    while offset + PREFIX.size <= len(buffer):
+        sync, size = PREFIX.unpack_from(buffer, offset)
+        if sync >> 8 != SYNC_BYTE or size < HEADER_SIZE + CHK.size:
+            raise C37118Error(f"Lost frame sync at byte {offset}")
+        if offset + size > len(buffer):
+            break
+        yield buffer[offset:offset + size]
+        offset += size
+
+
+def read_capture(path: str) -> List[bytes]:
+    """Load frames from a file of concatenated C37.118 frames"""
+    with open(path, "rb") as f:
+        return list(split_frames(f.read()))
+
+
+def time_to_soc_fracsec(timestamp: float, time_base: int) -> Tuple[int, int]:
+    soc = int(timestamp)
+    return soc, min(time_base - 1, int(round((timestamp - soc) * time_base)))
+
+
+# ---------------------------------------------------------------------------
+# TCP connection
+# ---------------------------------------------------------------------------
+
+class C37118Connection:
+    """
+    TCP client for a PMU/PDC
+
+    Requests the CFG-2 frame, turns on data transmission and yields
+    decoded data frames. Frames are read as SYNC+FRAMESIZE prefix then the
+    remainder with readexactly, so there is no per-byte parsing.
+    Once the configuration is known, a frame that does not arrive within
+    `stall_frames` frame periods (at least `min_read_timeout` s) raises
+    C37118Error, so a silent PMU is treated like a dropped stream.
+    """
+
+    def __init__(self, host: str, port: int = 4712, idcode: int = 1, verify_crc: bool = True,
+                 stall_frames: float = 5.0, min_read_timeout: float = 0.5):
+        self.host = host
+        self.port = port
+        self.idcode = idcode
+        self.verify_crc = verify_crc
+        self.stall_frames = stall_frames
+        self.min_read_timeout = min_read_timeout
+
+        self.config: Optional[ConfigFrame] = None
+        self.codec: Optional[DataFrameCodec] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+        self.frames_received = 0
+        self.frames_rejected = 0
+
+    async def open(self, timeout: float = 10.0):
+        """Connect, fetch the configuration and start the data stream"""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout
+        )
+        await self.send_command(Command.DATA_OFF)
+        await self.send_command(Command.SEND_CONFIG2)
+
+        while self.config is None:
+            frame = await asyncio.wait_for(self.read_frame(), timeout)
+            if frame_type_of(PREFIX.unpack_from(frame)[0]) in (FrameType.CONFIG1, FrameType.CONFIG2):
+                self.set_config(parse_config_frame(frame))
+
+        await self.send_command(Command.DATA_ON)
+        logger.info(f"C37.118 stream from {self.host}:{self.port}: {len(self.config.pmus)} PMU(s) "
+                    f"at {self.config.frames_per_second:g} frames/s")
+
+    def set_config(self, config: ConfigFrame):
+        self.config = config
+        self.codec = DataFrameCodec(config)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        """Longest wait for the next frame (None until the CFG frame arrives)"""
+        if self.config is None:
+            return None
+        return max(self.stall_frames / self.config.frames_per_second, self.min_read_timeout)
+
+    async def close(self):
+        if self._writer is not None:
+            try:
+                await self.send_command(Command.DATA_OFF)
+            except Exception:
+                pass
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+            self._reader = None
+
+    async def send_command(self, command: Command):
+        now = time.time()
+        self._writer.write(encode_command_frame(self.idcode, command, int(now)))
+        await self._writer.drain()
+
+    async def read_frame(self) -> bytes:
+        """Read the next complete frame of any type"""
+        timeout = self.read_timeout
+        try:
+            return await asyncio.wait_for(self._read_frame(), timeout)
+        except asyncio.TimeoutError:
+            raise C37118Error(f"No frame from {self.host}:{self.port} within {timeout:.2f}s") from None
+
+    async def _read_frame(self) -> bytes:
+        prefix = await self._reader.readexactly(PREFIX.size)
+        sync, size = PREFIX.unpack(prefix)
+        if sync >> 8 != SYNC_BYTE or size < HEADER_SIZE + CHK.size:
+            raise C37118Error(f"Lost frame sync (SYNC 0x{sync:04x}, size {size})")
+        return prefix + await self._reader.readexactly(size - PREFIX.size)
+
+    async def read_samples(self) -> List[PhasorSample]:
+        """Read until the next valid data frame and decode it"""
+        while True:
+            frame = await self.read_frame()
+            frame_type = frame_type_of(PREFIX.unpack_from(frame)[0])
+
+            if frame_type == FrameType.DATA and self.codec is not None:
+                try:
+                    samples = self.codec.decode(frame, verify=self.verify_crc)
+                except C37118Error as e:
+                    self.frames_rejected += 1
+                    logger.warning(f"Dropping data frame: {e}")
+                    continue
+                self.frames_received += 1
+                return samples
+
+            if frame_type in (FrameType.CONFIG1, FrameType.CONFIG2):
+                # Configuration changed mid-stream
+                self.set_config(parse_config_frame(frame))
@@ -6,12 +6,19 @@ Supports IEEE C37.118 protocol or simulated data
 
 import logging
 import asyncio
-from typing import Optional, Dict, Any
+import math
+from collections import deque
+from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 import random
 
+import numpy as np
+
+from c37118 import C37118Connection, PhasorSample
+from grid_simulator import GridFrequencySimulator
+
 logger = logging.getLogger(__name__)
 
 
@@ -50,36 +57,82 @@ class PMUClient:
     In production, this would connect to POSOCO WAMS or local PMU hardware
     """
 
-    def __init__(self, pmu_host: str = "localhost", pmu_port: int = 4712):
+    def __init__(self,
+                 pmu_host: str = "localhost",
+                 pmu_port: int = 4712,
+                 simulated: bool = True,
+                 idcode: int = 1,
+                 zone: GridZone = GridZone.WESTERN,
+                 simulator: Optional[GridFrequencySimulator] = None):
         """
         Initialize PMU client
 
         Args:
             pmu_host: PMU server IP address
             pmu_port: PMU server port (IEEE C37.118 default: 4712)
+            simulated: Generate measurements instead of reading a C37.118 stream
+            idcode: IDCODE used in command frames
+            zone: Grid zone reported in measurements
+            simulator: Seeded scenario generator for simulated mode
+                       (reproducible frequency and trace timestamps)
         """
         self.pmu_host = pmu_host
         self.pmu_port = pmu_port
+        self.simulated = simulated
+        self.idcode = idcode
+        self.zone = zone
         self.connected = False
+        self._closed = False  # disconnect() was called; stop reconnecting
+
+        # C37.118 stream (non-simulated mode)
+        self.connection: Optional[C37118Connection] = None
+        self._pending: deque = deque()  # Measurements from multi-PMU (PDC) frames
 
         # For simulation
         self.sim_base_frequency = 50.0
         self.sim_frequency = 50.0
         self.sim_trend = 0.0
+        self.simulator = simulator
+        if simulator is not None:
+            self._sim_samples = simulator.samples()
+            self._sim_random = random.Random(simulator.seed)
 
     async def connect(self) -> bool:
         """Connect to PMU data stream"""
-        # In production, this would establish IEEE C37.118 connection
-        # For now, we'll simulate
-        logger.info(f"[SIMULATED] Connected to PMU at {self.pmu_host}:{self.pmu_port}")
+        self._closed = False
+        return await self._open()
+
+    async def _open(self) -> bool:
+        if self.simulated:
+            logger.info(f"[SIMULATED] Connected to PMU at {self.pmu_host}:{self.pmu_port}")
+            self.connected = True
+            return True
+
+        self.connection = C37118Connection(self.pmu_host, self.pmu_port, self.idcode)
+        try:
+            await self.connection.open()
+        except Exception as e:
+            logger.error(f"Failed to connect to PMU at {self.pmu_host}:{self.pmu_port}: {e!r}")
+            await self.connection.close()
+            self.connection = None
+            return False
+
         self.connected = True
         return True
 
     async def disconnect(self):
         """Disconnect from PMU"""
-        self.connected = False
+        self._closed = True
+        await self._close()
         logger.info("Disconnected from PMU")
 
+    async def _close(self):
+        self.connected = False
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+        self._pending.clear()
+
     async def get_measurement(self) -> Optional[PMUMeasurement]:
         """
         Get real-time PMU measurement
@@ -91,12 +144,44 @@ class PMUClient:
             logger.error("Not connected to PMU")
             return None
 
-        # In production, this would parse IEEE C37.118 synchrophasor data
-        # For simulation, we generate realistic frequency variations
-        return self._simulate_measurement()
+        if self.simulated:
+            return self._simulate_measurement()
+
+        # A PDC frame carries several PMUs; hand them out one at a time
+        if not self._pending:
+            samples = await self.connection.read_samples()
+            self._pending.extend(self._to_measurement(sample) for sample in samples)
+        return self._pending.popleft() if self._pending else None
+
+    def _to_measurement(self, sample: PhasorSample) -> PMUMeasurement:
+        """Map a decoded C37.118 PMU block onto a PMUMeasurement"""
+        config = next(
+            (pmu for pmu in self.connection.config.pmus if pmu.idcode == sample.idcode),
+            self.connection.config.pmus[0]
+        )
+        v = config.phasor_index(current=False)
+        i = config.phasor_index(current=True)
+        voltage = sample.phasors[v] if v is not None else (0.0, 0.0)
+        current = sample.phasors[i] if i is not None else (0.0, 0.0)
+
+        return PMUMeasurement(
+            timestamp=datetime.utcfromtimestamp(sample.timestamp),
+            frequency=sample.frequency,
+            rocof=sample.rocof,
+            voltage_magnitude=voltage[0] / 1000.0,
+            voltage_angle=math.degrees(voltage[1]),
+            current_magnitude=current[0],
+            current_angle=math.degrees(current[1]),
+            sync_locked=sample.sync_locked,
+            data_valid=sample.data_valid,
+            zone=self.zone,
+            substation=sample.station_name
+        )
 
     def _simulate_measurement(self) -> PMUMeasurement:
         """Simulate realistic grid frequency variations"""
+        if self.simulator is not None:
+            return self._scenario_measurement()
 
         # Simulate frequency variations around 50 Hz
         # Include both random noise and systematic trends
@@ -144,32 +229,99 @@ class PMUClient:
             substation="Andheri 400kV"
         )
 
-    async def stream_measurements(self, callback, interval: float = 0.1):
+    def _scenario_measurement(self) -> PMUMeasurement:
+        """Next sample of the seeded scenario trace"""
+        timestamp, frequency, rocof = next(self._sim_samples)
+        rng = self._sim_random
+        voltage_ang = rng.uniform(-15, 15)
+
+        return PMUMeasurement(
+            timestamp=datetime.utcfromtimestamp(timestamp),
+            frequency=frequency,
+            rocof=rocof,
+            voltage_magnitude=400.0 + rng.gauss(0, 5.0),
+            voltage_angle=voltage_ang,
+            current_magnitude=500.0 + rng.gauss(0, 50.0),
+            current_angle=voltage_ang - 30.0,
+            sync_locked=True,
+            data_valid=True,
+            zone=self.zone,
+            substation="Simulated"
+        )
+
+    async def stream_measurements(self, callback, interval: float = 0.1, max_backoff: float = 30.0):
         """
         Stream PMU measurements at specified interval
 
+        A failed read (EOF, reset, bad frame, no frame within the read
+        timeout) drops the connection; it is reopened with exponential
+        backoff until disconnect() is called.
+
         Args:
             callback: Async function to call with each measurement
             interval: Measurement interval in seconds (default 100ms for 10Hz)
+            max_backoff: Longest wait between reconnect attempts (s)
         """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        backoff = interval
+
         while self.connected:
             try:
                 measurement = await self.get_measurement()
-                if measurement:
-                    await callback(measurement)
             except Exception as e:
-                logger.error(f"Error in PMU stream: {e}")
-
-            await asyncio.sleep(interval)
+                if self.simulated:
+                    logger.error(f"Error in PMU stream: {e}")
+                    measurement = None
+                else:
+                    logger.error(f"PMU stream read failed: {e!r}")
+                    await self._close()
+                    while not self._closed:
+                        backoff = min(max(2 * backoff, 1.0), max_backoff)
+                        logger.info(f"Reconnecting to PMU in {backoff:.0f}s")
+                        await asyncio.sleep(backoff)
+                        if self._closed or await self._open():
+                            break
+                    continue
+
+            if measurement:
+                backoff = interval
+                try:
+                    await callback(measurement)
+                except Exception as e:
+                    logger.error(f"Error in PMU stream callback: {e}")
+
+            if not self.simulated:
+                # Frames may already be buffered; let other tasks run
+                await asyncio.sleep(0)
+            else:
+                # A real PMU paces the stream itself. Sleep to the next
+                # deadline so callback time does not stretch the period.
+                deadline += interval
+                delay = deadline - loop.time()
+                if delay < 0:
+                    deadline += math.ceil(-delay / interval) * interval
+                    delay = deadline - loop.time()
+                await asyncio.sleep(delay)
 
 
 class FrequencyMonitor:
     """
     Grid frequency monitor with alarm detection
     Implements IEGC frequency band detection
+
+    History lives in preallocated NumPy ring buffers. Window statistics
+    (mean/std via sliding Welford, min/max via monotonic deques) are
+    maintained on every update, so update and get_status are O(1)
+    amortized at PMU rates (25-50 Hz).
     """
 
-    def __init__(self):
+    def __init__(self, max_history: int = 3000, stats_window: int = 600):
+        """
+        Args:
+            max_history: Samples kept (3000 = 5 minutes at 10 Hz)
+            stats_window: Samples in the statistics window (600 = 60 s at 10 Hz)
+        """
         # IEGC frequency bands (Indian Electricity Grid Code)
         self.FREQ_NORMAL_MIN = 49.90
         self.FREQ_NORMAL_MAX = 50.05
@@ -178,61 +330,142 @@ class FrequencyMonitor:
 
         # State
         self.current_frequency = 50.0
-        self.frequency_history = []
-        self.max_history = 3000  # 5 minutes at 10Hz
+        self.max_history = max_history
+        self.stats_window = min(stats_window, max_history)
+
+        # Ring buffers (Unix time, Hz, Hz/s)
+        self._timestamps = np.zeros(max_history)
+        self._frequency = np.zeros(max_history)
+        self._rocof = np.zeros(max_history)
+        self._seq = 0  # Total samples ever written; slot = seq % max_history
+
+        # Sliding window statistics
+        self._win_mean = 0.0
+        self._win_m2 = 0.0
+        self._win_min: deque = deque()  # (seq, freq), increasing freq
+        self._win_max: deque = deque()  # (seq, freq), decreasing freq
 
         # Alarms
         self.in_alarm = False
         self.alarm_reason = None
+        self._alarm_band = "NORMAL"
+
+    @property
+    def history_size(self) -> int:
+        return min(self._seq, self.max_history)
+
+    @property
+    def frequency_history(self) -> List[Dict[str, Any]]:
+        """History as a list of dicts, oldest first (built on demand)"""
+        timestamps, frequency, rocof = self.get_history()
+        return [
+            {"timestamp": datetime.utcfromtimestamp(t), "frequency": float(f), "rocof": float(r)}
+            for t, f, r in zip(timestamps, frequency, rocof)
+        ]
+
+    def get_history(self, n: Optional[int] = None):
+        """Last n (default all) samples as (timestamps, frequency, rocof) arrays, oldest first"""
+        size = self.history_size if n is None else min(n, self.history_size)
+        idx = np.arange(self._seq - size, self._seq) % self.max_history
+        return self._timestamps[idx], self._frequency[idx], self._rocof[idx]
 
     async def update(self, measurement: PMUMeasurement):
         """Update frequency monitor with new measurement"""
-        self.current_frequency = measurement.frequency
-
-        # Store history
-        self.frequency_history.append({
-            "timestamp": measurement.timestamp,
-            "frequency": measurement.frequency,
-            "rocof": measurement.rocof
-        })
-
-        # Limit history size
-        if len(self.frequency_history) > self.max_history:
-            self.frequency_history.pop(0)
+        timestamp = measurement.timestamp
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        self.add_sample(timestamp.timestamp(), measurement.frequency, measurement.rocof)
 
         # Check alarm conditions
         self._check_alarms(measurement)
 
+    def add_sample(self, timestamp: float, frequency: float, rocof: float):
+        """Record one sample and roll the statistics window (no alarm checks)"""
+        self.current_frequency = frequency
+
+        seq = self._seq
+        slot = seq % self.max_history
+        window = self.stats_window
+
+        # Sample leaving the statistics window
+        n = min(seq, window)
+        if seq >= window:
+            old = float(self._frequency[(seq - window) % self.max_history])
+            n -= 1
+            if n == 0:
+                self._win_mean = self._win_m2 = 0.0
+            else:
+                delta = old - self._win_mean
+                self._win_mean -= delta / n
+                self._win_m2 -= delta * (old - self._win_mean)
+
+        self._timestamps[slot] = timestamp
+        self._frequency[slot] = frequency
+        self._rocof[slot] = rocof
+        self._seq = seq + 1
+
+        # Sample entering the window (Welford)
+        n += 1
+        delta = frequency - self._win_mean
+        self._win_mean += delta / n
+        self._win_m2 += delta * (frequency - self._win_mean)
+
+        # Monotonic deques for window min/max
+        oldest = self._seq - window
+        while self._win_min and self._win_min[-1][1] >= frequency:
+            self._win_min.pop()
+        self._win_min.append((seq, frequency))
+        while self._win_min[0][0] < oldest:
+            self._win_min.popleft()
+
+        while self._win_max and self._win_max[-1][1] <= frequency:
+            self._win_max.pop()
+        self._win_max.append((seq, frequency))
+        while self._win_max[0][0] < oldest:
+            self._win_max.popleft()
+
+        # Periodically recompute the window from the ring to stop rounding drift
+        if self._seq % window == 0:
+            _, recent, _ = self.get_history(window)
+            self._win_mean = float(recent.mean())
+            self._win_m2 = float(((recent - self._win_mean) ** 2).sum())
+
     def _check_alarms(self, measurement: PMUMeasurement):
-        """Check for frequency alarm conditions"""
+        """Check for frequency alarm conditions (logs on band changes only)"""
         freq = measurement.frequency
+        previous_reason = self.alarm_reason
 
         if freq < self.FREQ_CRITICAL_LOW:
             self.in_alarm = True
             self.alarm_reason = f"CRITICAL LOW FREQUENCY: {freq:.3f} Hz"
-            logger.error(self.alarm_reason)
+            band, log = "CRITICAL_LOW", logger.error
 
         elif freq > self.FREQ_CRITICAL_HIGH:
             self.in_alarm = True
             self.alarm_reason = f"CRITICAL HIGH FREQUENCY: {freq:.3f} Hz"
-            logger.error(self.alarm_reason)
+            band, log = "CRITICAL_HIGH", logger.error
 
         elif freq < self.FREQ_NORMAL_MIN:
             self.in_alarm = True
             self.alarm_reason = f"Low frequency: {freq:.3f} Hz (below 49.90 Hz)"
-            logger.warning(self.alarm_reason)
+            band, log = "LOW", logger.warning
 
         elif freq > self.FREQ_NORMAL_MAX:
             self.in_alarm = True
             self.alarm_reason = f"High frequency: {freq:.3f} Hz (above 50.05 Hz)"
-            logger.warning(self.alarm_reason)
+            band, log = "HIGH", logger.warning
 
         else:
             # Frequency within normal range
-            if self.in_alarm:
+            if previous_reason is not None:
                 logger.info(f"Frequency returned to normal: {freq:.3f} Hz")
             self.in_alarm = False
             self.alarm_reason = None
+            band, log = "NORMAL", None
+
+        if log is not None and band != self._alarm_band:
+            log(self.alarm_reason)
+        self._alarm_band = band
 
         # Check ROCOF (Rate of Change of Frequency)
         if abs(measurement.rocof) > 1.0:  # >1 Hz/s is abnormal
@@ -240,13 +473,13 @@ class FrequencyMonitor:
 
     def get_status(self) -> Dict[str, Any]:
         """Get current frequency monitor status"""
-        # Calculate statistics
-        if self.frequency_history:
-            recent_freqs = [h["frequency"] for h in self.frequency_history[-600:]]  # Last 60 seconds
-            avg_freq = sum(recent_freqs) / len(recent_freqs)
-            min_freq = min(recent_freqs)
-            max_freq = max(recent_freqs)
-            std_dev = (sum((f - avg_freq) ** 2 for f in recent_freqs) / len(recent_freqs)) ** 0.5
+        # Window statistics are maintained incrementally
+        n = min(self._seq, self.stats_window)
+        if n:
+            avg_freq = self._win_mean
+            min_freq = self._win_min[0][1]
+            max_freq = self._win_max[0][1]
+            std_dev = max(0.0, self._win_m2 / n) ** 0.5
         else:
             avg_freq = 50.0
             min_freq = 50.0
@@ -264,7 +497,7 @@ class FrequencyMonitor:
                 "std_dev_60s": std_dev
             },
             "frequency_band": self._get_frequency_band(self.current_frequency),
-            "history_size": len(self.frequency_history)
+            "history_size": self.history_size
         }
 
     def _get_frequency_band(self, freq: float) -> str:
@@ -289,3 +522,24 @@ class FrequencyMonitor:
     def get_frequency_deviation(self) -> float:
         """Get frequency deviation from nominal (50 Hz)"""
         return self.current_frequency - 50.0
+
+
+class ZoneFrequencyMonitor:
+    """One FrequencyMonitor per grid zone, fed from mixed PMU streams"""
+
+    def __init__(self, max_history: int = 3000, stats_window: int = 600):
+        self.max_history = max_history
+        self.stats_window = stats_window
+        self.monitors: Dict[GridZone, FrequencyMonitor] = {}
+
+    def get_monitor(self, zone: GridZone) -> FrequencyMonitor:
+        monitor = self.monitors.get(zone)
+        if monitor is None:
+            monitor = self.monitors[zone] = FrequencyMonitor(self.max_history, self.stats_window)
+        return monitor
+
+    async def update(self, measurement: PMUMeasurement):
+        await self.get_monitor(measurement.zone).update(measurement)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {zone.value: monitor.get_status() for zone, monitor in self.monitors.items()}
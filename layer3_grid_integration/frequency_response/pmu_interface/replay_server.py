@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+C37.118 PMU Replay Server
+Stands in for a real PMU/PDC: answers command frames and streams data frames
+
+Frames come from a capture file (concatenated C37.118 frames, re-stamped
+with the current time) or are synthesized from the PMU simulator.
+
+Usage (from layer3_grid_integration/frequency_response/pmu_interface):
+    python replay_server.py --port 4712 --rate 50
+    python replay_server.py --capture pmu_capture.bin
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import time
+from binascii import crc_hqx
+from typing import List, Optional
+
+from c37118 import (
+    C37118Error, Command, ConfigFrame, DataFrameCodec, FrameType, PMUConfig, PhasorSample,
+    HEADER, HEADER_SIZE, PREFIX, CHK, encode_config_frame, frame_type_of,
+    parse_command_frame, parse_config_frame, read_capture, time_to_soc_fracsec
+)
+from pmu_client import PMUClient
+
+logger = logging.getLogger(__name__)
+
+PHUNIT_VOLTAGE = 0 << 24
+PHUNIT_CURRENT = 1 << 24
+
+
+def default_config(num_pmus: int = 1,
+                   data_rate: int = 50,
+                   idcode: int = 1,
+                   float_format: bool = False) -> ConfigFrame:
+    """CFG-2 with one voltage and one current phasor per PMU"""
+    fmt = 0x1 | (0xE if float_format else 0)    # Polar; float phasors/analogs/freq if requested
+    pmus = [
+        PMUConfig(
+            station_name=f"PMU{i + 1}",
+            idcode=idcode + i,
+            format=fmt,
+            phasor_names=["VA", "IA"],
+            phasor_units=[PHUNIT_VOLTAGE | 915527, PHUNIT_CURRENT | 4577],  # ~9.2 V, ~0.046 A per bit
+            nominal_frequency=50.0
+        )
+        for i in range(num_pmus)
+    ]
+    return ConfigFrame(idcode=idcode, time_base=1_000_000, pmus=pmus, data_rate=data_rate)
+
+
+def restamp(frame: bytes, timestamp: float, time_base: int) -> bytes:
+    """Replace SOC/FRACSEC of a captured frame and recompute its CRC"""
+    soc, fracsec = time_to_soc_fracsec(timestamp, time_base)
+    buf = bytearray(frame)
+    sync, size, idcode, _, old_fracsec = HEADER.unpack_from(buf)
+    HEADER.pack_into(buf, 0, sync, size, idcode, soc, (old_fracsec & 0xFF000000) | fracsec)
+    CHK.pack_into(buf, size - 2, crc_hqx(bytes(buf[:-2]), 0xFFFF))
+    return bytes(buf)
+
+
+class C37118ReplayServer:
+    """
+    Serves a C37.118 stream over TCP
+
+    Each client gets the configuration on SEND_CONFIG1/2 and a data stream
+    between DATA_ON and DATA_OFF, paced on a fixed-rate clock.
+    """
+
+    def __init__(self,
+                 config: Optional[ConfigFrame] = None,
+                 frames: Optional[List[bytes]] = None,
+                 host: str = "127.0.0.1",
+                 port: int = 4712):
+        """
+        Args:
+            config: Configuration to serve (taken from the capture if omitted)
+            frames: Captured data frames to replay in a loop; synthesized if omitted
+        """
+        if config is None and frames:
+            config = next(
+                (parse_config_frame(f) for f in frames
+                 if frame_type_of(PREFIX.unpack_from(f)[0]) in (FrameType.CONFIG1, FrameType.CONFIG2)),
+                None
+            )
+        self.config = config or default_config()
+        self.codec = DataFrameCodec(self.config)
+        self.frames = [f for f in (frames or []) if frame_type_of(PREFIX.unpack_from(f)[0]) == FrameType.DATA]
+        self.host = host
+        self.port = port
+
+        self._simulators = [PMUClient() for _ in self.config.pmus]
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.frames_sent = 0
+
+    def _synthesize(self, timestamp: float) -> bytes:
+        samples = []
+        for pmu, simulator in zip(self.config.pmus, self._simulators):
+            m = simulator._simulate_measurement()
+            samples.append(PhasorSample(
+                idcode=pmu.idcode,
+                station_name=pmu.station_name,
+                timestamp=timestamp,
+                stat=0,
+                frequency=m.frequency,
+                rocof=max(-327.0, min(327.0, m.rocof)),
+                phasors=[(m.voltage_magnitude * 1000.0, math.radians(m.voltage_angle)),
+                         (m.current_magnitude, math.radians(m.current_angle))],
+                analogs=[],
+                digitals=[]
+            ))
+        soc, fracsec = time_to_soc_fracsec(timestamp, self.config.time_base)
+        return self.codec.encode(soc, fracsec, samples)
+
+    def next_frame(self, index: int, timestamp: float) -> bytes:
+        if self.frames:
+            return restamp(self.frames[index % len(self.frames)], timestamp, self.config.time_base)
+        return self._synthesize(timestamp)
+
+    async def _stream(self, writer: asyncio.StreamWriter):
+        """Send data frames at the configured rate until cancelled"""
+        period = 1.0 / self.config.frames_per_second
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        index = 0
+
+        while True:
+            writer.write(self.next_frame(index, time.time()))
+            await writer.drain()
+            self.frames_sent += 1
+            index += 1
+
+            deadline += period
+            delay = deadline - loop.time()
+            if delay < 0:
+                # Fell behind: skip missed frames rather than bursting
+                deadline += math.ceil(-delay / period) * period
+                delay = deadline - loop.time()
+            await asyncio.sleep(delay)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        logger.info(f"PMU client connected: {peer}")
+        stream_task: Optional[asyncio.Task] = None
+
+        try:
+            while True:
+                prefix = await reader.readexactly(PREFIX.size)
+                _, size = PREFIX.unpack(prefix)
+                if size < HEADER_SIZE + CHK.size:
+                    raise C37118Error(f"Bad frame size {size}")
+                frame = prefix + await reader.readexactly(size - PREFIX.size)
+                command = parse_command_frame(frame)
+
+                if command in (Command.SEND_CONFIG1, Command.SEND_CONFIG2):
+                    writer.write(encode_config_frame(self.config, int(time.time())))
+                    await writer.drain()
+                elif command == Command.DATA_ON and stream_task is None:
+                    stream_task = asyncio.create_task(self._stream(writer))
+                elif command == Command.DATA_OFF and stream_task is not None:
+                    stream_task.cancel()
+                    stream_task = None
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except C37118Error as e:
+            logger.warning(f"Bad frame from {peer}: {e}")
+        finally:
+            if stream_task is not None:
+                stream_task.cancel()
+            writer.close()
+            logger.info(f"PMU client disconnected: {peer}")
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"C37.118 replay server on {self.host}:{self.port} "
+                    f"({len(self.config.pmus)} PMU(s), {self.config.frames_per_second:g} frames/s, "
+                    f"{'capture' if self.frames else 'simulated'})")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="C37.118 PMU replay server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=4712)
+    parser.add_argument("--rate", type=int, default=50, help="Frames per second (synthesized stream)")
+    parser.add_argument("--pmus", type=int, default=1, help="PMUs per frame (synthesized stream)")
+    parser.add_argument("--capture", help="File of concatenated C37.118 frames to replay")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.capture:
+        server = C37118ReplayServer(frames=read_capture(args.capture), host=args.host, port=args.port)
+    else:
+        server = C37118ReplayServer(default_config(args.pmus, args.rate), host=args.host, port=args.port)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
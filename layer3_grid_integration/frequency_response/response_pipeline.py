@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Frequency Response Pipeline
+PMU stream -> frequency monitor -> fleet droop -> campus dispatch
+
+Samples are ingested as the PMU delivers them; a fixed-rate clock takes
+the newest one, computes every campus's droop response in one call and
+sends it only where it moved by more than a threshold. The response is
+sent as an offset (POST /dispatch/offset) that each campus adds to its
+own schedule, so the pipeline never needs to know the schedule.
+Sign convention: the droop engine returns positive = discharge, while
+campus offsets are positive = charge, so the response is negated when it
+becomes an offset (under-frequency -> negative offset -> discharge).
+Latency from the PMU time tag to the campus acknowledgment is kept in
+histograms and checked against the IEGC primary response limit.
+
+Usage (from layer3_grid_integration/frequency_response):
+    python response_pipeline.py --campus CAMPUS_001=http://localhost:8100
+    python response_pipeline.py --pmu-host 127.0.0.1 --campus ...
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import sys
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pmu_interface'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'droop_controller'))
+from pmu_client import PMUClient, PMUMeasurement, FrequencyMonitor
+from frequency_droop import DroopSettings
+from fleet_droop import FleetDroopEngine
+
+logger = logging.getLogger(__name__)
+
+# IEGC: primary response must start within 5 s of the event (see IEGCComplianceChecker)
+IEGC_RESPONSE_LIMIT_MS = 5000.0
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (ms)
+
+    Recording is O(log buckets) with constant memory, so it can run for
+    the life of the process. Percentiles are reported as the upper bound
+    of the bucket they fall in (the observed maximum for the last one).
+    """
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self, bounds_ms: Sequence[float] = BOUNDS_MS):
+        self.bounds_ms = list(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms: float):
+        self.counts[bisect_left(self.bounds_ms, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = math.ceil(p / 100.0 * self.count)
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= max(target, 1):
+                return min(self.bounds_ms[i], self.max_ms) if i < len(self.bounds_ms) else self.max_ms
+        return self.max_ms
+
+    def fraction_within(self, limit_ms: float) -> Optional[float]:
+        """Share of samples at or below limit_ms (exact when limit_ms is a bucket bound)"""
+        if not self.count:
+            return None
+        within = sum(self.counts[:bisect_left(self.bounds_ms, limit_ms) + 1])
+        return within / self.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {f"le_{b:g}": n for b, n in zip(self.bounds_ms, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": self.total_ms / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max_ms if self.count else None,
+            "buckets": buckets
+        }
+
+
+@dataclass
+class CampusLink:
+    """
+    Dispatch state of one campus controller
+
+    Offsets use the campus convention: kW, positive = charge,
+    negative = discharge (the opposite sign of FleetDroopEngine output).
+    """
+    campus_id: str
+    url: str
+    requested_kw: Optional[float] = None       # Last response offset handed to dispatch
+    acked_kw: Optional[float] = None           # Last offset the campus acknowledged
+    pending: Optional[Tuple[float, float]] = None   # (offset, sample time) waiting for the in-flight one
+    in_flight: Optional[asyncio.Task] = None
+    dispatches: int = 0
+    coalesced: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+
+
+class FrequencyResponsePipeline:
+    """
+    Closed-loop primary frequency response for a set of campuses
+
+    Each campus is one unit of a FleetDroopEngine sized by the campus's
+    available power. At most one dispatch is in flight per campus; newer
+    offsets computed meanwhile replace each other and only the latest
+    is sent when it completes.
+    """
+
+    def __init__(self,
+                 pmu: PMUClient,
+                 campuses: Dict[str, str],
+                 settings: Optional[DroopSettings] = None,
+                 rate_hz: float = 10.0,
+                 threshold_kw: float = 5.0,
+                 strategy: Optional[str] = None,
+                 dispatch_deadline_ms: float = 1000.0,
+                 refresh_interval_s: float = 10.0,
+                 client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            pmu: PMU source (simulated or C37.118)
+            campuses: campus_id -> campus controller base URL
+            settings: Droop settings applied to every campus
+            rate_hz: Control clock rate
+            threshold_kw: Minimum setpoint change worth a dispatch
+            strategy: Campus dispatch strategy (default: each campus's schedule strategy)
+            dispatch_deadline_ms: Deadline passed to each campus dispatch
+            refresh_interval_s: Campus capacity/SOC refresh period
+        """
+        self.pmu = pmu
+        self.monitor = FrequencyMonitor()
+        self.links: List[CampusLink] = [CampusLink(campus_id, url.rstrip("/")) for campus_id, url in campuses.items()]
+        self.engine = FleetDroopEngine([settings or DroopSettings()] * len(self.links),
+                                       unit_ids=list(campuses))
+        self.engine.enable()
+
+        self.period = 1.0 / rate_hz
+        self.threshold_kw = threshold_kw
+        self.strategy = strategy
+        self.dispatch_deadline_ms = dispatch_deadline_ms
+        self.refresh_interval_s = refresh_interval_s
+        self.client = client or httpx.AsyncClient(timeout=dispatch_deadline_ms / 1000.0 + 1.0)
+
+        self._latest: Optional[PMUMeasurement] = None
+        self._processed: Optional[PMUMeasurement] = None
+        self._last_compute: Optional[float] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # Statistics
+        self.samples = 0
+        self.ticks = 0
+        self.idle_ticks = 0          # No new sample since the previous tick
+        self.overruns = 0            # Ticks skipped because the loop fell behind
+        self.invalid_samples = 0
+        self.latency = {
+            "sample_to_compute_ms": LatencyHistogram(),   # PMU time tag -> droop computed
+            "dispatch_ms": LatencyHistogram(),            # Dispatch sent -> campus ack
+            "end_to_end_ms": LatencyHistogram(),          # PMU time tag -> campus ack
+        }
+
+    @staticmethod
+    def _sample_time(measurement: PMUMeasurement) -> float:
+        timestamp = measurement.timestamp
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.timestamp()
+
+    async def _on_measurement(self, measurement: PMUMeasurement):
+        await self.monitor.update(measurement)
+        self._latest = measurement
+        self.samples += 1
+
+    def step(self):
+        """One control tick: droop on the newest sample, then offer the response offsets"""
+        self.ticks += 1
+        measurement = self._latest
+        if measurement is None or measurement is self._processed:
+            self.idle_ticks += 1
+            return
+        self._processed = measurement
+        if not measurement.data_valid:
+            self.invalid_samples += 1
+            return
+
+        now = time.monotonic()
+        dt_s = self.period if self._last_compute is None else now - self._last_compute
+        self._last_compute = now
+
+        sample_time = self._sample_time(measurement)
+        response = self.engine.compute(measurement.frequency, measurement.rocof, dt_s=dt_s)
+        self.latency["sample_to_compute_ms"].record(max(0.0, (time.time() - sample_time) * 1000.0))
+
+        # Engine output is positive = discharge; campus offsets are positive = charge
+        for link, power_kw in zip(self.links, response.tolist()):
+            self._offer(link, -power_kw, sample_time)
+
+    def _offer(self, link: CampusLink, offset_kw: float, sample_time: float):
+        """Queue an offset unless it is within threshold of the last one requested"""
+        # The first offset is always sent, clearing any left by a previous run
+        if link.requested_kw is not None:
+            change = abs(offset_kw - link.requested_kw)
+            # Always settle exactly back onto the schedule
+            back_to_schedule = offset_kw == 0.0 and link.requested_kw != 0.0
+            if change < self.threshold_kw and not back_to_schedule:
+                return
+
+        link.requested_kw = offset_kw
+        if link.in_flight is not None:
+            if link.pending is not None:
+                link.coalesced += 1
+            link.pending = (offset_kw, sample_time)
+            return
+        link.in_flight = asyncio.create_task(self._dispatch(link, offset_kw, sample_time))
+
+    async def _dispatch(self, link: CampusLink, offset_kw: float, sample_time: float):
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(
+                    f"{link.url}/dispatch/offset",
+                    json={
+                        "offset_kw": offset_kw,
+                        "strategy": self.strategy,
+                        "deadline_ms": self.dispatch_deadline_ms
+                    }
+                )
+                response.raise_for_status()
+                link.acked_kw = offset_kw
+                link.dispatches += 1
+                link.last_error = None
+                self.latency["dispatch_ms"].record((time.perf_counter() - started) * 1000.0)
+                self.latency["end_to_end_ms"].record(max(0.0, (time.time() - sample_time) * 1000.0))
+            except Exception as e:
+                link.failures += 1
+                if link.last_error is None:
+                    logger.warning(f"Dispatch to {link.campus_id} failed: {e!r}")
+                link.last_error = repr(e)
+                # Let the next tick retry unless a newer offset is already waiting
+                if link.pending is None:
+                    link.requested_kw = link.acked_kw
+
+            if link.pending is None:
+                break
+            (offset_kw, sample_time), link.pending = link.pending, None
+
+        link.in_flight = None
+
+    async def refresh_campuses(self):
+        """Size each campus's droop unit by its available power and feed its average SOC"""
+        async def fetch(link: CampusLink) -> Tuple[float, float]:
+            try:
+                capacity, telemetry = await asyncio.gather(
+                    self.client.get(f"{link.url}/capacity"),
+                    self.client.get(f"{link.url}/telemetry")
+                )
+                capacity.raise_for_status()
+                telemetry.raise_for_status()
+                return capacity.json()["available_power_kw"], telemetry.json()["average_soc"]
+            except Exception as e:
+                logger.debug(f"Could not refresh {link.campus_id}: {e!r}")
+                return np.nan, np.nan
+
+        results = await asyncio.gather(*(fetch(link) for link in self.links))
+        if not results:
+            return
+        available, soc = np.array(results, dtype=float).T
+        self.engine.max_power_kw = np.where(np.isnan(available), self.engine.max_power_kw, available)
+        self.engine.update_state(soc=soc)
+
+    async def _clock(self):
+        """Run step() on a fixed-rate clock (deadline based, no drift)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+
+        while True:
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Error in response pipeline: {e}")
+
+            deadline += self.period
+            delay = deadline - loop.time()
+            if delay < 0:
+                # Fell behind: skip missed ticks rather than bursting
+                missed = math.ceil(-delay / self.period)
+                self.overruns += missed
+                deadline += missed * self.period
+                delay = deadline - loop.time()
+            await asyncio.sleep(delay)
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh_campuses()
+            await asyncio.sleep(self.refresh_interval_s)
+
+    async def start(self) -> bool:
+        if not self.pmu.connected and not await self.pmu.connect():
+            return False
+        self._tasks = [
+            asyncio.create_task(self.pmu.stream_measurements(self._on_measurement, self.period)),
+            asyncio.create_task(self._refresh_loop()),
+            asyncio.create_task(self._clock()),
+        ]
+        logger.info(f"Frequency response pipeline running at {1.0 / self.period:g} Hz "
+                    f"for {len(self.links)} campus(es)")
+        return True
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        in_flight = [link.in_flight for link in self.links if link.in_flight is not None]
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        await self.pmu.disconnect()
+
+    def get_stats(self) -> Dict[str, Any]:
+        end_to_end = self.latency["end_to_end_ms"]
+        return {
+            "samples": self.samples,
+            "ticks": self.ticks,
+            "idle_ticks": self.idle_ticks,
+            "overruns": self.overruns,
+            "invalid_samples": self.invalid_samples,
+            "frequency": self.monitor.current_frequency,
+            "total_response_kw": float(self.engine.setpoint_kw.sum()),
+            "latency": {name: histogram.to_dict() for name, histogram in self.latency.items()},
+            "iegc": {
+                "response_limit_ms": IEGC_RESPONSE_LIMIT_MS,
+                "within_limit": end_to_end.fraction_within(IEGC_RESPONSE_LIMIT_MS),
+                "compliant": end_to_end.max_ms <= IEGC_RESPONSE_LIMIT_MS if end_to_end.count else None
+            },
+            "campuses": {
+                link.campus_id: {
+                    "requested_kw": link.requested_kw,
+                    "acked_kw": link.acked_kw,
+                    "dispatches": link.dispatches,
+                    "coalesced": link.coalesced,
+                    "failures": link.failures,
+                    "last_error": link.last_error
+                }
+                for link in self.links
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PMU-driven frequency response pipeline")
+    parser.add_argument("--campus", action="append", default=[], metavar="ID=URL",
+                        help="Campus controller to dispatch (repeatable)")
+    parser.add_argument("--pmu-host", help="C37.118 PMU/PDC host (simulated PMU if omitted)")
+    parser.add_argument("--pmu-port", type=int, default=4712)
+    parser.add_argument("--rate", type=float, default=10.0, help="Control clock rate (Hz)")
+    parser.add_argument("--threshold-kw", type=float, default=5.0, help="Minimum setpoint change to dispatch")
+    parser.add_argument("--droop", type=float, default=5.0, help="Droop (%%)")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between stats logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    campuses = dict(spec.split("=", 1) for spec in args.campus)
+    if not campuses:
+        parser.error("at least one --campus ID=URL is required")
+
+    pmu = PMUClient(args.pmu_host or "localhost", args.pmu_port, simulated=args.pmu_host is None)
+    pipeline = FrequencyResponsePipeline(pmu, campuses, DroopSettings(droop_percent=args.droop),
+                                         rate_hz=args.rate, threshold_kw=args.threshold_kw)
+
+    async def run():
+        if not await pipeline.start():
+            return
+        try:
+            while True:
+                await asyncio.sleep(args.stats_interval)
+                stats = pipeline.get_stats()
+                e2e = stats["latency"]["end_to_end_ms"]
+                logger.info(f"f={stats['frequency']:.3f} Hz, response={stats['total_response_kw']:.1f} kW, "
+                            f"end-to-end p50={e2e['p50']} p99={e2e['p99']} max={e2e['max']} ms, "
+                            f"IEGC compliant={stats['iegc']['compliant']}")
+        finally:
+            await pipeline.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Regional Aggregation Tree
+Incremental campus -> city -> state -> (grid region) -> country rollups
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Set
+from dataclasses import dataclass, field
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'layer2_campus_aggregation'))
+from models.location_schema import LocationLevel, NodeCapacity, CampusTelemetry, RegionalTelemetry
+
+logger = logging.getLogger(__name__)
+
+RegionKey = Tuple[LocationLevel, str]
+
+# Order of the summed quantities in a contribution vector
+FIELDS = (
+    "total_power_kw",
+    "total_capacity_kwh",
+    "rated_power_kw",
+    "available_power_kw",
+    "available_energy_kwh",
+    "soc_weighted_kwh",       # average_soc * capacity, for the capacity-weighted mean
+    "soc_weight_kwh",         # capacity of campuses reporting SOC
+    "num_total_nodes",
+    "num_online_nodes",
+    "num_fault_nodes",
+)
+_ZERO = (0.0,) * len(FIELDS)
+
+
+@dataclass
+class RegionAggregate:
+    """Running totals for one node of the hierarchy"""
+    region_id: str
+    level: LocationLevel
+    totals: List[float] = field(default_factory=lambda: list(_ZERO))
+    campus_ids: Set[str] = field(default_factory=set)
+    updated_at: Optional[datetime] = None
+
+    def apply(self, delta: Tuple[float, ...]):
+        totals = self.totals
+        for i, value in enumerate(delta):
+            totals[i] += value
+
+    def get(self, name: str) -> float:
+        return self.totals[FIELDS.index(name)]
+
+
+@dataclass
+class CampusEntry:
+    """A registered campus, its place in the hierarchy and last report"""
+    campus_id: str
+    name: str
+    path: List[RegionKey]                     # Ancestors, nearest first
+    rated_power_kw: float = 0.0
+    capacity_kwh: float = 0.0
+    telemetry: Optional[CampusTelemetry] = None
+    capacity: Optional[NodeCapacity] = None
+    contribution: Tuple[float, ...] = _ZERO
+
+
+class RegionalAggregationTree:
+    """
+    Hierarchical rollup of campus telemetry
+
+    Each campus remembers its last contribution vector; a new report
+    applies only the difference to the campus's ancestors, so an update
+    costs O(depth) and any regional query is O(1) regardless of how many
+    campuses sit below it. States that belong to a grid region (RLDC)
+    from the configuration also roll up into that region.
+    """
+
+    def __init__(self, state_regions: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            state_regions: state_id -> grid region id (e.g. REGION_WESTERN)
+        """
+        self.state_regions = state_regions or {}
+        self.regions: Dict[RegionKey, RegionAggregate] = {}
+        self.campuses: Dict[str, CampusEntry] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "RegionalAggregationTree":
+        """Build from the `regional_aggregation` section of layer3_config.yaml"""
+        state_regions = {}
+        for region in (config or {}).get("regions", []):
+            for state_id in region.get("states", []):
+                state_regions[state_id] = region["id"]
+        return cls(state_regions)
+
+    def _path(self, city_id: str, state_id: str, country_id: str) -> List[RegionKey]:
+        path = [(LocationLevel.CITY, city_id), (LocationLevel.STATE, state_id)]
+        region_id = self.state_regions.get(state_id)
+        if region_id:
+            path.append((LocationLevel.REGION, region_id))
+        path.append((LocationLevel.COUNTRY, country_id))
+        return path
+
+    def _region(self, key: RegionKey) -> RegionAggregate:
+        region = self.regions.get(key)
+        if region is None:
+            region = self.regions[key] = RegionAggregate(region_id=key[1], level=key[0])
+        return region
+
+    def _propagate(self, entry: CampusEntry, delta: Tuple[float, ...]):
+        now = datetime.utcnow()
+        for key in entry.path:
+            region = self._region(key)
+            region.apply(delta)
+            region.updated_at = now
+
+    @staticmethod
+    def _contribution(entry: CampusEntry) -> Tuple[float, ...]:
+        telemetry = entry.telemetry
+        capacity = entry.capacity
+
+        total_capacity = capacity.energy_capacity_kwh if capacity else entry.capacity_kwh
+        rated_power = capacity.rated_power_kw if capacity else entry.rated_power_kw
+        if telemetry is None:
+            return (0.0, total_capacity, rated_power, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+        soc_weight = telemetry.total_capacity_kwh if telemetry.online_nodes else 0.0
+        return (
+            telemetry.total_power_kw,
+            telemetry.total_capacity_kwh,
+            rated_power,
+            capacity.available_power_kw if capacity else 0.0,
+            telemetry.total_energy_available_kwh,
+            telemetry.average_soc * soc_weight,
+            soc_weight,
+            float(telemetry.total_nodes),
+            float(telemetry.online_nodes),
+            float(telemetry.fault_nodes),
+        )
+
+    def _refresh(self, entry: CampusEntry):
+        new = self._contribution(entry)
+        delta = tuple(n - o for n, o in zip(new, entry.contribution))
+        entry.contribution = new
+        if any(delta):
+            self._propagate(entry, delta)
+
+    def register_campus(self,
+                        campus_id: str,
+                        name: str,
+                        city_id: str,
+                        state_id: str,
+                        country_id: str,
+                        rated_power_kw: float = 0.0,
+                        capacity_kwh: float = 0.0) -> CampusEntry:
+        """Add a campus, or move/update an existing one"""
+        path = self._path(city_id, state_id, country_id)
+        entry = self.campuses.get(campus_id)
+
+        if entry is not None and entry.path != path:
+            # Hierarchy changed: take the campus out of its old ancestors
+            self.remove_campus(campus_id)
+            entry = None
+
+        if entry is None:
+            entry = self.campuses[campus_id] = CampusEntry(campus_id=campus_id, name=name, path=path)
+            for key in path:
+                self._region(key).campus_ids.add(campus_id)
+
+        entry.name = name
+        entry.rated_power_kw = rated_power_kw
+        entry.capacity_kwh = capacity_kwh
+        self._refresh(entry)
+        return entry
+
+    def update_campus(self, telemetry: CampusTelemetry, capacity: Optional[NodeCapacity] = None):
+        """Apply a new campus telemetry report (campus must be registered)"""
+        entry = self.campuses.get(telemetry.campus_id)
+        if entry is None:
+            raise KeyError(f"Campus not registered: {telemetry.campus_id}")
+
+        entry.telemetry = telemetry
+        if capacity is not None:
+            entry.capacity = capacity
+        self._refresh(entry)
+
+    def remove_campus(self, campus_id: str):
+        """Remove a campus and its contribution"""
+        entry = self.campuses.pop(campus_id, None)
+        if entry is None:
+            return
+        self._propagate(entry, tuple(-value for value in entry.contribution))
+        for key in entry.path:
+            self.regions[key].campus_ids.discard(campus_id)
+
+    def get_region(self, level: LocationLevel, region_id: str) -> RegionAggregate:
+        key = (level, region_id)
+        if key not in self.regions:
+            raise KeyError(f"Unknown {level.value}: {region_id}")
+        return self.regions[key]
+
+    def get_telemetry(self,
+                      level: LocationLevel,
+                      region_id: str,
+                      include_campuses: bool = False) -> RegionalTelemetry:
+        """Regional telemetry; campus breakdown is optional since it is O(campuses)"""
+        region = self.get_region(level, region_id)
+        soc_weight = region.get("soc_weight_kwh")
+
+        campuses = []
+        if include_campuses:
+            campuses = [
+                self.campuses[campus_id].telemetry
+                for campus_id in sorted(region.campus_ids)
+                if self.campuses[campus_id].telemetry is not None
+            ]
+
+        return RegionalTelemetry(
+            region_id=region_id,
+            region_level=level,
+            timestamp=region.updated_at or datetime.utcnow(),
+            total_power_kw=region.get("total_power_kw"),
+            total_capacity_kwh=region.get("total_capacity_kwh"),
+            average_soc=region.get("soc_weighted_kwh") / soc_weight if soc_weight > 0 else 0.0,
+            num_campuses=len(region.campus_ids),
+            num_online_nodes=int(round(region.get("num_online_nodes"))),
+            num_total_nodes=int(round(region.get("num_total_nodes"))),
+            campuses=campuses
+        )
+
+    def get_capacity(self, level: LocationLevel, region_id: str) -> NodeCapacity:
+        """Aggregate capacity of a region"""
+        region = self.get_region(level, region_id)
+        return NodeCapacity(
+            rated_power_kw=region.get("rated_power_kw"),
+            energy_capacity_kwh=region.get("total_capacity_kwh"),
+            available_power_kw=region.get("available_power_kw"),
+            available_energy_kwh=region.get("available_energy_kwh")
+        )
+
+    def list_regions(self, level: Optional[LocationLevel] = None) -> List[Dict]:
+        """Summary of known hierarchy nodes, optionally for one level"""
+        return [
+            {
+                "region_id": region.region_id,
+                "level": region.level.value,
+                "num_campuses": len(region.campus_ids),
+                "total_power_kw": region.get("total_power_kw"),
+                "updated_at": region.updated_at
+            }
+            for region in self.regions.values()
+            if level is None or region.level == level
+        ]
@@ -0,0 +1,158 @@
+"""
+Regional Aggregator Service
+Rolls campus telemetry up to city, state, grid region and country level
+for SLDC/RLDC reporting
+"""
+
+import logging
+import os
+import sys
+from typing import Optional, Dict, Any
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'layer2_campus_aggregation'))
+from aggregation_tree import RegionalAggregationTree
+from models.location_schema import LocationLevel, NodeCapacity, CampusTelemetry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Environment configuration
+REGION_ID = os.getenv("REGION_ID", "REGION_WESTERN")
+CONFIG_PATH = os.getenv("LAYER3_CONFIG", "/config/layer3_config.yaml")
+PORT = int(os.getenv("PORT", "8200"))
+
+# FastAPI app
+app = FastAPI(title="Regional Aggregator", version="1.0.0")
+
+
+# Request models
+class CampusRegistration(BaseModel):
+    """Campus registration from a Layer 2 campus controller"""
+    campus_id: str
+    name: str
+    city_id: str
+    state_id: str
+    country_id: str
+    location: Optional[Dict[str, float]] = None
+    capacity_kwh: float = 0.0
+    max_power_kw: float = 0.0
+    num_nodes: int = 0
+
+
+class CampusReport(BaseModel):
+    """Periodic campus telemetry push"""
+    telemetry: CampusTelemetry
+    capacity: Optional[NodeCapacity] = None
+
+
+def load_regional_config(path: str) -> Dict[str, Any]:
+    """Read the regional_aggregation section (empty if the file is missing)"""
+    try:
+        with open(path) as f:
+            return (yaml.safe_load(f) or {}).get("regional_aggregation", {})
+    except FileNotFoundError:
+        logger.warning(f"Config not found at {path}, grid regions disabled")
+        return {}
+
+
+tree = RegionalAggregationTree.from_config(load_regional_config(CONFIG_PATH))
+
+
+def _level(level: str) -> LocationLevel:
+    try:
+        return LocationLevel(level)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown level: {level}")
+
+
+@app.get("/health")
+async def health_check():
+    """Health check"""
+    return {
+        "status": "healthy",
+        "region_id": REGION_ID,
+        "num_campuses": len(tree.campuses),
+        "num_regions": len(tree.regions)
+    }
+
+
+@app.post("/api/campus/register")
+async def register_campus(registration: CampusRegistration):
+    """Register (or re-register) a campus in the hierarchy"""
+    tree.register_campus(
+        registration.campus_id,
+        registration.name,
+        registration.city_id,
+        registration.state_id,
+        registration.country_id,
+        rated_power_kw=registration.max_power_kw,
+        capacity_kwh=registration.capacity_kwh
+    )
+    logger.info(f"Registered campus {registration.campus_id} "
+                f"({registration.city_id}/{registration.state_id}/{registration.country_id})")
+    return {"status": "registered", "campus_id": registration.campus_id}
+
+
+@app.post("/api/campus/telemetry")
+async def campus_telemetry(report: CampusReport):
+    """Receive campus telemetry and update the regional rollups"""
+    try:
+        tree.update_campus(report.telemetry, report.capacity)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"status": "ok"}
+
+
+@app.delete("/api/campus/{campus_id}")
+async def remove_campus(campus_id: str):
+    """Remove a campus from all rollups"""
+    if campus_id not in tree.campuses:
+        raise HTTPException(status_code=404, detail="Campus not found")
+    tree.remove_campus(campus_id)
+    return {"status": "removed", "campus_id": campus_id}
+
+
+@app.get("/api/campus/{campus_id}/telemetry")
+async def get_campus_telemetry(campus_id: str):
+    """Latest telemetry reported by a campus"""
+    entry = tree.campuses.get(campus_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Campus not found")
+    return {
+        "campus_id": campus_id,
+        "name": entry.name,
+        "hierarchy": {level.value: region_id for level, region_id in entry.path},
+        "telemetry": entry.telemetry.dict() if entry.telemetry else None
+    }
+
+
+@app.get("/api/regions")
+async def list_regions(level: Optional[str] = None):
+    """List known cities, states, grid regions and countries"""
+    return {"regions": tree.list_regions(_level(level) if level else None)}
+
+
+@app.get("/api/regions/{level}/{region_id}/telemetry")
+async def get_regional_telemetry(level: str, region_id: str, include_campuses: bool = False):
+    """Aggregated telemetry for a city/state/region/country"""
+    try:
+        return tree.get_telemetry(_level(level), region_id, include_campuses).dict()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/api/regions/{level}/{region_id}/capacity")
+async def get_regional_capacity(level: str, region_id: str):
+    """Aggregate capacity of a city/state/region/country"""
+    try:
+        return tree.get_capacity(_level(level), region_id).dict()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
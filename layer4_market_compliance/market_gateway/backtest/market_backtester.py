@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Market Backtester
+Replays stored exchange prices and fleet availability to evaluate bidding
+strategies over months of history
+
+Each day a strategy bids against a price forecast (persistence or perfect
+foresight) at the portfolio's current SOC. Bids clear against the actual
+MCP; cleared volume is delivered by the online units pro rata to their
+headroom, and whatever the fleet cannot deliver is a deviation charged at
+a DSM penalty. Strategies carry a batch of S configurations (a parameter
+sweep) that are simulated together as (S, units) arrays; separate
+strategies run in parallel worker processes.
+
+Usage (from layer4_market_compliance/market_gateway/backtest):
+    python market_backtester.py --data-dir /data/market_prices --start 2025-01-01 --end 2026-01-01 \\
+        --units 100 --processes 4
+    python market_backtester.py --synthetic-days 365 --units 100
+"""
+
+import argparse
+import csv
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'iex_client'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'market_data'))
+from iex_api import MarketSegment
+from bid_optimizer import PortfolioLimits, PortfolioBidOptimizer
+from price_store import PriceStore, market_now, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PriceHistory:
+    """Clearing prices on a regular block grid covering whole market days"""
+    epochs: np.ndarray          # Block start (market wall-clock seconds, see price_store.to_epoch)
+    mcp: np.ndarray             # ₹/kWh, NaN where no price is stored
+    block_s: int
+
+    @property
+    def blocks_per_day(self) -> int:
+        return 86400 // self.block_s
+
+    @property
+    def days(self) -> int:
+        return len(self.mcp) // self.blocks_per_day
+
+    @classmethod
+    def from_store(cls, store: PriceStore, segment: MarketSegment, start: datetime, end: datetime) -> "PriceHistory":
+        """Whole market days from `start` up to (not including) `end`"""
+        start = datetime(start.year, start.month, start.day)
+        end = datetime(end.year, end.month, end.day)
+        epochs, mcp = store.get_range(segment, start, end)
+        return cls(epochs.astype(float), mcp, store.series[segment].block_s)
+
+
+@dataclass
+class FleetData:
+    """Units in the portfolio and their availability per block"""
+    unit_ids: List[str]
+    capacity_mwh: np.ndarray            # (units,)
+    power_mw: np.ndarray                # (units,)
+    availability: Optional[np.ndarray]  # (blocks, units) in [0, 1]; None = always online
+
+    @classmethod
+    def uniform(cls, count: int, capacity_mwh: float, power_mw: float) -> "FleetData":
+        return cls([f"UNIT_{i:03d}" for i in range(count)],
+                   np.full(count, capacity_mwh), np.full(count, power_mw), None)
+
+    @classmethod
+    def from_telemetry_csv(cls, path: str, epochs: np.ndarray) -> "FleetData":
+        """
+        Telemetry CSV (timestamp,unit_id,capacity_kwh,max_power_kw,online)
+        held onto the block grid. Timestamps are unix seconds or ISO 8601;
+        each unit's rating is its largest reported value.
+        """
+        rows: Dict[str, List[Tuple[float, float, float, float]]] = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                rows.setdefault(row["unit_id"], []).append((
+                    parse_timestamp(row["timestamp"]), float(row["capacity_kwh"]), float(row["max_power_kw"]), float(row["online"])
+                ))
+
+        unit_ids = sorted(rows)
+        availability = np.empty((len(epochs), len(unit_ids)))
+        capacity = np.empty(len(unit_ids))
+        power = np.empty(len(unit_ids))
+        for u, unit_id in enumerate(unit_ids):
+            data = np.array(sorted(rows[unit_id]))
+            capacity[u] = data[:, 1].max() / 1000.0
+            power[u] = data[:, 2].max() / 1000.0
+            held = np.searchsorted(data[:, 0], epochs, side="right")
+            availability[:, u] = np.concatenate(([0.0], data[:, 3]))[held]
+        return cls(unit_ids, capacity, power, availability)
+
+
+class ThresholdStrategy:
+    """
+    BiddingStrategy.calculate_threshold_bid vectorized over a sweep of
+    sell/buy thresholds: sell above `sell_above`, buy below `buy_below`,
+    at the day-start SOC, one block of rated power per bid
+    """
+
+    def __init__(self,
+                 sell_above: Sequence[float] = (5.0,),
+                 buy_below: Sequence[float] = (4.0,),
+                 min_soc_for_sell: float = 30.0,
+                 max_soc_for_buy: float = 80.0,
+                 sell_margin_rs: float = -0.20,
+                 buy_margin_rs: float = 0.20):
+        sell, buy = np.meshgrid(np.asarray(sell_above, dtype=float), np.asarray(buy_below, dtype=float),
+                                indexing="ij")
+        self.sell_above = sell.ravel()
+        self.buy_below = buy.ravel()
+        self.min_soc_for_sell = min_soc_for_sell
+        self.max_soc_for_buy = max_soc_for_buy
+        self.sell_margin_rs = sell_margin_rs
+        self.buy_margin_rs = buy_margin_rs
+
+    @property
+    def labels(self) -> List[str]:
+        return [f"sell>{s:g} buy<{b:g}" for s, b in zip(self.sell_above, self.buy_below)]
+
+    def plan(self, forecast: np.ndarray, soc: np.ndarray, available_mwh: np.ndarray,
+             limits: PortfolioLimits, block_hours: float) -> Tuple[np.ndarray, np.ndarray]:
+        block_mwh = limits.max_discharge_mw * block_hours
+        sell = (forecast[None, :] > self.sell_above[:, None]) & (soc[:, None] > self.min_soc_for_sell)
+        buy = ~sell & (forecast[None, :] < self.buy_below[:, None]) & (soc[:, None] < self.max_soc_for_buy)
+
+        sell_mwh = np.minimum(available_mwh, block_mwh)[:, None]
+        buy_mwh = np.minimum((100.0 - soc) / 100.0 * available_mwh, block_mwh)[:, None]
+        volume = np.where(sell, sell_mwh, 0.0) - np.where(buy, buy_mwh, 0.0)
+        price = forecast[None, :] + np.where(volume > 0, self.sell_margin_rs, self.buy_margin_rs)
+        return volume, price
+
+
+class OptimizerStrategy:
+    """PortfolioBidOptimizer, swept over degradation cost (₹/kWh discharged)"""
+
+    def __init__(self,
+                 cost_rs_per_kwh: Sequence[float] = (0.60,),
+                 soc_steps: int = 200,
+                 sell_margin_rs: float = -0.20,
+                 buy_margin_rs: float = 0.20):
+        self.cost_rs_per_kwh = list(cost_rs_per_kwh)
+        self.soc_steps = soc_steps
+        self.sell_margin_rs = sell_margin_rs
+        self.buy_margin_rs = buy_margin_rs
+        self._optimizers: List[PortfolioBidOptimizer] = []
+        self._limits: Optional[PortfolioLimits] = None
+
+    @property
+    def labels(self) -> List[str]:
+        return [f"dp cost={c:g}" for c in self.cost_rs_per_kwh]
+
+    def plan(self, forecast: np.ndarray, soc: np.ndarray, available_mwh: np.ndarray,
+             limits: PortfolioLimits, block_hours: float) -> Tuple[np.ndarray, np.ndarray]:
+        if limits != self._limits:
+            self._optimizers = [PortfolioBidOptimizer(replace(limits, cost_rs_per_kwh=c), self.soc_steps)
+                                for c in self.cost_rs_per_kwh]
+            self._limits = limits
+        volume = np.vstack([
+            optimizer.optimize(forecast, float(s), block_hours=block_hours).net_mwh
+            for optimizer, s in zip(self._optimizers, soc)
+        ])
+        price = forecast[None, :] + np.where(volume > 0, self.sell_margin_rs, self.buy_margin_rs)
+        return volume, price
+
+
+class PolicyStrategy:
+    """
+    Per-block policy rolled forward over the day's forecast, e.g. the ML
+    pipeline's RL bidding agent:
+
+        PolicyStrategy(lambda obs: rl_optimizer.predict(obs)[0], price_scale=30)
+
+    The policy sees GridBiddingEnv observations [soc, frequency, price,
+    demand, hour, day_of_week] and returns its action (1 = charge,
+    2 = discharge, anything else = idle). Prices are multiplied by
+    price_scale to match the scale the policy was trained on. Policies
+    that cannot be pickled need the fork start method (Linux default) or
+    processes=1.
+    """
+
+    def __init__(self,
+                 policy: Callable[[np.ndarray], int],
+                 price_scale: float = 1.0,
+                 name: str = "policy",
+                 sell_margin_rs: float = -0.20,
+                 buy_margin_rs: float = 0.20):
+        self.policy = policy
+        self.price_scale = price_scale
+        self.name = name
+        self.sell_margin_rs = sell_margin_rs
+        self.buy_margin_rs = buy_margin_rs
+
+    @property
+    def labels(self) -> List[str]:
+        return [self.name]
+
+    def plan(self, forecast: np.ndarray, soc: np.ndarray, available_mwh: np.ndarray,
+             limits: PortfolioLimits, block_hours: float) -> Tuple[np.ndarray, np.ndarray]:
+        eta = math.sqrt(limits.round_trip_efficiency)
+        block_mwh = limits.max_discharge_mw * block_hours
+        blocks_per_hour = int(round(1.0 / block_hours))
+        level = float(soc[0])
+
+        volume = np.zeros((1, len(forecast)))
+        for t, mcp in enumerate(forecast):
+            obs = np.array([level, 50.0, mcp * self.price_scale, 0.0, (t // blocks_per_hour) % 24, 0],
+                           dtype=np.float32)
+            action = int(self.policy(obs))
+            if action == 2 and level > limits.min_soc:
+                volume[0, t] = block_mwh
+                level -= block_mwh / eta / limits.energy_capacity_mwh * 100.0
+            elif action == 1 and level < limits.max_soc:
+                volume[0, t] = -block_mwh
+                level += block_mwh * eta / limits.energy_capacity_mwh * 100.0
+        price = forecast[None, :] + np.where(volume > 0, self.sell_margin_rs, self.buy_margin_rs)
+        return volume, price
+
+
+class MarketBacktester:
+    """Day-by-day bid, clear and deliver simulation of a strategy batch"""
+
+    def __init__(self,
+                 prices: PriceHistory,
+                 fleet: FleetData,
+                 min_soc: float = 30.0,
+                 max_soc: float = 80.0,
+                 round_trip_efficiency: float = 0.90,
+                 cost_rs_per_kwh: float = 0.60,
+                 dsm_penalty_factor: float = 1.2,
+                 initial_soc: float = 50.0,
+                 forecast: str = "persistence"):
+        """
+        Args:
+            prices: Actual clearing prices
+            fleet: Unit ratings and availability (availability rows must match prices)
+            min_soc, max_soc: Operating SOC band (%) for every unit
+            cost_rs_per_kwh: Degradation + operation cost per kWh discharged
+            dsm_penalty_factor: Undelivered energy is charged at MCP x this factor
+            forecast: "persistence" (previous day's prices) or "perfect"
+        """
+        if forecast not in ("persistence", "perfect"):
+            raise ValueError(f"Unknown forecast: {forecast}")
+        if fleet.availability is not None and len(fleet.availability) != len(prices.mcp):
+            raise ValueError("Fleet availability must have one row per price block")
+
+        self.prices = prices
+        self.fleet = fleet
+        self.min_soc = min_soc
+        self.max_soc = max_soc
+        self.eta = math.sqrt(round_trip_efficiency)
+        self.cost_rs_per_kwh = cost_rs_per_kwh
+        self.dsm_penalty_factor = dsm_penalty_factor
+        self.initial_soc = initial_soc
+        self.forecast_mode = forecast
+
+        self.limits = PortfolioLimits(
+            energy_capacity_mwh=float(fleet.capacity_mwh.sum()),
+            max_charge_mw=float(fleet.power_mw.sum()),
+            max_discharge_mw=float(fleet.power_mw.sum()),
+            min_soc=min_soc,
+            max_soc=max_soc,
+            round_trip_efficiency=round_trip_efficiency,
+            cost_rs_per_kwh=cost_rs_per_kwh
+        )
+
+        # Forecasts need a price in every block: fill gaps from the previous block
+        mcp = prices.mcp
+        valid = ~np.isnan(mcp)
+        filled_index = np.maximum.accumulate(np.where(valid, np.arange(len(mcp)), 0))
+        filled = mcp[filled_index]
+        filled[np.isnan(filled)] = np.nanmean(mcp) if valid.any() else 0.0
+        self._filled = filled
+        self._valid = valid
+
+    def forecast(self, day: int) -> np.ndarray:
+        n = self.prices.blocks_per_day
+        source = day - 1 if self.forecast_mode == "persistence" and day > 0 else day
+        return self._filled[source * n:(source + 1) * n]
+
+    def run(self, strategy) -> Dict[str, Any]:
+        """Simulate every configuration of the strategy; metrics per configuration"""
+        started = time.perf_counter()
+        fleet = self.fleet
+        n = self.prices.blocks_per_day
+        days = self.prices.days
+        block_hours = self.prices.block_s / 3600.0
+        configs = len(strategy.labels)
+        eta = self.eta
+
+        e_min = fleet.capacity_mwh * self.min_soc / 100.0
+        e_max = fleet.capacity_mwh * self.max_soc / 100.0
+        block_power = fleet.power_mw * block_hours
+
+        energy = np.tile(fleet.capacity_mwh * self.initial_soc / 100.0, (configs, 1))
+        cleared = np.zeros((configs, days * n))
+        delivered = np.zeros((configs, days * n))
+
+        for day in range(days):
+            # Bids are planned on the units online when they are made
+            online = np.ones(len(fleet.unit_ids)) if fleet.availability is None else fleet.availability[day * n]
+            online_mwh = float(fleet.capacity_mwh @ online)
+            if online_mwh <= 0:
+                continue
+            soc = energy @ online / online_mwh * 100.0
+            available = np.maximum(energy - e_min, 0.0) @ online * eta
+            limits = replace(self.limits, energy_capacity_mwh=online_mwh,
+                             max_charge_mw=float(fleet.power_mw @ online),
+                             max_discharge_mw=float(fleet.power_mw @ online))
+            volume, price = strategy.plan(self.forecast(day), soc, available, limits, block_hours)
+
+            span = slice(day * n, (day + 1) * n)
+            actual = self.prices.mcp[span]
+            clears = self._valid[span] & np.where(volume > 0, price <= actual, price >= actual)
+            day_cleared = np.where(clears, volume, 0.0)
+            cleared[:, span] = day_cleared
+
+            for k in range(n):
+                target = day_cleared[:, k]
+                if not target.any():
+                    continue
+                power = block_power if fleet.availability is None else block_power * fleet.availability[day * n + k]
+                sell = target > 0
+                headroom = np.where(sell[:, None],
+                                    np.minimum(power, (energy - e_min) * eta),
+                                    np.minimum(power, (e_max - energy) / eta))
+                headroom = np.maximum(headroom, 0.0)
+                total = headroom.sum(axis=1)
+                done = np.minimum(np.abs(target), total)
+                share = np.divide(done, total, out=np.zeros_like(done), where=total > 0)
+                unit_mwh = headroom * share[:, None]
+                energy -= np.where(sell[:, None], unit_mwh / eta, -unit_mwh * eta)
+                delivered[:, day * n + k] = np.sign(target) * done
+
+        return self._metrics(strategy.labels, cleared, delivered, energy, time.perf_counter() - started)
+
+    def _metrics(self, labels: List[str], cleared: np.ndarray, delivered: np.ndarray,
+                 energy: np.ndarray, elapsed_s: float) -> Dict[str, Any]:
+        blocks = cleared.shape[1]
+        mcp = np.where(self._valid, self.prices.mcp, 0.0)[:blocks]
+        shortfall = np.abs(cleared - delivered)
+
+        revenue = delivered * mcp * 1000.0
+        penalty = shortfall * mcp * 1000.0 * self.dsm_penalty_factor
+        cost = np.maximum(delivered, 0.0) * self.cost_rs_per_kwh * 1000.0
+        net = revenue - penalty - cost
+
+        months = self.prices.epochs[:blocks].astype("datetime64[s]").astype("datetime64[M]")
+        month_keys, month_index = np.unique(months, return_inverse=True)
+        monthly = np.stack([np.bincount(month_index, weights=row, minlength=len(month_keys)) for row in net])
+
+        capacity = float(self.fleet.capacity_mwh.sum())
+        end_soc = energy.sum(axis=1) / capacity * 100.0
+        results = {}
+        for s, label in enumerate(labels):
+            results[label] = {
+                "revenue_rs": float(revenue[s].sum()),
+                "penalty_rs": float(penalty[s].sum()),
+                "cost_rs": float(cost[s].sum()),
+                "net_rs": float(net[s].sum()),
+                "sold_mwh": float(np.maximum(delivered[s], 0.0).sum()),
+                "bought_mwh": float(-np.minimum(delivered[s], 0.0).sum()),
+                "undelivered_mwh": float(shortfall[s].sum()),
+                "cycles": float(np.maximum(delivered[s], 0.0).sum() / capacity),
+                "end_soc": float(end_soc[s]),
+                "monthly_net_rs": {str(m): float(v) for m, v in zip(month_keys, monthly[s])}
+            }
+        return {"configs": results, "days": blocks // self.prices.blocks_per_day, "elapsed_s": elapsed_s}
+
+
+# Worker state for run_sweep, handed over at pool start so strategies are
+# not pickled per task (with the fork start method they are not pickled at all)
+_backtester: Optional[MarketBacktester] = None
+_strategies: Dict[str, Any] = {}
+
+
+def _init_worker(backtester: MarketBacktester, strategies: Dict[str, Any]):
+    global _backtester, _strategies
+    _backtester = backtester
+    _strategies = strategies
+
+
+def _run_strategy(name: str) -> Tuple[str, Dict[str, Any]]:
+    return name, _backtester.run(_strategies[name])
+
+
+def run_sweep(backtester: MarketBacktester,
+              strategies: Dict[str, Any],
+              processes: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """Run each strategy (and its whole parameter batch) in a worker process"""
+    if processes == 1 or len(strategies) == 1:
+        return {name: backtester.run(strategy) for name, strategy in strategies.items()}
+    with multiprocessing.Pool(processes or min(len(strategies), os.cpu_count() or 1),
+                              initializer=_init_worker, initargs=(backtester, strategies)) as pool:
+        return dict(pool.map(_run_strategy, list(strategies)))
+
+
+def synthetic_store(days: int, seed: int, start: datetime) -> PriceStore:
+    """RTM price days shaped like SimulatedIEXClient's, for runs without stored history"""
+    from bid_benchmark import simulate_prices
+    store = PriceStore(history_days=None)
+    for prices in simulate_prices(MarketSegment.RTM, days, seed, start):
+        store.put(prices)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest bidding strategies on stored market prices")
+    parser.add_argument("--data-dir", help="PriceStore directory (from the market data service)")
+    parser.add_argument("--synthetic-days", type=int, default=0, help="Use simulated prices instead")
+    parser.add_argument("--segment", choices=["rtm", "dam"], default="rtm")
+    parser.add_argument("--start", default="2025-01-01")
+    parser.add_argument("--end", help="Exclusive end date (default: start + synthetic days)")
+    parser.add_argument("--telemetry", help="Fleet telemetry CSV (timestamp,unit_id,capacity_kwh,max_power_kw,online)")
+    parser.add_argument("--units", type=int, default=100, help="Uniform fleet size when no telemetry is given")
+    parser.add_argument("--unit-capacity-mwh", type=float, default=2.0)
+    parser.add_argument("--unit-power-mw", type=float, default=1.0)
+    parser.add_argument("--forecast", choices=["persistence", "perfect"], default="persistence")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start = datetime.fromisoformat(args.start)
+    segment = MarketSegment(args.segment)
+    if args.synthetic_days:
+        store = synthetic_store(args.synthetic_days, args.seed, start)
+        segment = MarketSegment.RTM
+        end = datetime.fromisoformat(args.end) if args.end else start + timedelta(days=args.synthetic_days)
+    elif args.data_dir:
+        store = PriceStore(args.data_dir, history_days=None)
+        end = datetime.fromisoformat(args.end) if args.end else market_now()
+    else:
+        parser.error("--data-dir or --synthetic-days is required")
+
+    prices = PriceHistory.from_store(store, segment, start, end)
+    fleet = (FleetData.from_telemetry_csv(args.telemetry, prices.epochs) if args.telemetry
+             else FleetData.uniform(args.units, args.unit_capacity_mwh, args.unit_power_mw))
+    backtester = MarketBacktester(prices, fleet, forecast=args.forecast)
+
+    strategies = {
+        "threshold": ThresholdStrategy(sell_above=(4.5, 5.0, 5.5), buy_below=(3.5, 4.0, 4.5)),
+        "optimizer": OptimizerStrategy(cost_rs_per_kwh=(0.3, 0.6, 1.0)),
+    }
+    logger.info(f"Backtesting {prices.days} days x {len(fleet.unit_ids)} units, "
+                f"{sum(len(s.labels) for s in strategies.values())} configurations")
+    started = time.perf_counter()
+    results = run_sweep(backtester, strategies, args.processes)
+    logger.info(f"Done in {time.perf_counter() - started:.1f} s")
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Bidding Strategy Benchmark
+Compares the portfolio optimizer with the per-block threshold strategy
+on seeded price days: revenue, undeliverable volume and runtime
+
+Both strategies' bids are executed against the same battery, carrying
+SOC from block to block and day to day; bids the battery cannot deliver
+are clipped and counted (they would become DSM deviations). Stored
+energy left over at the end is valued at the mean price. Note the
+threshold strategy sizes buys from the energy available to sell, so
+once the fleet reaches its minimum SOC it stops charging.
+
+Usage (from layer4_market_compliance/market_gateway/iex_client):
+    python bid_benchmark.py --days 30 --segment rtm --capacity-mwh 20 --power-mw 10
+"""
+
+import argparse
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from iex_api import BiddingStrategy, MarketPrice, MarketSegment, BidType, Bid
+from bid_optimizer import PortfolioLimits
+
+
+def simulate_prices(segment: MarketSegment, days: int, seed: int, start: datetime) -> List[List[MarketPrice]]:
+    """Price days shaped like SimulatedIEXClient's (₹3.5-6.5/kWh, peaks 10-12 and 18-22)"""
+    rng = np.random.default_rng(seed)
+    blocks = 96 if segment == MarketSegment.RTM else 24
+    step = timedelta(hours=24 / blocks)
+    hours = np.arange(blocks) * 24 / blocks
+    base = np.where(((hours >= 10) & (hours < 13)) | ((hours >= 18) & (hours < 23)), 5.5,
+                    np.where(hours < 7, 3.8, 4.5))
+    mcp = np.round(base + rng.uniform(-0.5, 0.5, (days, blocks)), 2)
+
+    return [
+        [MarketPrice(timestamp=start, segment=segment, delivery_period=start + timedelta(days=d) + i * step,
+                     mcp=float(mcp[d, i]), volume_cleared=0.0, buy_bids=0, sell_bids=0)
+         for i in range(blocks)]
+        for d in range(days)
+    ]
+
+
+class Battery:
+    """Executes bids block by block within the portfolio limits"""
+
+    def __init__(self, limits: PortfolioLimits, soc: float):
+        self.limits = limits
+        self.energy = limits.energy_capacity_mwh * soc / 100.0
+        self.eta = math.sqrt(limits.round_trip_efficiency)
+        self.revenue_rs = 0.0
+        self.cost_rs = 0.0
+        self.undelivered_mwh = 0.0
+
+    @property
+    def soc(self) -> float:
+        return self.energy / self.limits.energy_capacity_mwh * 100.0
+
+    def execute(self, bid: Bid, mcp: float, block_hours: float):
+        limits = self.limits
+        if bid.bid_type == BidType.SELL:
+            headroom = (self.energy - limits.energy_capacity_mwh * limits.min_soc / 100.0) * self.eta
+            volume = max(0.0, min(bid.volume_mwh, limits.max_discharge_mw * block_hours, headroom))
+            self.energy -= volume / self.eta
+            self.revenue_rs += volume * mcp * 1000.0
+            self.cost_rs += volume * limits.cost_rs_per_kwh * 1000.0
+        else:
+            headroom = (limits.energy_capacity_mwh * limits.max_soc / 100.0 - self.energy) / self.eta
+            volume = max(0.0, min(bid.volume_mwh, limits.max_charge_mw * block_hours, headroom))
+            self.energy += volume * self.eta
+            self.revenue_rs -= volume * mcp * 1000.0
+        self.undelivered_mwh += bid.volume_mwh - volume
+
+
+def run(strategy: BiddingStrategy, method: str, days: List[List[MarketPrice]], soc: float) -> Dict[str, float]:
+    limits = strategy.limits
+    battery = Battery(limits, soc)
+    block_hours = 0.25 if days[0][0].segment == MarketSegment.RTM else 1.0
+    solve_s = 0.0
+    bid_count = 0
+
+    for prices in days:
+        available = (battery.energy - limits.energy_capacity_mwh * limits.min_soc / 100.0) * battery.eta
+        started = time.perf_counter()
+        bids = getattr(strategy, method)(prices, battery.soc, max(available, 0.0))
+        solve_s += time.perf_counter() - started
+        bid_count += len(bids)
+
+        by_period = {bid.delivery_period: bid for bid in bids}
+        for price in prices:
+            bid = by_period.get(price.delivery_period)
+            if bid is not None:
+                battery.execute(bid, price.mcp, block_hours)
+
+    mean_price = float(np.mean([p.mcp for prices in days for p in prices]))
+    inventory_rs = (battery.soc - soc) / 100.0 * limits.energy_capacity_mwh * battery.eta * mean_price * 1000.0
+    return {
+        "revenue_rs": battery.revenue_rs,
+        "cost_rs": battery.cost_rs,
+        "inventory_rs": inventory_rs,
+        "net_rs": battery.revenue_rs - battery.cost_rs + inventory_rs,
+        "undelivered_mwh": battery.undelivered_mwh,
+        "bids": bid_count,
+        "ms_per_day": solve_s / len(days) * 1000.0,
+        "end_soc": battery.soc
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark portfolio optimizer vs threshold bidding")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--segment", choices=["rtm", "dam"], default="rtm")
+    parser.add_argument("--capacity-mwh", type=float, default=20.0)
+    parser.add_argument("--power-mw", type=float, default=10.0)
+    parser.add_argument("--soc", type=float, default=50.0, help="Initial SOC (%%)")
+    parser.add_argument("--soc-steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    limits = PortfolioLimits(args.capacity_mwh, args.power_mw, args.power_mw)
+    strategy = BiddingStrategy(args.power_mw, limits=limits, soc_steps=args.soc_steps)
+    days = simulate_prices(MarketSegment(args.segment), args.days, args.seed,
+                           datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+
+    results = {
+        "threshold": run(strategy, "calculate_threshold_bid", days, args.soc),
+        "optimizer": run(strategy, "calculate_optimal_bid", days, args.soc),
+    }
+
+    print(f"{args.days} {args.segment.upper()} days, {args.capacity_mwh:g} MWh / {args.power_mw:g} MW, "
+          f"start SOC {args.soc:g}%")
+    print(f"{'strategy':<10} {'revenue ₹':>12} {'cost ₹':>10} {'stored ₹':>10} {'net ₹':>12} "
+          f"{'undelivered':>12} {'bids':>6} {'ms/day':>8} {'end SOC':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['revenue_rs']:>12,.0f} {r['cost_rs']:>10,.0f} {r['inventory_rs']:>10,.0f} "
+              f"{r['net_rs']:>12,.0f} {r['undelivered_mwh']:>9.1f} MWh {r['bids']:>6} "
+              f"{r['ms_per_day']:>8.2f} {r['end_soc']:>7.1f}%")
+
+    baseline = results["threshold"]["net_rs"]
+    gain = results["optimizer"]["net_rs"] - baseline
+    print(f"Optimizer net gain: ₹{gain:,.0f}" + (f" ({gain / abs(baseline) * 100:+.0f}%)" if baseline else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Portfolio Bid Optimizer
+Multi-period arbitrage schedule for the whole VPP, solved by dynamic
+programming over a discretized state of charge
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Any
+
+import numpy as np
+
+
+@dataclass
+class PortfolioLimits:
+    """The VPP portfolio as one equivalent battery"""
+    energy_capacity_mwh: float
+    max_charge_mw: float
+    max_discharge_mw: float
+    min_soc: float = 30.0                   # % (layer4 soc_thresholds.min_soc_for_sell)
+    max_soc: float = 80.0                   # % (layer4 soc_thresholds.max_soc_for_buy)
+    round_trip_efficiency: float = 0.90
+    cost_rs_per_kwh: float = 0.60           # Degradation + operation, per kWh discharged
+
+    @classmethod
+    def combine(cls, portfolio: Sequence["PortfolioLimits"]) -> "PortfolioLimits":
+        """
+        Aggregate several sites: energy and power add; SOC band, efficiency
+        and cost are capacity-weighted
+        """
+        capacity = sum(p.energy_capacity_mwh for p in portfolio)
+        weights = [p.energy_capacity_mwh / capacity for p in portfolio]
+        return cls(
+            energy_capacity_mwh=capacity,
+            max_charge_mw=sum(p.max_charge_mw for p in portfolio),
+            max_discharge_mw=sum(p.max_discharge_mw for p in portfolio),
+            min_soc=sum(w * p.min_soc for w, p in zip(weights, portfolio)),
+            max_soc=sum(w * p.max_soc for w, p in zip(weights, portfolio)),
+            round_trip_efficiency=sum(w * p.round_trip_efficiency for w, p in zip(weights, portfolio)),
+            cost_rs_per_kwh=sum(w * p.cost_rs_per_kwh for w, p in zip(weights, portfolio))
+        )
+
+
+@dataclass
+class BidSchedule:
+    """Optimized trades per block; positive = sell (discharge), negative = buy (charge)"""
+    net_mwh: np.ndarray             # Energy traded at the grid per block
+    soc: np.ndarray                 # SOC (%) at each block boundary (len = blocks + 1)
+    revenue_rs: float               # Sales minus purchases at the given prices
+    cost_rs: float                  # Degradation/operation cost
+    solve_time_ms: float
+
+    @property
+    def net_revenue_rs(self) -> float:
+        return self.revenue_rs - self.cost_rs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "net_mwh": self.net_mwh.tolist(),
+            "soc": self.soc.tolist(),
+            "revenue_rs": self.revenue_rs,
+            "cost_rs": self.cost_rs,
+            "net_revenue_rs": self.net_revenue_rs,
+            "solve_time_ms": self.solve_time_ms
+        }
+
+
+class PortfolioBidOptimizer:
+    """
+    Maximizes revenue over a horizon of blocks subject to energy, power
+    and SOC limits and round-trip losses
+
+    Stored energy is discretized into `soc_steps` intervals across the
+    allowed SOC band. Moving from level i to level j in a block trades a
+    fixed grid energy that depends only on j - i, so every transition's
+    energy, cost and feasibility is precomputed once; each block of the
+    backward pass is then one (levels x levels) array add and argmax.
+    """
+
+    def __init__(self, limits: PortfolioLimits, soc_steps: int = 200):
+        self.limits = limits
+        self.soc_steps = soc_steps
+
+        self.e_min = limits.energy_capacity_mwh * limits.min_soc / 100.0
+        self.e_max = limits.energy_capacity_mwh * limits.max_soc / 100.0
+        self.levels = np.linspace(self.e_min, self.e_max, soc_steps + 1)
+        self._block_hours: Optional[float] = None
+
+    def _transitions(self, block_hours: float):
+        """Grid energy and cost (Rs) of each level transition; -inf cost where infeasible"""
+        if self._block_hours == block_hours:
+            return
+        limits = self.limits
+        eta = math.sqrt(limits.round_trip_efficiency)
+
+        # Change in stored energy for level i -> j
+        delta = self.levels[None, :] - self.levels[:, None]
+        grid_mwh = np.where(delta > 0, -delta / eta, -delta * eta)
+        feasible = (grid_mwh >= -limits.max_charge_mw * block_hours - 1e-9) & \
+                   (grid_mwh <= limits.max_discharge_mw * block_hours + 1e-9)
+
+        self.grid_kwh = grid_mwh * 1000.0
+        self.fixed_rs = np.where(feasible, -limits.cost_rs_per_kwh * np.maximum(self.grid_kwh, 0.0), -np.inf)
+        self._block_hours = block_hours
+
+    def level_of(self, soc: float) -> int:
+        energy = self.limits.energy_capacity_mwh * soc / 100.0
+        return int(np.abs(self.levels - energy).argmin())
+
+    def optimize(self,
+                 prices_rs_per_kwh: Sequence[float],
+                 soc: float,
+                 end_soc: Optional[float] = None,
+                 block_hours: float = 0.25) -> BidSchedule:
+        """
+        Best schedule for the given block prices
+
+        Args:
+            prices_rs_per_kwh: Expected clearing price per block
+            soc: SOC (%) at the start of the first block (clipped to the band)
+            end_soc: Minimum SOC (%) at the end of the horizon (default: the
+                starting SOC, so revenue is not earned by draining the fleet)
+            block_hours: Block length (0.25 for RTM, 1.0 for DAM)
+
+        Raises:
+            ValueError: If end_soc cannot be reached within the horizon
+        """
+        started = time.perf_counter()
+        prices = np.asarray(prices_rs_per_kwh, dtype=float)
+        self._transitions(block_hours)
+
+        start = self.level_of(soc)
+        end = self.level_of(soc if end_soc is None else end_soc)
+
+        blocks = len(prices)
+        value = np.where(np.arange(len(self.levels)) >= end, 0.0, -np.inf)
+        policy = np.empty((blocks, len(self.levels)), dtype=np.int32)
+        for t in range(blocks - 1, -1, -1):
+            q = prices[t] * self.grid_kwh + self.fixed_rs + value[None, :]
+            policy[t] = q.argmax(axis=1)
+            value = q[np.arange(len(self.levels)), policy[t]]
+        if not np.isfinite(value[start]):
+            raise ValueError(f"End SOC {end_soc}% is not reachable from {soc}% in {blocks} blocks")
+
+        path = np.empty(blocks + 1, dtype=np.int32)
+        path[0] = start
+        for t in range(blocks):
+            path[t + 1] = policy[t, path[t]]
+
+        traded_kwh = self.grid_kwh[path[:-1], path[1:]]
+        revenue = float(np.dot(prices, traded_kwh))
+        cost = float(self.limits.cost_rs_per_kwh * np.maximum(traded_kwh, 0.0).sum())
+
+        return BidSchedule(
+            net_mwh=traded_kwh / 1000.0,
+            soc=self.levels[path] / self.limits.energy_capacity_mwh * 100.0,
+            revenue_rs=revenue,
+            cost_rs=cost,
+            solve_time_ms=(time.perf_counter() - started) * 1000.0
+        )
@@ -3,13 +3,20 @@ Indian Energy Exchange (IEX) API Client
 Integrates with IEX for power trading and market participation
 """
 
+import asyncio
+import hashlib
+import json
 import logging
+import random
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
 import httpx
 
+from rate_limiter import TokenBucket
+from bid_optimizer import PortfolioLimits, PortfolioBidOptimizer, BidSchedule
+
 logger = logging.getLogger(__name__)
 
 
@@ -63,26 +70,120 @@ class BidResult:
     revenue_or_cost_rs: float
 
 
+class IEXAPIError(Exception):
+    """Exchange request failed (after retries, or with a non-retryable status)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class BidSubmission:
+    """Outcome of submitting one bid"""
+    client_bid_id: str        # Bid.bid_id as sent
+    bid_id: Optional[str]     # Exchange bid ID (None if not accepted for clearing)
+    status: str               # pending, rejected, error
+    error: Optional[str] = None
+
+
+FINAL_BID_STATUSES = {"accepted", "rejected", "partially_filled"}
+
+
+def price_to_dict(price: MarketPrice) -> Dict[str, Any]:
+    """JSON form of a clearing price, as served by the exchange"""
+    return {
+        "timestamp": price.timestamp.isoformat(),
+        "segment": price.segment.value,
+        "delivery_period": price.delivery_period.isoformat(),
+        "mcp": price.mcp,
+        "volume_cleared": price.volume_cleared,
+        "buy_bids": price.buy_bids,
+        "sell_bids": price.sell_bids
+    }
+
+
+def bid_to_dict(bid: Bid) -> Dict[str, Any]:
+    """JSON body for a bid"""
+    return {
+        "bid_id": bid.bid_id,
+        "participant_id": bid.participant_id,
+        "segment": bid.segment.value,
+        "bid_type": bid.bid_type.value,
+        "delivery_period": bid.delivery_period.isoformat(),
+        "volume_mwh": bid.volume_mwh,
+        "price_rs_per_kwh": bid.price_rs_per_kwh
+    }
+
+
+def bid_idempotency_key(bids: List[Bid]) -> str:
+    """
+    Stable key for a submission, so a retried request is not booked twice
+
+    Bid IDs repeat per delivery block, so the key covers the full payload:
+    a re-bid with a new volume or price gets a new key and is booked.
+    """
+    payloads = "\n".join(sorted(json.dumps(bid_to_dict(bid), sort_keys=True) for bid in bids))
+    return hashlib.sha256(payloads.encode()).hexdigest()[:32]
+
+
 class IEXClient:
     """
     IEX API client for power trading
 
-    Note: This is a simplified implementation.
-    In production, you would use the official IEX API with proper authentication
+    - One pooled HTTP/1.1 keep-alive connection pool per client
+    - Requests are paced by a token bucket matched to the exchange's
+      rate limit; a 429 pauses all requests for its Retry-After
+    - 429, 5xx and transport errors are retried with exponential backoff
+      and jitter; every POST carries an Idempotency-Key derived from the
+      bid IDs, so a retry after a lost response is not booked twice
+    - Bulk submission and status polling batch bids per request and run
+      the batches concurrently
     """
 
-    def __init__(self, api_key: str, api_url: str = "https://api.iexindia.com"):
+    def __init__(self,
+                 api_key: str,
+                 api_url: str = "https://api.iexindia.com",
+                 requests_per_second: float = 10.0,
+                 burst: int = 20,
+                 max_connections: int = 20,
+                 max_batch_size: int = 100,
+                 max_retries: int = 4,
+                 backoff_s: float = 0.5,
+                 timeout_s: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         """
         Initialize IEX client
 
         Args:
             api_key: IEX API key
             api_url: IEX API base URL
+            requests_per_second: Sustained request rate allowed by the exchange
+            burst: Requests that may be sent back to back
+            max_connections: Connection pool size
+            max_batch_size: Bids per bulk submission / status request
+            max_retries: Retries per request
+            backoff_s: First retry delay (doubles per retry)
+            timeout_s: Per-request timeout
+            transport: Custom transport (e.g. httpx.ASGITransport for the mock exchange)
         """
         self.api_key = api_key
         self.api_url = api_url
+        self.max_connections = max_connections
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.transport = transport
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
         self.session: Optional[httpx.AsyncClient] = None
 
+        # Statistics
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
     async def connect(self):
         """Establish API session"""
         self.session = httpx.AsyncClient(
@@ -91,7 +192,10 @@ class IEXClient:
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
             },
-            timeout=30.0
+            timeout=self.timeout_s,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            transport=self.transport
         )
         logger.info("Connected to IEX API")
 
@@ -99,8 +203,59 @@ class IEXClient:
         """Close API session"""
         if self.session:
             await self.session.aclose()
+            self.session = None
             logger.info("Disconnected from IEX API")
 
+    async def _request(self,
+                       method: str,
+                       path: str,
+                       json: Optional[Any] = None,
+                       params: Optional[Dict[str, Any]] = None,
+                       idempotency_key: Optional[str] = None) -> Any:
+        """Rate-limited request with retries; returns the decoded JSON body"""
+        if not self.session:
+            raise ConnectionError("Not connected to IEX API")
+
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        error: Exception = IEXAPIError(f"{method} {path} failed")
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            self.requests += 1
+            retry_after: Optional[float] = None
+
+            try:
+                response = await self.session.request(method, path, json=json, params=params, headers=headers)
+            except httpx.TransportError as e:
+                error = IEXAPIError(f"{method} {path}: {e!r}")
+            else:
+                if response.status_code < 400:
+                    return response.json()
+
+                error = IEXAPIError(f"{method} {path}: HTTP {response.status_code} {response.text[:200]}",
+                                    response.status_code)
+                if response.status_code != 429 and response.status_code < 500:
+                    self.failures += 1
+                    raise error
+
+                try:
+                    retry_after = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    retry_after = None
+                if response.status_code == 429:
+                    self.throttled += 1
+                    self.rate_limiter.pause(retry_after if retry_after is not None else self.backoff_s)
+
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            if retry_after is None:
+                retry_after = self.backoff_s * 2 ** attempt * random.uniform(0.5, 1.0)
+            await asyncio.sleep(retry_after)
+
+        self.failures += 1
+        raise error
+
     async def get_market_prices(
         self,
         segment: MarketSegment,
@@ -116,14 +271,21 @@ class IEXClient:
         Returns:
             List of market prices for each time block
         """
-        if not self.session:
-            raise ConnectionError("Not connected to IEX API")
-
         date = date or datetime.now()
-
-        # In production, call real API
-        # For simulation, return mock data
-        return self._simulate_market_prices(segment, date)
+        data = await self._request("GET", f"/markets/{segment.value}/prices",
+                                   params={"date": date.strftime("%Y-%m-%d")})
+        return [
+            MarketPrice(
+                timestamp=datetime.fromisoformat(p["timestamp"]),
+                segment=MarketSegment(p["segment"]),
+                delivery_period=datetime.fromisoformat(p["delivery_period"]),
+                mcp=p["mcp"],
+                volume_cleared=p["volume_cleared"],
+                buy_bids=p["buy_bids"],
+                sell_bids=p["sell_bids"]
+            )
+            for p in data["prices"]
+        ]
 
     async def submit_bid(self, bid: Bid) -> str:
         """
@@ -135,19 +297,45 @@ class IEXClient:
         Returns:
             Bid ID
         """
-        if not self.session:
-            raise ConnectionError("Not connected to IEX API")
+        data = await self._request("POST", "/bids", json=bid_to_dict(bid),
+                                   idempotency_key=bid_idempotency_key([bid]))
+        bid.status = data.get("status", "pending")
+        return data["bid_id"]
+
+    async def _submit_batch(self, bids: List[Bid]) -> List[BidSubmission]:
+        try:
+            data = await self._request("POST", "/bids/batch",
+                                       json={"bids": [bid_to_dict(bid) for bid in bids]},
+                                       idempotency_key=bid_idempotency_key(bids))
+        except IEXAPIError as e:
+            return [BidSubmission(bid.bid_id, None, "error", str(e)) for bid in bids]
+
+        by_client_id = {r["client_bid_id"]: r for r in data["results"]}
+        results = []
+        for bid in bids:
+            r = by_client_id.get(bid.bid_id, {"status": "error", "error": "Missing from exchange response"})
+            results.append(BidSubmission(bid.bid_id, r.get("bid_id"), r["status"], r.get("error")))
+        return results
+
+    async def submit_bids(self, bids: List[Bid]) -> List[BidSubmission]:
+        """
+        Submit many bids (e.g. 96 RTM blocks x portfolio) concurrently
 
-        # In production:
-        # response = await self.session.post("/bids", json=bid.dict())
-        # return response.json()["bid_id"]
+        Bids go out in batches of max_batch_size; batches run in parallel
+        within the rate limit. A batch that still fails after retries
+        marks its bids as "error" without affecting the others.
 
-        # For simulation:
-        logger.info(
-            f"[SIMULATED] Bid submitted: {bid.bid_type.value} "
-            f"{bid.volume_mwh:.2f} MWh @ ₹{bid.price_rs_per_kwh:.2f}/kWh"
-        )
-        return f"BID_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        Returns:
+            One BidSubmission per bid, in input order
+        """
+        batches = [bids[i:i + self.max_batch_size] for i in range(0, len(bids), self.max_batch_size)]
+        results = [r for batch in await asyncio.gather(*(self._submit_batch(b) for b in batches)) for r in batch]
+
+        for bid, result in zip(bids, results):
+            bid.status = result.status
+        failed = sum(1 for r in results if r.status == "error")
+        logger.info(f"Submitted {len(bids)} bids in {len(batches)} batch(es), {failed} failed")
+        return results
 
     async def get_bid_status(self, bid_id: str) -> BidResult:
         """
@@ -159,15 +347,53 @@ class IEXClient:
         Returns:
             Bid result
         """
-        if not self.session:
-            raise ConnectionError("Not connected to IEX API")
+        return BidResult(**await self._request("GET", f"/bids/{bid_id}"))
 
-        # In production:
-        # response = await self.session.get(f"/bids/{bid_id}")
-        # return BidResult(**response.json())
+    async def _status_batch(self, bid_ids: List[str]) -> Dict[str, BidResult]:
+        try:
+            data = await self._request("GET", "/bids", params={"ids": ",".join(bid_ids)})
+        except IEXAPIError as e:
+            logger.warning(f"Status query for {len(bid_ids)} bid(s) failed: {e}")
+            return {}
+        return {r["bid_id"]: BidResult(**r) for r in data["results"]}
 
-        # For simulation:
-        return self._simulate_bid_result(bid_id)
+    async def get_bid_statuses(self, bid_ids: List[str]) -> Dict[str, BidResult]:
+        """
+        Status of many bids, batched and fetched concurrently
+
+        A batch that still fails after retries is left out of the result
+        (its bids stay pending for poll_bid_statuses) without affecting the others.
+        """
+        batches = [bid_ids[i:i + self.max_batch_size] for i in range(0, len(bid_ids), self.max_batch_size)]
+        results: Dict[str, BidResult] = {}
+        for batch in await asyncio.gather(*(self._status_batch(b) for b in batches)):
+            results.update(batch)
+        return results
+
+    async def poll_bid_statuses(self,
+                                bid_ids: List[str],
+                                interval_s: float = 5.0,
+                                timeout_s: float = 300.0) -> Dict[str, BidResult]:
+        """
+        Poll until every bid has cleared or been rejected (or timeout)
+
+        Only bids still pending are re-queried each round.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        results: Dict[str, BidResult] = {}
+        pending = list(bid_ids)
+
+        while pending:
+            results.update(await self.get_bid_statuses(pending))
+            pending = [b for b in pending if b not in results or results[b].status not in FINAL_BID_STATUSES]
+            if not pending or loop.time() + interval_s > deadline:
+                break
+            await asyncio.sleep(interval_s)
+
+        if pending:
+            logger.warning(f"{len(pending)} bid(s) still pending after {timeout_s:.0f} s")
+        return results
 
     async def get_my_portfolio(self) -> Dict[str, Any]:
         """
@@ -176,17 +402,15 @@ class IEXClient:
         Returns:
             Portfolio summary
         """
-        if not self.session:
-            raise ConnectionError("Not connected to IEX API")
+        return await self._request("GET", "/portfolio")
 
-        # Simulated portfolio
+    def get_stats(self) -> Dict[str, Any]:
+        """Request, retry and throttling counters"""
         return {
-            "participant_id": "VPP_VUSIO",
-            "pending_bids": 5,
-            "cleared_bids": 120,
-            "total_volume_traded_mwh": 1250.5,
-            "total_revenue_rs": 5620000.0,
-            "average_clearing_price": 4.49
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures
         }
 
     def _simulate_market_prices(
@@ -259,10 +483,48 @@ class IEXClient:
 class BiddingStrategy:
     """
     Automated bidding strategy for VPP
+
+    Plans the whole trading session at once: the portfolio's SOC
+    trajectory across all blocks is optimized against the price forecast
+    (PortfolioBidOptimizer), then each block's trade becomes a bid priced
+    just inside the forecast MCP.
     """
 
-    def __init__(self, vpp_capacity_mw: float):
+    def __init__(self,
+                 vpp_capacity_mw: float,
+                 limits: Optional[PortfolioLimits] = None,
+                 participant_id: str = "VPP_VUSIO",
+                 sell_margin_rs: float = -0.20,
+                 buy_margin_rs: float = 0.20,
+                 min_bid_volume_mwh: float = 0.01,
+                 soc_steps: int = 200):
+        """
+        Args:
+            vpp_capacity_mw: Portfolio power rating (charge and discharge)
+            limits: Portfolio energy/power/SOC limits; if omitted the energy
+                capacity is inferred from each call's SOC and available energy
+            sell_margin_rs, buy_margin_rs: Bid price offset from forecast MCP
+            min_bid_volume_mwh: Smaller trades are not bid
+        """
         self.vpp_capacity_mw = vpp_capacity_mw
+        self.limits = limits
+        self.participant_id = participant_id
+        self.sell_margin_rs = sell_margin_rs
+        self.buy_margin_rs = buy_margin_rs
+        self.min_bid_volume_mwh = min_bid_volume_mwh
+        self.soc_steps = soc_steps
+        self._optimizer: Optional[PortfolioBidOptimizer] = None
+        self.last_schedule: Optional[BidSchedule] = None
+
+    def _get_optimizer(self, soc: float, available_energy_mwh: float) -> PortfolioBidOptimizer:
+        limits = self.limits or PortfolioLimits(
+            energy_capacity_mwh=available_energy_mwh * 100.0 / max(soc, 1.0),
+            max_charge_mw=self.vpp_capacity_mw,
+            max_discharge_mw=self.vpp_capacity_mw
+        )
+        if self._optimizer is None or self._optimizer.limits != limits:
+            self._optimizer = PortfolioBidOptimizer(limits, self.soc_steps)
+        return self._optimizer
 
     def calculate_optimal_bid(
         self,
@@ -274,13 +536,54 @@ class BiddingStrategy:
         Calculate optimal bids for next trading session
 
         Args:
-            forecast_prices: Forecasted market prices
+            forecast_prices: Forecasted market prices, one per block in delivery order
             soc: Current state of charge (%)
             available_energy_mwh: Available energy for discharge (MWh)
 
         Returns:
             List of optimal bids
         """
+        if not forecast_prices:
+            return []
+
+        segment = forecast_prices[0].segment
+        block_hours = 0.25 if segment == MarketSegment.RTM else 1.0
+        optimizer = self._get_optimizer(soc, available_energy_mwh)
+        schedule = optimizer.optimize([p.mcp for p in forecast_prices], soc, block_hours=block_hours)
+        self.last_schedule = schedule
+
+        bids = []
+        for price_data, volume in zip(forecast_prices, schedule.net_mwh):
+            if abs(volume) < self.min_bid_volume_mwh:
+                continue
+            sell = volume > 0
+            bid_type = BidType.SELL if sell else BidType.BUY
+            bids.append(Bid(
+                bid_id=f"{bid_type.name}_{price_data.delivery_period.strftime('%Y%m%d%H%M')}",
+                participant_id=self.participant_id,
+                segment=segment,
+                bid_type=bid_type,
+                delivery_period=price_data.delivery_period,
+                volume_mwh=float(abs(volume)),
+                price_rs_per_kwh=round(price_data.mcp + (self.sell_margin_rs if sell else self.buy_margin_rs), 2)
+            ))
+
+        logger.info(
+            f"Generated {len(bids)} bids for next trading session "
+            f"(expected net revenue ₹{schedule.net_revenue_rs:,.0f}, solved in {schedule.solve_time_ms:.1f} ms)"
+        )
+        return bids
+
+    def calculate_threshold_bid(
+        self,
+        forecast_prices: List[MarketPrice],
+        soc: float,
+        available_energy_mwh: float
+    ) -> List[Bid]:
+        """
+        Per-block threshold heuristic (sell above ₹5, buy below ₹4 at a
+        fixed SOC); the previous strategy, kept as a benchmark baseline
+        """
         bids = []
 
         for price_data in forecast_prices:
@@ -292,7 +595,7 @@ class BiddingStrategy:
 
                 bid = Bid(
                     bid_id=f"SELL_{price_data.delivery_period.strftime('%Y%m%d%H%M')}",
-                    participant_id="VPP_VUSIO",
+                    participant_id=self.participant_id,
                     segment=MarketSegment.DAM,
                     bid_type=BidType.SELL,
                     delivery_period=price_data.delivery_period,
@@ -310,7 +613,7 @@ class BiddingStrategy:
 
                 bid = Bid(
                     bid_id=f"BUY_{price_data.delivery_period.strftime('%Y%m%d%H%M')}",
-                    participant_id="VPP_VUSIO",
+                    participant_id=self.participant_id,
                     segment=MarketSegment.DAM,
                     bid_type=BidType.BUY,
                     delivery_period=price_data.delivery_period,
@@ -319,7 +622,6 @@ class BiddingStrategy:
                 )
                 bids.append(bid)
 
-        logger.info(f"Generated {len(bids)} bids for next trading session")
         return bids
 
 
@@ -351,5 +653,21 @@ class SimulatedIEXClient(IEXClient):
         )
         return bid_id
 
+    async def submit_bids(self, bids: List[Bid]) -> List[BidSubmission]:
+        return [BidSubmission(bid.bid_id, await self.submit_bid(bid), "pending") for bid in bids]
+
     async def get_bid_status(self, bid_id: str) -> BidResult:
         return self._simulate_bid_result(bid_id)
+
+    async def get_bid_statuses(self, bid_ids: List[str]) -> Dict[str, BidResult]:
+        return {bid_id: self._simulate_bid_result(bid_id) for bid_id in bid_ids}
+
+    async def get_my_portfolio(self) -> Dict[str, Any]:
+        return {
+            "participant_id": "VPP_VUSIO",
+            "pending_bids": 5,
+            "cleared_bids": 120,
+            "total_volume_traded_mwh": 1250.5,
+            "total_revenue_rs": 5620000.0,
+            "average_clearing_price": 4.49
+        }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Mock IEX Exchange
+Local stand-in for the IEX trading API, for tests and load tests
+
+Enforces a per-API-key rate limit (429 + Retry-After), honours
+Idempotency-Key, and can inject failures: errors before a request is
+processed and "lost responses" after it is (the retry must not book the
+bid twice). Bids clear after a delay with seeded outcomes.
+
+Usage (from layer4_market_compliance/market_gateway/iex_client):
+    python mock_exchange.py --port 8400 --rps 10 --lost-response-rate 0.05
+
+In tests, skip the network:
+    exchange = MockExchange(seed=1)
+    client = IEXClient("key", "http://mock", transport=httpx.ASGITransport(app=create_app(exchange)))
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from iex_api import MarketSegment, BidType
+from rate_limiter import TokenBucket
+
+
+class BidRequest(BaseModel):
+    """Bid as submitted by a participant"""
+    bid_id: str
+    participant_id: str
+    segment: MarketSegment
+    bid_type: BidType
+    delivery_period: datetime
+    volume_mwh: float
+    price_rs_per_kwh: float
+
+
+class BatchRequest(BaseModel):
+    bids: List[BidRequest]
+
+
+class MockExchange:
+    """Order book, idempotency store, rate limiters and failure injection"""
+
+    def __init__(self,
+                 requests_per_second: float = 10.0,
+                 burst: int = 20,
+                 max_batch_size: int = 100,
+                 clear_delay_s: float = 1.0,
+                 latency_s: float = 0.0,
+                 error_rate: float = 0.0,
+                 lost_response_rate: float = 0.0,
+                 acceptance_rate: float = 0.8,
+                 seed: int = 0):
+        """
+        Args:
+            requests_per_second, burst: Rate limit per API key
+            max_batch_size: Largest accepted batch
+            clear_delay_s: Time until a submitted bid has a final status
+            latency_s: Added processing time per request
+            error_rate: Share of requests answered 503 without processing
+            lost_response_rate: Share of requests processed but answered 503
+            acceptance_rate: Share of bids that clear
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_batch_size = max_batch_size
+        self.clear_delay_s = clear_delay_s
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.lost_response_rate = lost_response_rate
+        self.acceptance_rate = acceptance_rate
+        self.rng = random.Random(seed)
+
+        self.bids: Dict[str, Dict[str, Any]] = {}
+        self.by_client_id: Dict[Tuple[str, str], str] = {}
+        self.idempotent: Dict[Tuple[str, str], Tuple[int, Any]] = {}
+        self.limiters: Dict[str, TokenBucket] = {}
+        self._next_id = 0
+
+        self.stats = {"requests": 0, "throttled": 0, "injected_errors": 0,
+                      "lost_responses": 0, "idempotent_replays": 0, "bids": 0}
+
+    def throttle(self, api_key: str) -> Optional[float]:
+        """None if the request may proceed, else seconds to wait"""
+        limiter = self.limiters.setdefault(api_key, TokenBucket(self.requests_per_second, self.burst))
+        wait = limiter.try_acquire()
+        return wait if wait > 0 else None
+
+    def _book(self, bid: BidRequest) -> Dict[str, Any]:
+        """Book a bid once per (participant, client bid id)"""
+        key = (bid.participant_id, bid.bid_id)
+        if key in self.by_client_id:
+            return {"client_bid_id": bid.bid_id, "bid_id": self.by_client_id[key], "status": "pending"}
+        if bid.volume_mwh <= 0 or bid.price_rs_per_kwh <= 0:
+            return {"client_bid_id": bid.bid_id, "bid_id": None, "status": "rejected",
+                    "error": "Volume and price must be positive"}
+
+        self._next_id += 1
+        bid_id = f"IEX{self._next_id:09d}"
+        accepted = self.rng.random() < self.acceptance_rate
+        fill = self.rng.uniform(0.8, 1.0) if accepted else 0.0
+        cleared_price = round(bid.price_rs_per_kwh + self.rng.uniform(-0.1, 0.1), 2) if accepted else 0.0
+
+        self.bids[bid_id] = {
+            "request": bid,
+            "clears_at": time.monotonic() + self.clear_delay_s,
+            "status": ("partially_filled" if fill < 0.95 else "accepted") if accepted else "rejected",
+            "cleared_volume_mwh": bid.volume_mwh * fill,
+            "cleared_price_rs_per_kwh": cleared_price
+        }
+        self.by_client_id[key] = bid_id
+        self.stats["bids"] += 1
+        return {"client_bid_id": bid.bid_id, "bid_id": bid_id, "status": "pending"}
+
+    def bid_result(self, bid_id: str) -> Dict[str, Any]:
+        entry = self.bids[bid_id]
+        if time.monotonic() < entry["clears_at"]:
+            return {"bid_id": bid_id, "status": "pending", "cleared_volume_mwh": 0.0,
+                    "cleared_price_rs_per_kwh": 0.0, "revenue_or_cost_rs": 0.0}
+        volume = entry["cleared_volume_mwh"]
+        price = entry["cleared_price_rs_per_kwh"]
+        return {
+            "bid_id": bid_id,
+            "status": entry["status"],
+            "cleared_volume_mwh": volume,
+            "cleared_price_rs_per_kwh": price,
+            "revenue_or_cost_rs": volume * price * 1000.0
+        }
+
+    def market_prices(self, segment: MarketSegment, date: datetime) -> List[Dict[str, Any]]:
+        """Deterministic per (segment, date) price curve"""
+        rng = random.Random(f"{segment.value}:{date.date().isoformat()}")
+        num_blocks = 96 if segment == MarketSegment.RTM else 24
+        step = timedelta(minutes=15) if segment == MarketSegment.RTM else timedelta(hours=1)
+        start = datetime(date.year, date.month, date.day)
+        prices = []
+        for i in range(num_blocks):
+            delivery = start + i * step
+            hour = delivery.hour
+            base = 5.5 if (10 <= hour <= 12 or 18 <= hour <= 22) else 3.8 if hour <= 6 else 4.5
+            prices.append({
+                "timestamp": datetime.now().isoformat(),
+                "segment": segment.value,
+                "delivery_period": delivery.isoformat(),
+                "mcp": round(base + rng.uniform(-0.5, 0.5), 2),
+                "volume_cleared": rng.uniform(100, 500),
+                "buy_bids": rng.randint(20, 50),
+                "sell_bids": rng.randint(15, 45)
+            })
+        return prices
+
+
+def create_app(exchange: Optional[MockExchange] = None) -> FastAPI:
+    exchange = exchange or MockExchange()
+    app = FastAPI(title="Mock IEX Exchange", version="1.0.0")
+    app.state.exchange = exchange
+
+    @app.middleware("http")
+    async def gate(request: Request, call_next):
+        exchange.stats["requests"] += 1
+        api_key = request.headers.get("Authorization", "")
+        wait = exchange.throttle(api_key)
+        if wait is not None:
+            exchange.stats["throttled"] += 1
+            return JSONResponse({"detail": "Rate limit exceeded"}, status_code=429,
+                                headers={"Retry-After": f"{wait:.3f}"})
+        if exchange.latency_s:
+            await asyncio.sleep(exchange.latency_s)
+        if exchange.error_rate and exchange.rng.random() < exchange.error_rate:
+            exchange.stats["injected_errors"] += 1
+            return JSONResponse({"detail": "Service unavailable"}, status_code=503)
+
+        response = await call_next(request)
+        if (request.method == "POST" and response.status_code < 400
+                and exchange.lost_response_rate and exchange.rng.random() < exchange.lost_response_rate):
+            exchange.stats["lost_responses"] += 1
+            return JSONResponse({"detail": "Gateway timeout"}, status_code=503)
+        return response
+
+    def idempotent(api_key: str, key: Optional[str], handler):
+        if key is None:
+            return handler()
+        store_key = (api_key, key)
+        if store_key in exchange.idempotent:
+            exchange.stats["idempotent_replays"] += 1
+            return exchange.idempotent[store_key]
+        result = handler()
+        exchange.idempotent[store_key] = result
+        return result
+
+    @app.get("/markets/{segment}/prices")
+    async def get_prices(segment: MarketSegment, date: str = Query(...)):
+        return {"prices": exchange.market_prices(segment, datetime.strptime(date, "%Y-%m-%d"))}
+
+    @app.post("/bids")
+    async def submit_bid(bid: BidRequest,
+                         authorization: str = Header(""),
+                         idempotency_key: Optional[str] = Header(None)):
+        return idempotent(authorization, idempotency_key, lambda: exchange._book(bid))
+
+    @app.post("/bids/batch")
+    async def submit_batch(batch: BatchRequest,
+                           authorization: str = Header(""),
+                           idempotency_key: Optional[str] = Header(None)):
+        if len(batch.bids) > exchange.max_batch_size:
+            raise HTTPException(status_code=413, detail=f"At most {exchange.max_batch_size} bids per batch")
+        return idempotent(authorization, idempotency_key,
+                          lambda: {"results": [exchange._book(bid) for bid in batch.bids]})
+
+    @app.get("/bids/{bid_id}")
+    async def get_bid(bid_id: str):
+        if bid_id not in exchange.bids:
+            raise HTTPException(status_code=404, detail=f"Unknown bid {bid_id}")
+        return exchange.bid_result(bid_id)
+
+    @app.get("/bids")
+    async def get_bids(ids: str = Query(...)):
+        bid_ids = [b for b in ids.split(",") if b]
+        if len(bid_ids) > exchange.max_batch_size:
+            raise HTTPException(status_code=413, detail=f"At most {exchange.max_batch_size} ids per request")
+        return {"results": [exchange.bid_result(b) for b in bid_ids if b in exchange.bids]}
+
+    @app.get("/portfolio")
+    async def get_portfolio():
+        results = [exchange.bid_result(b) for b in exchange.bids]
+        cleared = [r for r in results if r["status"] in ("accepted", "partially_filled")]
+        volume = sum(r["cleared_volume_mwh"] for r in cleared)
+        return {
+            "participant_id": "VPP_VUSIO",
+            "pending_bids": sum(1 for r in results if r["status"] == "pending"),
+            "cleared_bids": len(cleared),
+            "total_volume_traded_mwh": volume,
+            "total_revenue_rs": sum(r["revenue_or_cost_rs"] for r in cleared),
+            "average_clearing_price": (sum(r["cleared_volume_mwh"] * r["cleared_price_rs_per_kwh"] for r in cleared)
+                                       / volume if volume else 0.0)
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return exchange.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock IEX exchange")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--rps", type=float, default=10.0, help="Rate limit per API key")
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--lost-response-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    exchange = MockExchange(requests_per_second=args.rps, burst=args.burst, error_rate=args.error_rate,
+                            lost_response_rate=args.lost_response_rate, seed=args.seed)
+    uvicorn.run(create_app(exchange), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Token Bucket Rate Limiter
+Client-side request pacing matched to exchange API limits
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second sustained, up to
+    `burst` back to back
+
+    Waiters are served in arrival order. pause() stops all requests for
+    a while (e.g. on 429 Retry-After) and empties the bucket so traffic
+    resumes at the sustained rate rather than in a burst.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return the seconds until one is"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait for a token"""
+        async with self._lock:
+            while True:
+                wait = self.try_acquire()
+                if wait <= 0.0:
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold all requests for `seconds`"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self._paused_until
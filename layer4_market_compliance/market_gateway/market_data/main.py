@@ -0,0 +1,122 @@
+"""
+Market Data Service
+Shared DAM/RTM price cache: prefetches exchange results once per publish
+cycle and serves them to the ML pipeline, bidding and settlement
+"""
+
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query
+
+from price_store import PriceStore, from_epoch, market_now, market_time
+from price_cache import MarketDataCache
+from iex_api import IEXClient, SimulatedIEXClient, MarketSegment, price_to_dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Environment configuration
+IEX_API_KEY = os.getenv("IEX_API_KEY", "")
+IEX_API_URL = os.getenv("IEX_API_URL", "https://api.iexindia.com")
+IEX_SIMULATED = os.getenv("IEX_SIMULATED", "true").lower() == "true"
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", "/data/market_prices")
+MARKET_DATA_HISTORY_DAYS = int(os.getenv("MARKET_DATA_HISTORY_DAYS", "400"))  # Past market days kept/served
+MARKET_DATA_AHEAD_DAYS = int(os.getenv("MARKET_DATA_AHEAD_DAYS", "2"))  # Future market days kept/served
+MAX_RANGE_DAYS = int(os.getenv("MAX_RANGE_DAYS", "31"))  # Longest /prices/range query
+PORT = int(os.getenv("PORT", "8300"))
+
+# FastAPI app
+app = FastAPI(title="Market Data Service", version="1.0.0")
+
+client = SimulatedIEXClient() if IEX_SIMULATED else IEXClient(IEX_API_KEY, IEX_API_URL)
+cache = MarketDataCache(client,
+                        PriceStore(MARKET_DATA_DIR, MARKET_DATA_HISTORY_DAYS, MARKET_DATA_AHEAD_DAYS),
+                        max_range_days=MAX_RANGE_DAYS)
+
+
+def _segment(segment: str) -> MarketSegment:
+    try:
+        return MarketSegment(segment.lower())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown segment: {segment}")
+
+
+def _time(value: Optional[str], name: str) -> datetime:
+    if value is None:
+        return market_now()
+    try:
+        return market_time(datetime.fromisoformat(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+
+
+@app.on_event("startup")
+async def startup():
+    """Connect to the exchange and start the prefetcher"""
+    await client.connect()
+    cache.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the prefetcher, persist prices and disconnect"""
+    await cache.stop()
+    await client.disconnect()
+
+
+@app.get("/health")
+async def health_check():
+    """Health check"""
+    return {
+        "status": "healthy",
+        "simulated": IEX_SIMULATED,
+        "segments": [s.value for s in cache.schedules]
+    }
+
+
+@app.get("/markets/{segment}/prices")
+async def get_prices(segment: str, date: Optional[str] = None):
+    """All blocks of a market day, in the exchange's format (fetched once per publish cycle)"""
+    try:
+        prices = await cache.get_market_prices(_segment(segment), _time(date, "date"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"prices": [price_to_dict(p) for p in prices]}
+
+
+@app.get("/markets/{segment}/prices/block")
+async def get_block_price(segment: str, time: Optional[str] = None):
+    """Price of the block containing `time` (default now), from the store only"""
+    price = cache.get_price(_segment(segment), _time(time, "time"))
+    if price is None:
+        raise HTTPException(status_code=404, detail="No price stored for that block")
+    return price_to_dict(price)
+
+
+@app.get("/markets/{segment}/prices/range")
+async def get_price_range(segment: str, start: str = Query(...), end: str = Query(...)):
+    """MCP per block over [start, end); days not yet stored are fetched first; null where no price exists"""
+    try:
+        epochs, mcp = await cache.get_range(_segment(segment), _time(start, "start"), _time(end, "end"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "segment": _segment(segment).value,
+        "delivery_periods": [from_epoch(float(e)).isoformat() for e in epochs],
+        "mcp": [None if math.isnan(v) else float(v) for v in mcp]
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    """Cache hit/fetch counters and next publish times"""
+    return cache.get_stats()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,204 @@
+"""
+Market Data Cache
+Prefetches DAM/RTM prices once per publish cycle and serves every consumer
+from the shared PriceStore
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+from price_store import PriceStore, to_epoch, from_epoch, from_unix, market_now, market_time
+from iex_api import IEXClient, MarketSegment, MarketPrice
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PublishSchedule:
+    """When a segment's results appear, in market (IST) wall-clock time"""
+    interval_s: float               # Publish cycle length
+    offset_s: float                 # Publish time within the cycle (plus settling margin)
+    days_ahead: Sequence[int]       # Market days refreshed each cycle (0 = today)
+
+
+DEFAULT_SCHEDULES = {
+    # DAM results for the next day are published once a day after the 10:00-12:00 auction
+    MarketSegment.DAM: PublishSchedule(interval_s=86400, offset_s=13 * 3600, days_ahead=(0, 1)),
+    # RTM runs 48 half-hourly sessions a day
+    MarketSegment.RTM: PublishSchedule(interval_s=1800, offset_s=60, days_ahead=(0,)),
+}
+
+
+def midnight(when: datetime) -> datetime:
+    """Start of the market day containing `when`"""
+    when = market_time(when)
+    return datetime(when.year, when.month, when.day)
+
+
+class MarketDataCache:
+    """
+    Drop-in replacement for IEXClient.get_market_prices backed by a PriceStore
+
+    A day is served from the store while it is fresh (see is_fresh);
+    otherwise it is fetched on demand. Concurrent requests for the same day share one fetch. The
+    background prefetcher refreshes each segment right after it publishes
+    and persists the store.
+    """
+
+    def __init__(self,
+                 client: IEXClient,
+                 store: Optional[PriceStore] = None,
+                 schedules: Optional[Dict[MarketSegment, PublishSchedule]] = None,
+                 max_range_days: int = 31):
+        self.client = client
+        self.store = store or PriceStore()
+        self.schedules = schedules or DEFAULT_SCHEDULES
+        self.max_range_days = max_range_days  # Longest span get_range will fetch
+
+        self._inflight: Dict[Tuple[MarketSegment, datetime], asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def last_publish(self, segment: MarketSegment, now: Optional[datetime] = None) -> datetime:
+        """Most recent publish time of a segment at or before now"""
+        now = market_time(now) if now else market_now()
+        schedule = self.schedules.get(segment)
+        if schedule is None:
+            return midnight(now)
+        since_midnight = (now - midnight(now)).total_seconds()
+        cycles = (since_midnight - schedule.offset_s) // schedule.interval_s
+        return midnight(now) + timedelta(seconds=schedule.offset_s + cycles * schedule.interval_s)
+
+    def next_publish(self, segment: MarketSegment, now: Optional[datetime] = None) -> datetime:
+        now = market_time(now) if now else market_now()
+        return self.last_publish(segment, now) + timedelta(seconds=self.schedules[segment].interval_s)
+
+    def is_fresh(self, segment: MarketSegment, day: datetime) -> bool:
+        """
+        Complete past days are final; any other day is fresh if it was
+        fetched after the segment's last publish. Uses the store's fetch
+        times, so a restarted service keeps serving what it persisted.
+        """
+        fetched = self.store.day_fetched_at(segment, day)
+        if fetched is None:
+            return False
+        if day < midnight(market_now()) and \
+                self.store.day_coverage(segment, day) == self.store.blocks_per_day(segment):
+            return True
+        return from_unix(fetched) >= self.last_publish(segment)
+
+    async def fetch(self, segment: MarketSegment, date: datetime) -> List[MarketPrice]:
+        """Fetch one market day from the exchange into the store (shared by concurrent callers)"""
+        day = midnight(date)
+        key = (segment, day)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(segment, day))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, segment: MarketSegment, day: datetime) -> List[MarketPrice]:
+        self.fetches += 1
+        started = time.time()
+        prices = await self.client.get_market_prices(segment, day)
+        self.store.put(prices, fetched_at=started)
+        return self.store.get_day(segment, day)
+
+    async def get_market_prices(self,
+                                segment: MarketSegment,
+                                date: Optional[datetime] = None) -> List[MarketPrice]:
+        """All blocks of a market day, from the store when fresh (ValueError outside the store window)"""
+        day = midnight(date or market_now())
+        self.store.check_window(day)
+        if self.is_fresh(segment, day):
+            self.hits += 1
+            return self.store.get_day(segment, day)
+        return await self.fetch(segment, day)
+
+    async def get_range(self,
+                        segment: MarketSegment,
+                        start: datetime,
+                        end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (block start epochs, MCP) over [start, end), fetching market days
+        that are not fresh first; NaN where the exchange has no price
+        """
+        self.store.check_window(start, end)
+        first, last = to_epoch(start), to_epoch(end)
+        if last - first > self.max_range_days * 86400:
+            raise ValueError(f"Range longer than {self.max_range_days} days")
+
+        day = midnight(from_epoch(first))
+        days = []
+        while to_epoch(day) < last:
+            if not self.is_fresh(segment, day):
+                days.append(day)
+            day += timedelta(days=1)
+        results = await asyncio.gather(*(self.fetch(segment, d) for d in days), return_exceptions=True)
+        for d, result in zip(days, results):
+            if isinstance(result, Exception):
+                self.fetch_errors += 1
+                logger.warning(f"Fetch of {segment.value} {d.date()} failed: {result!r}")
+        return self.store.get_range(segment, start, end)
+
+    def get_price(self, segment: MarketSegment, when: Optional[datetime] = None) -> Optional[MarketPrice]:
+        """Stored price of the block containing `when` (no exchange call)"""
+        return self.store.get(segment, when or market_now())
+
+    async def prefetch(self, segments: Optional[Sequence[MarketSegment]] = None):
+        """Refresh every scheduled market day of the given segments, then persist"""
+        today = midnight(market_now())
+        jobs = [
+            (segment, today + timedelta(days=offset))
+            for segment in (segments or list(self.schedules))
+            for offset in self.schedules[segment].days_ahead
+        ]
+        results = await asyncio.gather(*(self.fetch(s, d) for s, d in jobs), return_exceptions=True)
+
+        for (segment, day), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                self.fetch_errors += 1
+                logger.warning(f"Prefetch of {segment.value} {day.date()} failed: {result!r}")
+        self.store.save()
+
+    async def run(self):
+        """Prefetch now, then right after each segment's next publish"""
+        await self.prefetch()
+        while True:
+            now = market_now()
+            due = {segment: self.next_publish(segment, now) for segment in self.schedules}
+            wake = min(due.values())
+            await asyncio.sleep(max(0.0, (wake - market_now()).total_seconds()))
+            await self.prefetch([segment for segment, at in due.items() if at <= wake])
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.store.save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "next_publish": {s.value: self.next_publish(s).isoformat() for s in self.schedules}
+        }
@@ -0,0 +1,325 @@
+"""
+Market Price Store
+Time-indexed array store for exchange clearing prices (in-memory + on-disk)
+"""
+
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'iex_client'))
+from iex_api import MarketSegment, MarketPrice
+
+logger = logging.getLogger(__name__)
+
+# Delivery block length per segment (matches what the IEX client returns)
+BLOCK_MINUTES = {
+    MarketSegment.RTM: 15,
+    MarketSegment.DAM: 60,
+    MarketSegment.TAM: 60,
+    MarketSegment.GTM: 60,
+    MarketSegment.GDAM: 60,
+}
+
+COLUMNS = ("mcp", "volume_cleared", "buy_bids", "sell_bids", "fetched_at")
+
+MARKET_TZ = timezone(timedelta(hours=5, minutes=30))   # IST, the exchange's clock
+
+
+def market_time(when: datetime) -> datetime:
+    """Naive market (IST) wall-clock time; naive input is taken to be market time already"""
+    if when.tzinfo is not None:
+        when = when.astimezone(MARKET_TZ).replace(tzinfo=None)
+    return when
+
+
+def market_now() -> datetime:
+    """Current market wall-clock time (naive), independent of the host timezone"""
+    return market_time(datetime.now(timezone.utc))
+
+
+def from_unix(seconds: float) -> datetime:
+    """Market wall-clock time (naive) of a unix timestamp"""
+    return market_time(datetime.fromtimestamp(seconds, tz=timezone.utc))
+
+
+def to_epoch(when: datetime) -> float:
+    """
+    Seconds for block indexing. Naive datetimes are market (IST) wall-clock
+    times and are indexed as-is, so block boundaries line up with the
+    market day; aware datetimes are converted to that wall clock first.
+    """
+    return (market_time(when) - datetime(1970, 1, 1)).total_seconds()
+
+
+def parse_timestamp(value: str) -> float:
+    """Block-indexing seconds from unix seconds or an ISO 8601 string (e.g. a CSV field)"""
+    try:
+        return to_epoch(datetime.fromtimestamp(float(value), tz=timezone.utc))
+    except ValueError:
+        return to_epoch(datetime.fromisoformat(value))
+
+
+def from_epoch(seconds: float) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=seconds)
+
+
+class PriceSeries:
+    """
+    One segment's prices in contiguous arrays indexed by block number
+
+    Block number = epoch seconds // block length, stored at position
+    block - base. Lookups are an index computation; the arrays grow by
+    doubling in either direction. Missing blocks are NaN.
+    """
+
+    def __init__(self, block_s: int, capacity: int = 96 * 7):
+        self.block_s = block_s
+        self.base: Optional[int] = None
+        self.data = {name: np.full(capacity, np.nan) for name in COLUMNS}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.data["mcp"])
+
+    def block_of(self, when: datetime) -> int:
+        return int(to_epoch(when) // self.block_s)
+
+    def _ensure(self, lo: int, hi: int):
+        """Make blocks lo..hi (inclusive) addressable"""
+        if self.base is None:
+            self.base = lo
+        start = min(self.base, lo)
+        end = max(self.base + self.capacity - 1, hi)
+        if start == self.base and end == self.base + self.capacity - 1:
+            return
+
+        size = max(end - start + 1, 2 * self.capacity)
+        shift = self.base - start
+        for name, array in self.data.items():
+            grown = np.full(size, np.nan)
+            grown[shift:shift + len(array)] = array
+            self.data[name] = grown
+        self.base = start
+
+    def trim(self, lo: int, hi: int):
+        """Drop blocks outside lo..hi (inclusive) and release their memory"""
+        if self.base is None:
+            return
+        start, end = max(self.base, lo), min(self.base + self.capacity - 1, hi)
+        if start == self.base and end == self.base + self.capacity - 1:
+            return
+        if start > end:
+            self.base = None
+            self.data = {name: np.full(96 * 7, np.nan) for name in COLUMNS}
+            return
+        for name, array in self.data.items():
+            self.data[name] = array[start - self.base:end - self.base + 1].copy()
+        self.base = start
+
+    def put(self, blocks: np.ndarray, values: Dict[str, np.ndarray]):
+        blocks = np.asarray(blocks, dtype=np.int64)
+        if not blocks.size:
+            return
+        self._ensure(int(blocks.min()), int(blocks.max()))
+        idx = blocks - self.base
+        for name, column in values.items():
+            self.data[name][idx] = column
+
+    def index(self, block: int) -> Optional[int]:
+        if self.base is None:
+            return None
+        i = block - self.base
+        if 0 <= i < self.capacity and not math.isnan(self.data["mcp"][i]):
+            return i
+        return None
+
+    def slice(self, start_block: int, end_block: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Blocks start_block..end_block-1 and their columns (NaN where missing)"""
+        blocks = np.arange(start_block, end_block)
+        out = {name: np.full(len(blocks), np.nan) for name in COLUMNS}
+        if self.base is not None and len(blocks):
+            lo = max(start_block, self.base)
+            hi = min(end_block, self.base + self.capacity)
+            if lo < hi:
+                for name in COLUMNS:
+                    out[name][lo - start_block:hi - start_block] = self.data[name][lo - self.base:hi - self.base]
+        return blocks, out
+
+
+class PriceStore:
+    """
+    Price series for every segment, persisted as one .npz per segment
+
+    Only market days from history_days before today to ahead_days after
+    it are stored or served; lookups outside that window raise ValueError,
+    so a stray date cannot grow the arrays without bound. history_days=None
+    disables the window, for offline use over arbitrary periods
+    (backtests, settlement).
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, history_days: Optional[int] = 400, ahead_days: int = 2):
+        self.data_dir = data_dir
+        self.history_days = history_days
+        self.ahead_days = ahead_days
+        self.series: Dict[MarketSegment, PriceSeries] = {
+            segment: PriceSeries(minutes * 60) for segment, minutes in BLOCK_MINUTES.items()
+        }
+        if data_dir:
+            self.load()
+
+    def blocks_per_day(self, segment: MarketSegment) -> int:
+        return 86400 // self.series[segment].block_s
+
+    def window(self) -> Optional[Tuple[datetime, datetime]]:
+        """[first, end) of the stored market days in market wall-clock time, None if unbounded"""
+        if self.history_days is None:
+            return None
+        today = from_epoch(to_epoch(market_now()) // 86400 * 86400)
+        return today - timedelta(days=self.history_days), today + timedelta(days=self.ahead_days + 1)
+
+    def check_window(self, start: datetime, end: Optional[datetime] = None):
+        """Raise ValueError unless [start, end] lies within the window"""
+        window = self.window()
+        if window is None:
+            return
+        first, last = window
+        lo, hi = to_epoch(start), to_epoch(end or start)
+        if lo < to_epoch(first) or hi > to_epoch(last) or hi < lo:
+            raise ValueError(f"Outside the stored price window {first.date()} .. {last.date()}")
+
+    def _window_blocks(self, series: PriceSeries) -> Optional[Tuple[int, int]]:
+        window = self.window()
+        if window is None:
+            return None
+        first, last = window
+        return int(to_epoch(first)) // series.block_s, int(to_epoch(last)) // series.block_s - 1
+
+    def put(self, prices: List[MarketPrice], fetched_at: Optional[float] = None):
+        """Store prices (any segments); later values for a block replace earlier ones"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        by_segment: Dict[MarketSegment, List[MarketPrice]] = {}
+        for price in prices:
+            by_segment.setdefault(price.segment, []).append(price)
+
+        for segment, rows in by_segment.items():
+            series = self.series[segment]
+            blocks = np.array([series.block_of(p.delivery_period) for p in rows], dtype=np.int64)
+            bounds = self._window_blocks(series)
+            keep = np.ones(len(blocks), dtype=bool)
+            if bounds is not None:
+                keep = (blocks >= bounds[0]) & (blocks <= bounds[1])
+            if not keep.all():
+                logger.warning(f"Dropping {int((~keep).sum())} {segment.value} price(s) outside the stored window")
+            series.put(
+                blocks[keep],
+                {
+                    "mcp": np.array([p.mcp for p in rows], dtype=float)[keep],
+                    "volume_cleared": np.array([p.volume_cleared for p in rows], dtype=float)[keep],
+                    "buy_bids": np.array([p.buy_bids for p in rows], dtype=float)[keep],
+                    "sell_bids": np.array([p.sell_bids for p in rows], dtype=float)[keep],
+                    "fetched_at": np.full(int(keep.sum()), fetched_at),
+                }
+            )
+
+    def _price_at(self, segment: MarketSegment, series: PriceSeries, i: int) -> MarketPrice:
+        data = series.data
+        return MarketPrice(
+            timestamp=from_unix(data["fetched_at"][i]),
+            segment=segment,
+            delivery_period=from_epoch((series.base + i) * series.block_s),
+            mcp=float(data["mcp"][i]),
+            volume_cleared=float(data["volume_cleared"][i]),
+            buy_bids=int(data["buy_bids"][i]),
+            sell_bids=int(data["sell_bids"][i])
+        )
+
+    def get(self, segment: MarketSegment, when: datetime) -> Optional[MarketPrice]:
+        """Price of the block containing `when` (O(1))"""
+        series = self.series[segment]
+        i = series.index(series.block_of(when))
+        return self._price_at(segment, series, i) if i is not None else None
+
+    def get_mcp(self, segment: MarketSegment, when: datetime) -> Optional[float]:
+        series = self.series[segment]
+        i = series.index(series.block_of(when))
+        return float(series.data["mcp"][i]) if i is not None else None
+
+    def get_range(self, segment: MarketSegment, start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """(block start epochs, MCP) for blocks overlapping [start, end); NaN where missing"""
+        self.check_window(start, end)
+        series = self.series[segment]
+        first = series.block_of(start)
+        last = int(math.ceil(to_epoch(end) / series.block_s))
+        blocks, columns = series.slice(first, last)
+        return blocks * series.block_s, columns["mcp"]
+
+    def day_blocks(self, segment: MarketSegment, date: datetime) -> Tuple[int, int]:
+        self.check_window(datetime(date.year, date.month, date.day))
+        series = self.series[segment]
+        start = series.block_of(datetime(date.year, date.month, date.day))
+        return start, start + self.blocks_per_day(segment)
+
+    def get_day(self, segment: MarketSegment, date: datetime) -> List[MarketPrice]:
+        """Stored blocks of one market day, in delivery order"""
+        series = self.series[segment]
+        start, end = self.day_blocks(segment, date)
+        _, columns = series.slice(start, end)
+        present = np.flatnonzero(~np.isnan(columns["mcp"]))
+        return [self._price_at(segment, series, start + int(k) - series.base) for k in present]
+
+    def day_coverage(self, segment: MarketSegment, date: datetime) -> int:
+        """Number of blocks of the day that have a price"""
+        start, end = self.day_blocks(segment, date)
+        _, columns = self.series[segment].slice(start, end)
+        return int(np.count_nonzero(~np.isnan(columns["mcp"])))
+
+    def day_fetched_at(self, segment: MarketSegment, date: datetime) -> Optional[float]:
+        """Oldest fetch time (epoch s) among the day's stored blocks, None if none are stored"""
+        start, end = self.day_blocks(segment, date)
+        _, columns = self.series[segment].slice(start, end)
+        fetched = columns["fetched_at"][~np.isnan(columns["mcp"])]
+        return float(fetched.min()) if fetched.size else None
+
+    def trim(self):
+        """Drop blocks that have left the window"""
+        for series in self.series.values():
+            bounds = self._window_blocks(series)
+            if bounds is not None:
+                series.trim(*bounds)
+
+    def save(self):
+        """Drop expired blocks and write every non-empty series (atomically, via rename)"""
+        if not self.data_dir:
+            return
+        self.trim()
+        os.makedirs(self.data_dir, exist_ok=True)
+        for segment, series in self.series.items():
+            if series.base is None:
+                continue
+            path = os.path.join(self.data_dir, f"{segment.value}.npz")
+            tmp = path + ".tmp.npz"
+            np.savez(tmp, base=series.base, block_s=series.block_s, **series.data)
+            os.replace(tmp, path)
+
+    def load(self):
+        for segment, series in self.series.items():
+            path = os.path.join(self.data_dir, f"{segment.value}.npz")
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as data:
+                if int(data["block_s"]) != series.block_s:
+                    logger.warning(f"Ignoring {path}: block length {int(data['block_s'])} s != {series.block_s} s")
+                    continue
+                series.base = int(data["base"])
+                series.data = {name: data[name].copy() for name in COLUMNS}
+            bounds = self._window_blocks(series)
+            if bounds is not None:
+                series.trim(*bounds)
+            logger.info(f"Loaded {segment.value} prices from {path}")
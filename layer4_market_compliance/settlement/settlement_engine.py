@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Settlement Engine
+Block-wise settlement of scheduled vs actual energy with DSM deviation
+charges, per unit and for the portfolio
+
+Scheduled energy comes from control logs (each command holds its power
+until it expires or the next command for that unit), actual energy from
+telemetry. Both are joined onto (unit, 15-minute block) keys with
+columnar bincounts, so a month of data for thousands of units is a few
+array passes. Units are processed in chunks to bound memory.
+
+Deviation = actual - scheduled (positive = over-injection / under-drawal).
+Within the tolerance band (layer4 settlement.dsm.penalty_threshold, % of
+schedule) it settles at the normal rate, the block's RTM clearing price.
+Beyond it, under-injection is charged at a multiple of the normal rate
+and over-injection is paid at a fraction of it.
+
+Usage (from layer4_market_compliance/settlement):
+    python settlement_engine.py --schedule control_logs.csv --telemetry telemetry.csv \\
+        --prices-dir /data/market_prices --start 2026-09-01 --end 2026-10-01 --output settlement.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'market_gateway', 'iex_client'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'market_gateway', 'market_data'))
+from iex_api import MarketSegment
+from price_store import PriceStore, to_epoch, from_epoch, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Power sign of each control action (positive = injection into the grid)
+ACTION_SIGN = {"Discharge": 1.0, "Charge": -1.0, "Hold": 0.0}
+
+
+def mongo_epoch(value: datetime) -> float:
+    """Block-indexing seconds for a MongoDB datetime (naive ones are UTC, as pymongo returns them)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return to_epoch(value)
+
+
+def categorize(unit_ids: Sequence[str]):
+    """(unit names, per-row code into names) for a column of unit ids"""
+    names, codes = np.unique(np.asarray(unit_ids, dtype=str), return_inverse=True)
+    return names, codes.astype(np.int64)
+
+
+@dataclass
+class ControlSchedule:
+    """Scheduled power intervals, one row per control command"""
+    unit_names: np.ndarray      # str, one per unit
+    unit_codes: np.ndarray      # Row -> index into unit_names
+    start: np.ndarray           # Block-indexing seconds (price_store.to_epoch)
+    end: np.ndarray
+    power_kw: np.ndarray
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "ControlSchedule":
+        """
+        control_logs documents (node_id, action, magnitude, timestamp,
+        expires_at). Each command ends at its expiry or the unit's next
+        command, whichever is first. Load Deferral (% of load, not kW) is
+        not a market schedule and is skipped.
+        """
+        rows = [r for r in records if r.get("action") in ACTION_SIGN]
+        names, codes = categorize([r["node_id"] for r in rows])
+        start = np.array([mongo_epoch(r["timestamp"]) for r in rows], dtype=float)
+        expires = np.array([mongo_epoch(r["expires_at"]) for r in rows], dtype=float)
+        power = np.array([ACTION_SIGN[r["action"]] * float(r["magnitude"]) for r in rows], dtype=float)
+        return cls.from_commands(names, codes, start, expires, power)
+
+    @classmethod
+    def from_commands(cls, unit_names: np.ndarray, unit_codes: np.ndarray, start: np.ndarray,
+                      expires: np.ndarray, power_kw: np.ndarray) -> "ControlSchedule":
+        """Cut each command off at the same unit's next command"""
+        order = np.lexsort((start, unit_codes))
+        unit_codes, start, expires, power_kw = unit_codes[order], start[order], expires[order], power_kw[order]
+        next_start = np.append(start[1:], np.inf)
+        same_unit = np.append(unit_codes[1:] == unit_codes[:-1], False)
+        end = np.where(same_unit, np.minimum(expires, next_start), expires)
+        return cls(np.asarray(unit_names, dtype=str), unit_codes, start, end, power_kw)
+
+    @classmethod
+    def load(cls, path: str) -> "ControlSchedule":
+        """
+        .npz (unit_names, unit_codes, start, expires, power_kw) or CSV exported
+        from control_logs (timestamp,node_id,action,magnitude,duration_minutes)
+        """
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls.from_commands(data["unit_names"], data["unit_codes"], data["start"],
+                                         data["expires"], data["power_kw"])
+        unit_ids, start, expires, power = [], [], [], []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["action"] not in ACTION_SIGN:
+                    continue
+                t = parse_timestamp(row["timestamp"])
+                unit_ids.append(row["node_id"])
+                start.append(t)
+                expires.append(t + float(row["duration_minutes"]) * 60.0)
+                power.append(ACTION_SIGN[row["action"]] * float(row["magnitude"]))
+        return cls.from_commands(*categorize(unit_ids), np.array(start), np.array(expires), np.array(power))
+
+
+@dataclass
+class MeterReadings:
+    """Telemetry power samples, one row per sample"""
+    unit_names: np.ndarray      # str, one per unit
+    unit_codes: np.ndarray      # Row -> index into unit_names
+    timestamps: np.ndarray      # Block-indexing seconds
+    power_kw: np.ndarray        # Positive = injection
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "MeterReadings":
+        """telemetries documents (nodeId, timestamp, powerOutput)"""
+        return cls(*categorize([r["nodeId"] for r in records]),
+                   np.array([mongo_epoch(r["timestamp"]) for r in records], dtype=float),
+                   np.array([float(r.get("powerOutput", 0.0)) for r in records], dtype=float))
+
+    @classmethod
+    def load(cls, path: str) -> "MeterReadings":
+        """.npz (unit_names, unit_codes, timestamps, power_kw) or CSV (timestamp,unit_id,power_kw)"""
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(data["unit_names"].astype(str), data["unit_codes"], data["timestamps"], data["power_kw"])
+        unit_ids, timestamps, power = [], [], []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                unit_ids.append(row["unit_id"])
+                timestamps.append(parse_timestamp(row["timestamp"]))
+                power.append(float(row["power_kw"]))
+        return cls(*categorize(unit_ids), np.array(timestamps), np.array(power))
+
+
+@dataclass
+class SettlementResult:
+    """Per unit-day totals and per-block portfolio settlement"""
+    unit_ids: List[str]
+    days: List[str]
+    block_epochs: np.ndarray
+    unit_day: Dict[str, np.ndarray]         # name -> (units, days)
+    portfolio: Dict[str, np.ndarray]        # name -> (blocks,), DSM on the netted portfolio deviation
+    elapsed_s: float
+
+    def unit_totals(self) -> Dict[str, np.ndarray]:
+        return {name: values.sum(axis=1) for name, values in self.unit_day.items()}
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        totals = self.unit_totals()
+        unit_dsm = float(totals["dsm_rs"].sum())
+        portfolio_dsm = float(self.portfolio["dsm_rs"].sum())
+        worst = np.argsort(totals["dsm_rs"])[:top]
+        return {
+            "period": {"start": self.days[0], "end": self.days[-1]} if self.days else None,
+            "units": len(self.unit_ids),
+            "blocks": len(self.block_epochs),
+            "scheduled_mwh": float(totals["scheduled_kwh"].sum()) / 1000.0,
+            "actual_mwh": float(totals["actual_kwh"].sum()) / 1000.0,
+            "absolute_deviation_mwh": float(totals["abs_deviation_kwh"].sum()) / 1000.0,
+            "market_revenue_rs": float(totals["revenue_rs"].sum()),
+            "dsm_unit_level_rs": unit_dsm,
+            "dsm_portfolio_rs": portfolio_dsm,
+            "netting_benefit_rs": portfolio_dsm - unit_dsm,
+            "net_rs": float(self.portfolio["revenue_rs"].sum()) + portfolio_dsm,
+            "blocks_beyond_tolerance": int(totals["blocks_beyond_tolerance"].sum()),
+            "missing_meter_blocks": int(totals["missing_blocks"].sum()),
+            "daily_portfolio_net_rs": dict(zip(self.days, self._daily(self.portfolio["revenue_rs"]
+                                                                      + self.portfolio["dsm_rs"]).tolist())),
+            "largest_dsm_charges": [
+                {"unit_id": self.unit_ids[u], "dsm_rs": float(totals["dsm_rs"][u]),
+                 "abs_deviation_kwh": float(totals["abs_deviation_kwh"][u])}
+                for u in worst if totals["dsm_rs"][u] < 0
+            ],
+            "elapsed_s": self.elapsed_s
+        }
+
+    def _daily(self, per_block: np.ndarray) -> np.ndarray:
+        return per_block.reshape(len(self.days), -1).sum(axis=1)
+
+    def write_unit_day_csv(self, path: str):
+        names = list(self.unit_day)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["unit_id", "date"] + names)
+            for u, unit_id in enumerate(self.unit_ids):
+                for d, day in enumerate(self.days):
+                    writer.writerow([unit_id, day] + [f"{self.unit_day[n][u, d]:.3f}" for n in names])
+
+
+class SettlementEngine:
+    """DSM settlement of a whole period in one batch"""
+
+    def __init__(self,
+                 block_minutes: int = 15,
+                 tolerance_percent: float = 5.0,
+                 tolerance_floor_kwh: float = 0.0,
+                 under_injection_factor: float = 1.5,
+                 over_injection_factor: float = 0.0,
+                 chunk_units: int = 500):
+        """
+        Args:
+            tolerance_percent: Deviation band settled at the normal rate (% of schedule)
+            tolerance_floor_kwh: Minimum band per block (so idle units are not
+                penalized for metering noise)
+            under_injection_factor: Rate multiple charged for under-injection beyond the band
+            over_injection_factor: Rate multiple paid for over-injection beyond the band
+            chunk_units: Units settled per pass
+        """
+        self.block_s = block_minutes * 60
+        self.tolerance = tolerance_percent / 100.0
+        self.tolerance_floor_kwh = tolerance_floor_kwh
+        self.under_injection_factor = under_injection_factor
+        self.over_injection_factor = over_injection_factor
+        self.chunk_units = chunk_units
+
+    def dsm_charge(self, scheduled_kwh: np.ndarray, actual_kwh: np.ndarray, rate: np.ndarray) -> Dict[str, np.ndarray]:
+        """Deviation and DSM amount (₹, positive = receivable) per entry"""
+        deviation = actual_kwh - scheduled_kwh
+        band = np.maximum(self.tolerance * np.abs(scheduled_kwh), self.tolerance_floor_kwh)
+        within = np.clip(deviation, -band, band)
+        excess = deviation - within
+        factor = np.where(excess > 0, self.over_injection_factor, self.under_injection_factor)
+        return {
+            "deviation_kwh": deviation,
+            "dsm_rs": rate * (within + factor * excess),
+            "beyond": excess != 0
+        }
+
+    def scheduled_energy(self, unit: np.ndarray, start: np.ndarray, end: np.ndarray, power_kw: np.ndarray,
+                         first_block: int, shape: tuple) -> np.ndarray:
+        """(units, blocks) scheduled kWh: each interval split at block edges, then summed by key"""
+        units, blocks = shape
+        start = np.maximum(start, first_block * self.block_s)
+        end = np.minimum(end, (first_block + blocks) * self.block_s)
+        keep = end > start
+        start, end, power_kw, unit = start[keep], end[keep], power_kw[keep], unit[keep]
+
+        b0 = (start // self.block_s).astype(np.int64)
+        b1 = (np.ceil(end / self.block_s) - 1).astype(np.int64)
+        pieces = b1 - b0 + 1
+        row = np.repeat(np.arange(len(start)), pieces)
+        block = b0[row] + (np.arange(len(row)) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+
+        overlap_s = (np.minimum(end[row], (block + 1) * self.block_s)
+                     - np.maximum(start[row], block * self.block_s))
+        keys = unit[row] * blocks + (block - first_block)
+        energy = np.bincount(keys, weights=power_kw[row] * overlap_s / 3600.0, minlength=units * blocks)
+        return energy.reshape(units, blocks)
+
+    def actual_energy(self, unit: np.ndarray, timestamps: np.ndarray, power_kw: np.ndarray,
+                      first_block: int, shape: tuple):
+        """(units, blocks) metered kWh from the mean sampled power, and the sample counts"""
+        units, blocks = shape
+        block = (timestamps // self.block_s).astype(np.int64) - first_block
+        keep = (block >= 0) & (block < blocks)
+        keys = unit[keep] * blocks + block[keep]
+        total = np.bincount(keys, weights=power_kw[keep], minlength=units * blocks)
+        count = np.bincount(keys, minlength=units * blocks)
+        mean_kw = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+        return (mean_kw * self.block_s / 3600.0).reshape(units, blocks), count.reshape(units, blocks)
+
+    def settle(self,
+               schedule: ControlSchedule,
+               readings: MeterReadings,
+               start: datetime,
+               end: datetime,
+               normal_rate: np.ndarray,
+               unit_ids: Optional[Sequence[str]] = None) -> SettlementResult:
+        """
+        Settle whole days from `start` up to (not including) `end`
+
+        Args:
+            normal_rate: ₹/kWh per block (RTM MCP); NaN blocks use the period mean
+            unit_ids: Units to settle (default: every unit in the schedule or telemetry)
+        """
+        started = time.perf_counter()
+        first_block = int(to_epoch(datetime(start.year, start.month, start.day)) // self.block_s)
+        last_block = int(to_epoch(datetime(end.year, end.month, end.day)) // self.block_s)
+        blocks = last_block - first_block
+        blocks_per_day = 86400 // self.block_s
+        days = blocks // blocks_per_day
+
+        rate = np.asarray(normal_rate, dtype=float)[:blocks]
+        if len(rate) != blocks:
+            raise ValueError(f"Need {blocks} normal-rate blocks, got {len(rate)}")
+        rate = np.where(np.isnan(rate), np.nanmean(rate) if not np.isnan(rate).all() else 0.0, rate)
+
+        if unit_ids is None:
+            unit_ids = np.union1d(schedule.unit_names, readings.unit_names)
+        unit_ids = np.asarray(unit_ids, dtype=str)
+        order = np.argsort(unit_ids)
+        sorted_ids = unit_ids[order]
+
+        def positions(names: np.ndarray, codes: np.ndarray) -> np.ndarray:
+            """Index into unit_ids of each row's unit, -1 if not settled"""
+            if not len(sorted_ids) or not len(names):
+                return np.full(len(codes), -1, dtype=np.int16)
+            i = np.minimum(np.searchsorted(sorted_ids, names), len(sorted_ids) - 1)
+            found = np.where(sorted_ids[i] == names, order[i], -1)
+            # Narrow codes let the stable sort below use radix sort (~5x faster on 10M+ rows)
+            return found.astype(np.int16 if len(unit_ids) < 2 ** 15 else np.int32)[codes]
+
+        # Group rows by settled unit once, so each chunk is a contiguous slice
+        schedule_unit = positions(schedule.unit_names, schedule.unit_codes)
+        s_order = np.argsort(schedule_unit, kind="stable")
+        s_unit = schedule_unit[s_order].astype(np.int64)
+        s_start, s_end, s_power = schedule.start[s_order], schedule.end[s_order], schedule.power_kw[s_order]
+
+        reading_unit = positions(readings.unit_names, readings.unit_codes)
+        r_order = np.argsort(reading_unit, kind="stable")
+        r_unit = reading_unit[r_order].astype(np.int64)
+        r_time, r_power = readings.timestamps[r_order], readings.power_kw[r_order]
+
+        names = ("scheduled_kwh", "actual_kwh", "abs_deviation_kwh", "revenue_rs", "dsm_rs",
+                 "blocks_beyond_tolerance", "missing_blocks")
+        unit_day = {name: np.zeros((len(unit_ids), days)) for name in names}
+        portfolio_scheduled = np.zeros(blocks)
+        portfolio_actual = np.zeros(blocks)
+
+        for lo in range(0, len(unit_ids), self.chunk_units):
+            hi = min(lo + self.chunk_units, len(unit_ids))
+            shape = (hi - lo, blocks)
+            a, b = np.searchsorted(s_unit, [lo, hi])
+            scheduled = self.scheduled_energy(s_unit[a:b] - lo, s_start[a:b], s_end[a:b], s_power[a:b],
+                                              first_block, shape)
+            a, b = np.searchsorted(r_unit, [lo, hi])
+            actual, samples = self.actual_energy(r_unit[a:b] - lo, r_time[a:b], r_power[a:b], first_block, shape)
+            missing = samples == 0
+            # Without a meter reading the block is settled on schedule (no deviation) and flagged
+            actual = np.where(missing, scheduled, actual)
+
+            dsm = self.dsm_charge(scheduled, actual, rate[None, :])
+            per_day = {
+                "scheduled_kwh": scheduled,
+                "actual_kwh": actual,
+                "abs_deviation_kwh": np.abs(dsm["deviation_kwh"]),
+                "revenue_rs": scheduled * rate[None, :],
+                "dsm_rs": dsm["dsm_rs"],
+                "blocks_beyond_tolerance": dsm["beyond"],
+                "missing_blocks": missing
+            }
+            for name, values in per_day.items():
+                unit_day[name][lo:hi] = values[:, :days * blocks_per_day].reshape(
+                    hi - lo, days, blocks_per_day).sum(axis=2)
+
+            portfolio_scheduled += scheduled.sum(axis=0)
+            portfolio_actual += actual.sum(axis=0)
+
+        portfolio_dsm = self.dsm_charge(portfolio_scheduled, portfolio_actual, rate)
+        portfolio = {
+            "scheduled_kwh": portfolio_scheduled,
+            "actual_kwh": portfolio_actual,
+            "deviation_kwh": portfolio_dsm["deviation_kwh"],
+            "revenue_rs": portfolio_scheduled * rate,
+            "dsm_rs": portfolio_dsm["dsm_rs"],
+            "normal_rate": rate
+        }
+
+        epochs = (first_block + np.arange(blocks)) * float(self.block_s)
+        day_labels = [from_epoch(epochs[d * blocks_per_day]).date().isoformat() for d in range(days)]
+        result = SettlementResult(unit_ids.tolist(), day_labels, epochs, unit_day,
+                                  {k: v[:days * blocks_per_day] for k, v in portfolio.items()},
+                                  time.perf_counter() - started)
+        logger.info(f"Settled {len(unit_ids)} units x {blocks} blocks in {result.elapsed_s:.2f} s")
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Block-wise DSM settlement of scheduled vs actual energy")
+    parser.add_argument("--schedule", required=True, help="Control log (.npz or CSV)")
+    parser.add_argument("--telemetry", required=True, help="Meter telemetry (.npz or CSV)")
+    parser.add_argument("--start", required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Day after the last (YYYY-MM-DD)")
+    parser.add_argument("--prices-dir", help="PriceStore directory for RTM normal rates")
+    parser.add_argument("--rate", type=float, default=4.5, help="Flat normal rate (₹/kWh) without --prices-dir")
+    parser.add_argument("--tolerance-percent", type=float, default=5.0)
+    parser.add_argument("--output", help="Write the JSON summary here instead of stdout")
+    parser.add_argument("--unit-day-csv", help="Also write per unit-day totals")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start = datetime.fromisoformat(args.start)
+    end = datetime.fromisoformat(args.end)
+    engine = SettlementEngine(tolerance_percent=args.tolerance_percent)
+
+    blocks = int((to_epoch(end) - to_epoch(start)) // engine.block_s)
+    if args.prices_dir:
+        _, rate = PriceStore(args.prices_dir, history_days=None).get_range(MarketSegment.RTM, start, end)
+    else:
+        rate = np.full(blocks, args.rate)
+
+    result = engine.settle(ControlSchedule.load(args.schedule), MeterReadings.load(args.telemetry),
+                           start, end, rate)
+    if args.unit_day_csv:
+        result.write_unit_day_csv(args.unit_day_csv)
+
+    report = json.dumps(result.summary(), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ if str(src_dir) not in sys.path:
 # Import from src level packages
 from controllers import workload_orchestrator
 from services.data_ingestion_service import data_ingestion_service
+from services.audit_log import audit_log
 from config import db
 from config.config import config
 from utils.logger import logger
@@ -25,7 +26,7 @@ from models.foundation_forecaster import foundation_forecaster
 from controllers.power_flow_controller import power_controller
 
 # Import routes from the api.routes package (relative to current api folder)
-from api.routes import forecast, optimization, training, control, insights, webhook
+from api.routes import forecast, optimization, training, control, insights, webhook, audit
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -42,6 +43,10 @@ async def lifespan(app: FastAPI):
         await db.db_manager.connect_redis()
         logger.info("✅ Database connections established")
         
+        # Start audit log writer
+        audit_log.start()
+        logger.info("✅ Audit log writer started")
+        
         # Initialize foundation forecaster
         logger.info("🧠 Loading foundation models...")
         if foundation_forecaster.pipeline:
@@ -109,6 +114,11 @@ async def lifespan(app: FastAPI):
         training_scheduler.stop()
         logger.info("✅ Training scheduler stopped")
         
+        # Write queued audit events before the database goes away
+        logger.info("📝 Flushing audit log...")
+        await audit_log.stop()
+        logger.info("✅ Audit log flushed")
+        
         # Close database connections
         logger.info("🔌 Closing database connections...")
         await db.db_manager.close()
@@ -218,6 +228,7 @@ app.include_router(training.router)
 app.include_router(control.router)
 app.include_router(insights.router)
 app.include_router(webhook.router)
+app.include_router(audit.router)
 
 # Root endpoint
 @app.get("/", tags=["System"])
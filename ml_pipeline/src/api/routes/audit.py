@@ -0,0 +1,42 @@
+"""
+Audit log queries and integrity checks
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from datetime import datetime
+from services.audit_log import audit_log
+from utils.logger import logger
+
+router = APIRouter(prefix="/audit", tags=["Audit"])
+
+@router.get("/events")
+async def get_audit_events(
+    unit_id: Optional[List[str]] = Query(None, description="One or more unit/node IDs"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[str] = Query(None, description="dispatch, bid, settlement, ..."),
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Audit records in [start, end), oldest first"""
+    try:
+        events = await audit_log.query(unit_id, start, end, event_type, limit)
+        return {"count": len(events), "events": events}
+    except Exception as e:
+        logger.error(f"Error querying audit log: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/verify")
+async def verify_audit_chain(from_seq: Optional[int] = None, to_seq: Optional[int] = None):
+    """Recompute the hash chain over a range of sequence numbers (default: all)"""
+    try:
+        # Make sure everything recorded so far is part of the check
+        await audit_log.flush()
+        return await audit_log.verify(from_seq, to_seq)
+    except Exception as e:
+        logger.error(f"Error verifying audit log: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def get_audit_stats():
+    """Queue and write counters"""
+    return audit_log.get_stats()
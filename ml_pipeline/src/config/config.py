@@ -51,6 +51,31 @@ class Config:
         'health': '/health'
     }
     
+    # ============================================================================
+    # MARKET DATA SERVICE (shared exchange price cache, Layer 4)
+    # ============================================================================
+    # Empty = simulate prices locally
+    MARKET_DATA_URL = os.getenv("MARKET_DATA_URL", "")
+    # Exchange prices (₹/kWh) are mapped onto the simulated price scale
+    # (~60-200) the charge/discharge heuristics were tuned on:
+    # scaled = mcp * SCALE + OFFSET. The defaults map ₹3.5/kWh to 70
+    # (off-peak) and ₹6.5/kWh to 180 (evening peak), so charging (< 80)
+    # starts below ~₹3.8/kWh and discharging (> 150) above ~₹5.7/kWh
+    MARKET_PRICE_SCALE = float(os.getenv("MARKET_PRICE_SCALE", 36.67))
+    MARKET_PRICE_OFFSET = float(os.getenv("MARKET_PRICE_OFFSET", -58.33))
+    
+    # ============================================================================
+    # AUDIT LOG (config/layer4_config.yaml `audit` section)
+    # ============================================================================
+    AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+    AUDIT_COLLECTION = os.getenv("AUDIT_COLLECTION", "audit_log")
+    # Events are written in bulk every AUDIT_FLUSH_INTERVAL_S or as soon as
+    # AUDIT_BATCH_SIZE are queued, whichever comes first
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL_S = float(os.getenv("AUDIT_FLUSH_INTERVAL_S", 1.0))
+    AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", 365))  # 0 = keep forever
+    AUDIT_FILE_PATH = os.getenv("AUDIT_FILE_PATH", "")  # Optional JSON-lines copy, e.g. /var/log/vpp/audit.log
+
     # ============================================================================
     # IOT/EDGE LAYER CONFIGURATION (MQTT for direct hardware control)
     # ============================================================================
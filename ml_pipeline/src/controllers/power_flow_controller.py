@@ -3,6 +3,7 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from utils.logger import logger
 from config.db import db_manager
+from services.audit_log import audit_log
 import asyncio
 
 class PowerFlowController:
@@ -199,16 +200,22 @@ class PowerFlowController:
             return {'safe': False, 'reason': f"Safety check error: {str(e)}"}
         
     async def _log_control_action(self, command: Dict, result: Dict):
-        """Log control action to database for audit trail"""
+        """
+        Queue the control action for the audit trail (written in bulk by
+        the audit log, so fleet-wide actions don't wait on one insert each)
+        """
         try:
-            collection = db_manager.mongo_db['control_logs']
-            log_entry = {
-                **command,
-                'hardware_result': result,
-                'logged_at': datetime.now()
-            }
-            await collection.insert_one(log_entry)
-            logger.info(f"✅ Control action logged to database")
+            audit_log.record(
+                'dispatch',
+                command['node_id'],
+                {
+                    **command,
+                    'hardware_result': result,
+                    'logged_at': datetime.now()
+                },
+                timestamp=command['timestamp']
+            )
+            logger.debug(f"Control action queued for audit log")
         except Exception as e:
             logger.error(f"Error logging control action: {e}")
     
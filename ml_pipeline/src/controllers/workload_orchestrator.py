@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from utils.logger import logger
 from models.foundation_forecaster import foundation_forecaster
 from config.db import db_manager
+from services.market_data_client import market_data_client
 
 class WorkloadOrchestrator:
     """
@@ -291,8 +292,14 @@ class WorkloadOrchestrator:
     async def _get_historical_prices(self, node_id: str, hours: int = 48) -> np.ndarray:
         """Fetch historical electricity prices"""
         try:
-            # In production, fetch from transactions or market data
-            # For now, simulate based on time of day patterns
+            # Cleared DAM prices from the market data service when configured
+            prices = await market_data_client.get_hourly_prices(
+                datetime.now() - timedelta(hours=hours), hours
+            )
+            if prices is not None:
+                return prices
+            
+            # Otherwise simulate based on time of day patterns
             current_hour = datetime.now().hour
             prices = []
             
@@ -10,6 +10,7 @@ from controllers.workload_orchestrator import workload_orchestrator
 from agents.intelligent_agent import intelligent_agent
 from utils.logger import logger
 from config.db import db_manager
+from services.market_data_client import market_data_client
 
 class HybridVPPOrchestrator:
     """
@@ -340,11 +341,13 @@ class HybridVPPOrchestrator:
                 timestamps=timestamps
             )
             
-            # Generate REALISTIC price forecast based on time of day
+            # DAM prices for the next 6h are already cleared; use them when available
             current_time = datetime.now()
-            price_forecast = []
+            cleared = await market_data_client.get_hourly_prices(current_time, 6)
+            price_forecast = cleared.tolist() if cleared is not None else []
             
-            for i in range(6):
+            # Otherwise generate a REALISTIC price forecast based on time of day
+            for i in range(len(price_forecast), 6):
                 future_time = current_time + timedelta(hours=i)
                 hour = future_time.hour
                 
@@ -0,0 +1,325 @@
+"""
+Audit log for control and market events
+Events are queued in memory and written in bulk by a background task,
+each record hash-chained to the one before it
+
+record() never waits on the database, so a fleet-wide emergency dispatch
+costs one insert_many instead of one round trip per command. Records
+carry a sequence number and hash = sha256(canonical record incl. the
+previous record's hash); verify() recomputes the chain, so an edited,
+deleted or reordered record breaks it from that point on. Indexes on
+(unit_id, timestamp), (event_type, timestamp) and timestamp serve range
+queries; a TTL index on logged_at applies the retention period (the
+chain is then verified from the oldest remaining record).
+
+Event types follow the layer4 audit config: 'dispatch', 'bid',
+'settlement'. Events of types listed in `mirrors` are also written, as
+plain documents, to another collection (dispatches to control_logs,
+which the insights routes and settlement read).
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from config.config import config
+from config.db import db_manager
+from utils.logger import logger
+
+GENESIS_HASH = "0" * 64
+
+def _normalize(value: Any) -> Any:
+    """
+    Values as MongoDB returns them (naive UTC datetimes at millisecond
+    precision, lists for tuples), so a stored record hashes the same as
+    the one that was written
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if hasattr(value, 'item'):  # numpy scalars
+        return value.item()
+    return value
+
+def record_hash(record: Dict) -> str:
+    """sha256 of the record's canonical JSON, excluding _id and its own hash"""
+    body = {k: v for k, v in record.items() if k not in ('_id', 'hash')}
+    canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class AuditLog:
+    """Batched, hash-chained event log in MongoDB"""
+
+    def __init__(
+        self,
+        collection: str = config.AUDIT_COLLECTION,
+        batch_size: int = config.AUDIT_BATCH_SIZE,
+        flush_interval_s: float = config.AUDIT_FLUSH_INTERVAL_S,
+        retention_days: int = config.AUDIT_RETENTION_DAYS,
+        file_path: str = config.AUDIT_FILE_PATH,
+        enabled: bool = config.AUDIT_ENABLED,
+        mirrors: Optional[Dict[str, str]] = None
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.retention_days = retention_days
+        self.file_path = file_path
+        self.enabled = enabled
+        self.mirrors = mirrors or {}
+
+        self._queue: List[Dict] = []            # Recorded, not yet chained
+        self._pending: List[Dict] = []          # Chained, not yet written (kept across failed flushes)
+        self._pending_mirrors: Dict[str, List[Dict]] = {}
+        self._seq = 0
+        self._head = GENESIS_HASH
+        self._ready = False                     # Indexes created and chain head loaded
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'recorded': 0, 'written': 0, 'batches': 0, 'failed_flushes': 0}
+
+    def record(
+        self,
+        event_type: str,
+        unit_id: Optional[str],
+        data: Dict,
+        timestamp: Optional[datetime] = None
+    ):
+        """
+        Queue an event (returns immediately; must be called from the event loop)
+
+        Args:
+            event_type: 'dispatch', 'bid', 'settlement', ...
+            unit_id: Node/unit the event concerns (None for portfolio-level events)
+            data: Event payload (BSON-encodable)
+            timestamp: When the event happened (default: now)
+        """
+        self._queue.append({
+            'event_type': event_type,
+            'unit_id': unit_id,
+            'timestamp': timestamp or datetime.now(),
+            'data': data
+        })
+        self.stats['recorded'] += 1
+
+        if self._task is None:
+            self.start()
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def start(self):
+        """Start the background writer (also started by the first record())"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer and write whatever is still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._queue or self._pending:
+            logger.error(f"Audit log: {len(self._queue) + len(self._pending)} events could not be written")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not await self.flush():
+                await asyncio.sleep(min(10 * self.flush_interval_s, 30))
+
+    async def _prepare(self):
+        """Create indexes and resume the chain from the last stored record"""
+        collection = db_manager.mongo_db[self.collection]
+        await collection.create_index([('seq', ASCENDING)], unique=True)
+        await collection.create_index([('unit_id', ASCENDING), ('timestamp', ASCENDING)])
+        await collection.create_index([('event_type', ASCENDING), ('timestamp', ASCENDING)])
+        await collection.create_index([('timestamp', ASCENDING)])
+        if self.retention_days > 0:
+            await collection.create_index([('logged_at', ASCENDING)],
+                                          expireAfterSeconds=self.retention_days * 86400)
+
+        last = await collection.find_one(sort=[('seq', DESCENDING)])
+        if last:
+            self._seq, self._head = last['seq'], last['hash']
+        self._ready = True
+        logger.info(f"Audit log ready ({self.collection}, next seq {self._seq + 1})")
+
+    def _chain(self, events: List[Dict]):
+        """Number and hash queued events onto the chain, in order"""
+        logged_at = datetime.now()
+        for event in events:
+            mirror = self.mirrors.get(event['event_type'])
+            if mirror:
+                self._pending_mirrors.setdefault(mirror, []).append(dict(event['data']))
+            if not self.enabled:
+                continue
+            self._seq += 1
+            record = _normalize({
+                'seq': self._seq,
+                **event,
+                'logged_at': logged_at,
+                'prev_hash': self._head
+            })
+            record['hash'] = self._head = record_hash(record)
+            self._pending.append(record)
+
+    async def _write(self, name: str, docs: List[Dict]) -> Tuple[int, Optional[Exception]]:
+        """
+        Insert docs in order, batch_size at a time
+
+        Returns how many leading docs are stored and the error that stopped
+        the rest, if any. A duplicate _id means the doc was stored by an
+        earlier attempt whose reply was lost, so it counts as written; a
+        duplicate seq means another writer has extended the chain, which
+        is not resolved here (the audit log expects a single writer).
+        """
+        collection = db_manager.mongo_db[name]
+        written = 0
+        while written < len(docs):
+            chunk = docs[written:written + self.batch_size]
+            try:
+                await collection.insert_many(chunk, ordered=True)
+                written += len(chunk)
+            except BulkWriteError as e:
+                written += e.details.get('nInserted', 0)
+                errors = e.details.get('writeErrors', [])
+                if errors and errors[0].get('code') == 11000 and '_id' in errors[0].get('keyPattern', {}):
+                    written += 1
+                    continue
+                return written, e
+            except Exception as e:
+                return written, e
+        return written, None
+
+    async def flush(self) -> bool:
+        """Write everything queued; False if a write failed (the rest is retried next flush)"""
+        async with self._lock:
+            try:
+                if self.enabled and not self._ready:
+                    await self._prepare()
+            except Exception as e:
+                self.stats['failed_flushes'] += 1
+                logger.error(f"Audit log unavailable: {e}")
+                return False
+
+            if self._queue:
+                events, self._queue = self._queue, []
+                self._chain(events)
+
+            errors = []
+            if self._pending:
+                written, error = await self._write(self.collection, self._pending)
+                done, self._pending = self._pending[:written], self._pending[written:]
+                if done:
+                    self.stats['written'] += len(done)
+                    self.stats['batches'] += 1
+                    if self.file_path:
+                        await asyncio.to_thread(self._append_file, done)
+                if error:
+                    errors.append(error)
+
+            for name in list(self._pending_mirrors):
+                docs = self._pending_mirrors[name]
+                written, error = await self._write(name, docs)
+                if written == len(docs):
+                    del self._pending_mirrors[name]
+                else:
+                    self._pending_mirrors[name] = docs[written:]
+                if error:
+                    errors.append(error)
+
+            if errors:
+                self.stats['failed_flushes'] += 1
+                logger.error(f"Audit log flush failed ({len(self._pending)} records pending): {errors[0]}")
+                return False
+            return True
+
+    def _append_file(self, records: List[Dict]):
+        with open(self.file_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps({k: v for k, v in record.items() if k != '_id'}, default=str) + '\n')
+
+    async def query(
+        self,
+        unit_id: Union[str, Sequence[str], None] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        event_type: Optional[str] = None,
+        limit: int = 1000
+    ) -> List[Dict]:
+        """Stored records in [start, end), optionally for given unit(s) and event type, oldest first"""
+        query: Dict[str, Any] = {}
+        if unit_id is not None:
+            query['unit_id'] = unit_id if isinstance(unit_id, str) else {'$in': list(unit_id)}
+        if event_type:
+            query['event_type'] = event_type
+        if start or end:
+            query['timestamp'] = {}
+            if start:
+                query['timestamp']['$gte'] = _normalize(start)
+            if end:
+                query['timestamp']['$lt'] = _normalize(end)
+
+        cursor = db_manager.mongo_db[self.collection].find(query, {'_id': 0}).sort('timestamp', ASCENDING)
+        return await cursor.limit(limit).to_list(length=limit)
+
+    async def verify(self, from_seq: Optional[int] = None, to_seq: Optional[int] = None) -> Dict:
+        """
+        Recompute the chain over [from_seq, to_seq] (default: every stored record)
+
+        Returns the number of records checked and, if the chain is broken,
+        the first bad sequence number and why
+        """
+        query: Dict[str, Any] = {}
+        if from_seq is not None or to_seq is not None:
+            query['seq'] = {}
+            if from_seq is not None:
+                query['seq']['$gte'] = from_seq
+            if to_seq is not None:
+                query['seq']['$lte'] = to_seq
+
+        cursor = db_manager.mongo_db[self.collection].find(query).sort('seq', ASCENDING)
+        checked = 0
+        expected_seq = prev_hash = None
+        async for record in cursor:
+            if expected_seq is not None and record['seq'] != expected_seq:
+                return {'valid': False, 'checked': checked, 'first_bad_seq': expected_seq,
+                        'reason': f"missing records {expected_seq}..{record['seq'] - 1}"}
+            if prev_hash is not None and record['prev_hash'] != prev_hash:
+                return {'valid': False, 'checked': checked, 'first_bad_seq': record['seq'],
+                        'reason': 'prev_hash does not match the preceding record'}
+            if record_hash(record) != record['hash']:
+                return {'valid': False, 'checked': checked, 'first_bad_seq': record['seq'],
+                        'reason': 'record contents do not match its hash'}
+            checked += 1
+            expected_seq, prev_hash = record['seq'] + 1, record['hash']
+
+        return {'valid': True, 'checked': checked, 'first_bad_seq': None, 'reason': None}
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'queued': len(self._queue),
+            'pending': len(self._pending),
+            'last_seq': self._seq,
+            'enabled': self.enabled
+        }
+
+# Global audit log; dispatches are also kept in control_logs for existing readers
+audit_log = AuditLog(mirrors={'dispatch': 'control_logs'})
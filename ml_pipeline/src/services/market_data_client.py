@@ -0,0 +1,77 @@
+"""
+Client for the Layer 4 market data service
+Reads cleared exchange prices from the shared cache instead of each
+consumer calling the exchange (or inventing prices)
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import aiohttp
+import numpy as np
+from config.config import config
+from utils.logger import logger
+
+# Market (IST) clock; the service's block boundaries follow it
+MARKET_TZ = timezone(timedelta(hours=5, minutes=30))
+
+class MarketDataClient:
+    """Hourly/block prices from the market data service"""
+    
+    def __init__(
+        self,
+        base_url: str = config.MARKET_DATA_URL,
+        scale: float = config.MARKET_PRICE_SCALE,
+        offset: float = config.MARKET_PRICE_OFFSET
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.scale = scale
+        self.offset = offset
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+    
+    async def get_prices(
+        self,
+        start: datetime,
+        end: datetime,
+        segment: str = 'dam'
+    ) -> Optional[np.ndarray]:
+        """
+        Clearing price per block over [start, end), on the simulated price scale
+        Naive times are host-local; both are sent as aware IST timestamps
+        The service fetches days it has not stored yet (within its window)
+        Returns None if the service is disabled, unreachable or any block is missing
+        """
+        if not self.enabled:
+            return None
+        
+        url = f"{self.base_url}/markets/{segment}/prices/range"
+        params = {
+            'start': start.astimezone(MARKET_TZ).isoformat(),
+            'end': end.astimezone(MARKET_TZ).isoformat()
+        }
+        try:
+            async with aiohttp.ClientSession() as session:
+                # Longer timeout: a miss is fetched from the exchange first
+                async with session.get(url, params=params, timeout=30) as response:
+                    if response.status != 200:
+                        logger.warning(f"Market data service returned HTTP {response.status}")
+                        return None
+                    data = await response.json()
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.warning(f"Market data service unavailable: {e}")
+            return None
+        
+        mcp = data.get('mcp', [])
+        if not mcp or any(p is None for p in mcp):
+            logger.warning(f"Missing {segment.upper()} prices between {start} and {end}")
+            return None
+        return np.array(mcp, dtype=float) * self.scale + self.offset
+    
+    async def get_hourly_prices(self, start: datetime, hours: int) -> Optional[np.ndarray]:
+        """DAM price for each market hour starting at the one containing `start`"""
+        start = start.astimezone(MARKET_TZ).replace(minute=0, second=0, microsecond=0)
+        return await self.get_prices(start, start + timedelta(hours=hours), 'dam')
+
+# Global client
+market_data_client = MarketDataClient()
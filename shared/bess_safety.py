@@ -0,0 +1,370 @@
+"""
+BESS Safety Rules
+Safety limits, violation types and the vectorized fleet evaluator, shared
+by the BESS controller (per-unit SafetyManager) and the campus controller
+(pre-validation of dispatches)
+"""
+
+import logging
+from typing import Dict, List, Optional, Any, Sequence
+from dataclasses import dataclass
+from enum import Enum
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SafetyLevel(Enum):
+    """Safety alarm severity levels"""
+    NORMAL = 0
+    INFO = 1
+    WARNING = 2
+    CRITICAL = 3
+    EMERGENCY = 4
+
+
+class SafetyAction(Enum):
+    """Actions to take on safety violations"""
+    NONE = "none"
+    LOG = "log"
+    REDUCE_POWER = "reduce_power"
+    STOP = "stop"
+    EMERGENCY_SHUTDOWN = "emergency_shutdown"
+
+
+@dataclass
+class SafetyLimits:
+    """BESS safety operating limits"""
+    # Voltage limits (V)
+    min_cell_voltage: float = 2.8
+    max_cell_voltage: float = 4.2
+    min_pack_voltage: float = 44.8
+    max_pack_voltage: float = 67.2
+
+    # Current limits (A)
+    max_charge_current: float = 100.0
+    max_discharge_current: float = 100.0
+
+    # Temperature limits (°C)
+    min_temperature: float = -10.0
+    max_temperature: float = 55.0
+    critical_temperature: float = 60.0
+
+    # SOC limits (%)
+    min_soc: float = 10.0
+    max_soc: float = 95.0
+
+    # Rate limits
+    max_soc_change_rate: float = 1.0  # % per minute
+    max_power_ramp_rate: float = 10.0  # kW per second
+
+    # Cell balancing
+    max_cell_voltage_delta: float = 0.1  # V
+
+    # Degradation
+    min_soh: float = 70.0
+
+
+@dataclass
+class SafetyViolation:
+    """Record of a safety violation"""
+    timestamp: datetime
+    level: SafetyLevel
+    category: str
+    message: str
+    value: Optional[float] = None
+    limit: Optional[float] = None
+    action: SafetyAction = SafetyAction.NONE
+
+
+# BMS fault flags that require immediate shutdown: (flag, category, message)
+BMS_FAULTS = (
+    ("overvoltage_fault", "bms_overvoltage_fault", "BMS overvoltage fault"),
+    ("overcurrent_fault", "bms_overcurrent_fault", "BMS overcurrent fault"),
+    ("overtemperature_fault", "bms_overtemperature_fault", "BMS overtemperature fault"),
+    ("short_circuit_fault", "bms_short_circuit_fault", "BMS short circuit fault"),
+)
+
+
+def bms_alarm_violations(alarms: Dict[str, Any]) -> List[SafetyViolation]:
+    """Violations for the BMS fault flags set in `alarms` (BMSAlarms fields)"""
+    return [
+        SafetyViolation(
+            timestamp=datetime.utcnow(),
+            level=SafetyLevel.EMERGENCY,
+            category=category,
+            message=message,
+            action=SafetyAction.EMERGENCY_SHUTDOWN
+        )
+        for flag, category, message in BMS_FAULTS
+        if alarms.get(flag)
+    ]
+
+
+# Action severity ranking (index = severity), mirrors SafetyManager._handle_violations
+ACTION_SEVERITY = [
+    SafetyAction.NONE,
+    SafetyAction.LOG,
+    SafetyAction.REDUCE_POWER,
+    SafetyAction.STOP,
+    SafetyAction.EMERGENCY_SHUTDOWN,
+]
+_SEVERITY = {action: rank for rank, action in enumerate(ACTION_SEVERITY)}
+
+# Power factor applied per worst action (same factors SafetyManager uses)
+_POWER_FACTOR = np.array([1.0, 1.0, 0.5, 0.0, 0.0])
+
+
+@dataclass
+class FleetTelemetry:
+    """
+    Columnar telemetry for a fleet of BESS units (one row per unit)
+
+    Missing values are NaN; NaN never trips a limit, matching the single-unit
+    checks which skip data that is not available.
+    """
+    unit_ids: List[str]
+    soc: np.ndarray                     # %
+    soh: np.ndarray                     # %
+    pack_voltage: np.ndarray            # V
+    current: np.ndarray                 # A (positive=charge)
+    temperature: np.ndarray             # °C
+    power_kw: np.ndarray                # kW
+    min_cell_voltage: np.ndarray        # V
+    max_cell_voltage: np.ndarray        # V
+    max_cell_temperature: np.ndarray    # °C
+    soc_rate: np.ndarray                # % per minute
+    power_ramp_rate: np.ndarray         # kW per second
+    bms_faults: Optional[np.ndarray] = None      # bool (units, len(BMS_FAULTS)); None = no alarm data
+    bms_critical: Optional[np.ndarray] = None    # bool: BMS reports a critical fault (summary flag)
+    emergency_stopped: Optional[np.ndarray] = None  # bool: unit's own SafetyManager has shut it down
+
+    def __len__(self) -> int:
+        return len(self.unit_ids)
+
+    @classmethod
+    def from_telemetry(cls, records: Sequence[Dict[str, Any]]) -> "FleetTelemetry":
+        """
+        Build columns from BESS telemetry dicts (collect_telemetry format)
+
+        Optional keys 'soc_rate' and 'power_ramp_rate' carry rate limits
+        computed upstream; they are NaN when absent. BMS fault flags are
+        read from 'alarms' (as SafetyManager does), the critical fault
+        summary from 'bms.alarms' and the unit's e-stop from 'safety'.
+        """
+        def column(getter) -> np.ndarray:
+            values = [getter(r) for r in records]
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+        def bms(key: str):
+            return lambda r: (r.get('bms') or {}).get(key)
+
+        return cls(
+            unit_ids=[r.get('bess_id', str(i)) for i, r in enumerate(records)],
+            soc=column(lambda r: r.get('soc')),
+            soh=column(lambda r: r.get('soh')),
+            pack_voltage=column(lambda r: r.get('voltage')),
+            current=column(lambda r: r.get('current')),
+            temperature=column(lambda r: r.get('temperature')),
+            power_kw=column(lambda r: r.get('power_kw')),
+            min_cell_voltage=column(bms('min_cell_voltage')),
+            max_cell_voltage=column(bms('max_cell_voltage')),
+            max_cell_temperature=column(bms('max_cell_temperature')),
+            soc_rate=column(lambda r: r.get('soc_rate')),
+            power_ramp_rate=column(lambda r: r.get('power_ramp_rate')),
+            bms_faults=np.array(
+                [[bool((r.get('alarms') or {}).get(flag)) for flag, _, _ in BMS_FAULTS] for r in records],
+                dtype=bool
+            ).reshape(len(records), len(BMS_FAULTS)),
+            bms_critical=np.array(
+                [bool(((r.get('bms') or {}).get('alarms') or {}).get('critical_fault')) for r in records],
+                dtype=bool
+            ),
+            emergency_stopped=np.array(
+                [bool((r.get('safety') or {}).get('emergency_stopped')) for r in records],
+                dtype=bool
+            ),
+        )
+
+
+@dataclass
+class FleetSafetyResult:
+    """Outcome of a fleet evaluation"""
+    violations: Dict[str, List[SafetyViolation]]   # unit_id -> violations (offending units only)
+    worst_action: np.ndarray                        # per-unit index into ACTION_SEVERITY
+    power_factor: np.ndarray                        # per-unit allowed power fraction
+
+    @property
+    def blocked(self) -> np.ndarray:
+        """Units that must not be dispatched (STOP or EMERGENCY_SHUTDOWN)"""
+        return self.worst_action >= _SEVERITY[SafetyAction.STOP]
+
+    def apply(self, setpoints_kw: np.ndarray) -> np.ndarray:
+        """Scale requested setpoints by each unit's safety power factor"""
+        return np.asarray(setpoints_kw, dtype=np.float64) * self.power_factor
+
+
+class FleetSafetyEvaluator:
+    """
+    Evaluates SafetyLimits for many BESS units in one pass
+
+    Each limit is a single vectorized comparison over a column;
+    SafetyViolation objects are only built for the offending rows.
+    Unlike SafetyManager this is stateless: rates are passed in as columns
+    and no shutdown actions are taken, so it is safe to use for what-if
+    validation of a dispatch before it is sent.
+    """
+
+    def __init__(self, limits: Optional[SafetyLimits] = None):
+        self.limits = limits or SafetyLimits()
+
+    def _rules(self, fleet: FleetTelemetry):
+        """
+        Yield (category, level, action, mask, values, limit, message format)
+
+        Message formats match the per-unit checks in SafetyManager.
+        """
+        lim = self.limits
+        temp = fleet.temperature
+        current = fleet.current
+        delta = fleet.max_cell_voltage - fleet.min_cell_voltage
+
+        yield ("cell_undervoltage", SafetyLevel.CRITICAL, SafetyAction.STOP,
+               fleet.min_cell_voltage < lim.min_cell_voltage, fleet.min_cell_voltage, lim.min_cell_voltage,
+               "Cell undervoltage: {value:.3f}V < {limit:.3f}V")
+        yield ("cell_overvoltage", SafetyLevel.CRITICAL, SafetyAction.STOP,
+               fleet.max_cell_voltage > lim.max_cell_voltage, fleet.max_cell_voltage, lim.max_cell_voltage,
+               "Cell overvoltage: {value:.3f}V > {limit:.3f}V")
+        yield ("cell_imbalance", SafetyLevel.WARNING, SafetyAction.REDUCE_POWER,
+               delta > lim.max_cell_voltage_delta, delta, lim.max_cell_voltage_delta,
+               "Cell voltage imbalance: {value:.3f}V > {limit:.3f}V")
+
+        yield ("pack_undervoltage", SafetyLevel.CRITICAL, SafetyAction.STOP,
+               fleet.pack_voltage < lim.min_pack_voltage, fleet.pack_voltage, lim.min_pack_voltage,
+               "Pack undervoltage: {value:.1f}V")
+        yield ("pack_overvoltage", SafetyLevel.CRITICAL, SafetyAction.STOP,
+               fleet.pack_voltage > lim.max_pack_voltage, fleet.pack_voltage, lim.max_pack_voltage,
+               "Pack overvoltage: {value:.1f}V")
+
+        yield ("overcurrent_charge", SafetyLevel.CRITICAL, SafetyAction.REDUCE_POWER,
+               current > lim.max_charge_current, current, lim.max_charge_current,
+               "Charge overcurrent: {value:.1f}A")
+        yield ("overcurrent_discharge", SafetyLevel.CRITICAL, SafetyAction.REDUCE_POWER,
+               (current < 0) & (-current > lim.max_discharge_current), -current, lim.max_discharge_current,
+               "Discharge overcurrent: {value:.1f}A")
+
+        # Pack temperature bands are exclusive (critical > over > under)
+        critical = temp > lim.critical_temperature
+        over = (temp > lim.max_temperature) & ~critical
+        yield ("critical_temperature", SafetyLevel.EMERGENCY, SafetyAction.EMERGENCY_SHUTDOWN,
+               critical, temp, lim.critical_temperature,
+               "CRITICAL TEMPERATURE: {value:.1f}°C")
+        yield ("overtemperature", SafetyLevel.CRITICAL, SafetyAction.REDUCE_POWER,
+               over, temp, lim.max_temperature,
+               "Overtemperature: {value:.1f}°C")
+        yield ("undertemperature", SafetyLevel.WARNING, SafetyAction.REDUCE_POWER,
+               temp < lim.min_temperature, temp, lim.min_temperature,
+               "Undertemperature: {value:.1f}°C")
+        yield ("cell_critical_temperature", SafetyLevel.EMERGENCY, SafetyAction.EMERGENCY_SHUTDOWN,
+               fleet.max_cell_temperature > lim.critical_temperature, fleet.max_cell_temperature,
+               lim.critical_temperature,
+               "CELL CRITICAL TEMPERATURE: {value:.1f}°C")
+
+        yield ("low_soc", SafetyLevel.WARNING, SafetyAction.REDUCE_POWER,
+               fleet.soc < lim.min_soc, fleet.soc, lim.min_soc,
+               "Low SOC: {value:.1f}%")
+        yield ("high_soc", SafetyLevel.WARNING, SafetyAction.REDUCE_POWER,
+               fleet.soc > lim.max_soc, fleet.soc, lim.max_soc,
+               "High SOC: {value:.1f}%")
+        yield ("low_soh", SafetyLevel.WARNING, SafetyAction.LOG,
+               fleet.soh < lim.min_soh, fleet.soh, lim.min_soh,
+               "Low SOH: {value:.1f}% - Battery degraded")
+
+        yield ("soc_rate_limit", SafetyLevel.WARNING, SafetyAction.REDUCE_POWER,
+               fleet.soc_rate > lim.max_soc_change_rate, fleet.soc_rate, lim.max_soc_change_rate,
+               "SOC changing too fast: {value:.2f}%/min")
+        yield ("power_ramp_limit", SafetyLevel.WARNING, SafetyAction.LOG,
+               fleet.power_ramp_rate > lim.max_power_ramp_rate, fleet.power_ramp_rate, lim.max_power_ramp_rate,
+               "Power ramping too fast: {value:.2f} kW/s")
+
+        # BMS faults (same flags as SafetyManager), then the summary flag for
+        # units that only report it, then units already shut down locally
+        if fleet.bms_faults is not None:
+            for k, (_, category, message) in enumerate(BMS_FAULTS):
+                yield (category, SafetyLevel.EMERGENCY, SafetyAction.EMERGENCY_SHUTDOWN,
+                       fleet.bms_faults[:, k], None, None, message)
+        if fleet.bms_critical is not None:
+            yield ("bms_critical_fault", SafetyLevel.EMERGENCY, SafetyAction.EMERGENCY_SHUTDOWN,
+                   fleet.bms_critical, None, None, "BMS critical fault")
+        if fleet.emergency_stopped is not None:
+            yield ("emergency_stopped", SafetyLevel.CRITICAL, SafetyAction.STOP,
+                   fleet.emergency_stopped, None, None, "Unit is emergency stopped")
+
+    def evaluate(self, fleet: FleetTelemetry) -> FleetSafetyResult:
+        """
+        Check all limits for every unit
+
+        Args:
+            fleet: Columnar fleet telemetry
+
+        Returns:
+            FleetSafetyResult with violations for offending units only
+        """
+        now = datetime.utcnow()
+        worst = np.zeros(len(fleet), dtype=np.int8)
+        violations: Dict[str, List[SafetyViolation]] = {}
+
+        with np.errstate(invalid='ignore'):
+            for category, level, action, mask, values, limit, message in self._rules(fleet):
+                rows = np.flatnonzero(mask)
+                if rows.size == 0:
+                    continue
+
+                worst[rows] = np.maximum(worst[rows], _SEVERITY[action])
+                for row in rows:
+                    value = None if values is None else float(values[row])
+                    violations.setdefault(fleet.unit_ids[row], []).append(SafetyViolation(
+                        timestamp=now,
+                        level=level,
+                        category=category,
+                        message=message.format(value=value, limit=limit),
+                        value=value,
+                        limit=limit,
+                        action=action
+                    ))
+
+        return FleetSafetyResult(
+            violations=violations,
+            worst_action=worst,
+            power_factor=_POWER_FACTOR[worst]
+        )
+
+    def evaluate_dispatch(self,
+                          fleet: FleetTelemetry,
+                          setpoints_kw: np.ndarray,
+                          ramp_time_s: float = 1.0) -> FleetSafetyResult:
+        """
+        Pre-validate a dispatch across the fleet
+
+        The power ramp column is replaced by the ramp each unit would see
+        moving from its current power to the requested setpoint within
+        ramp_time_s.
+
+        Args:
+            fleet: Columnar fleet telemetry
+            setpoints_kw: Requested setpoint per unit (same row order)
+            ramp_time_s: Time allowed to reach the setpoint
+
+        Returns:
+            FleetSafetyResult; use result.apply(setpoints_kw) for safe setpoints
+        """
+        setpoints_kw = np.asarray(setpoints_kw, dtype=np.float64)
+        if setpoints_kw.shape != (len(fleet),):
+            raise ValueError(f"Expected {len(fleet)} setpoints, got shape {setpoints_kw.shape}")
+
+        ramp = np.abs(setpoints_kw - np.nan_to_num(fleet.power_kw)) / max(ramp_time_s, 1e-6)
+        projected = FleetTelemetry(**{**fleet.__dict__, 'power_ramp_rate': ramp})
+
+        return self.evaluate(projected)